@@ -1,5 +1,5 @@
 import os
-import win32com.client as win32
+from format_sniffer import corrected_name, fix_extension, sniff_format
 
 def fix_word_extension(file_path):
     ext = os.path.splitext(file_path)[1].lower()
@@ -7,45 +7,27 @@ def fix_word_extension(file_path):
     if ext not in ['.doc', '.docx']:
         print(f"{file_path} 不是doc/docx文件，无需修正。")
         return
-    # 检查伪docx
-    if ext == '.doc':
-        try:
-            from docx import Document
-            Document(file_path)
-            # 能用python-docx打开，说明其实是docx
-            new_path = file_path + 'x'
-            os.rename(file_path, new_path)
-            print(f"已将 {file_path} 重命名为 {new_path}（实际为docx）")
-            return
-        except Exception:
-            pass  # 不是docx，继续后面流程
-    # 检查伪doc
-    if ext == '.docx':
-        try:
-            from docx import Document
-            Document(file_path)
-            print(f"{file_path} 是真正的docx文件，无需修正。")
-            return
-        except Exception:
-            print(f"{file_path} 不是标准docx，尝试用win32com打开...")
-        try:
-            word = win32.gencache.EnsureDispatch('Word.Application')
-            word.Visible = 0
-            doc = word.Documents.Open(file_path)
-            doc.Close()
-            word.Quit()
-            print(f"{file_path} 虽然不能用python-docx打开，但Word可以打开，建议人工确认。")
-        except Exception:
-            # 如果win32com也打不开，尝试重命名为.doc
-            new_path = file_path[:-1]  # 去掉x，变成.doc
-            try:
-                os.rename(file_path, new_path)
-                print(f"已将 {file_path} 重命名为 {new_path}（实际为doc）")
-            except Exception as e:
-                print(f"重命名失败: {e}")
+    # 只读取文件开头判断真实格式，无需python-docx或Word
+    fmt = sniff_format(file_path)
+    if corrected_name(os.path.basename(file_path), fmt) == os.path.basename(file_path):
+        if fmt in ('zip', 'ole', 'unknown'):
+            print(f"{file_path} 不是Word文档（{fmt}），建议人工确认。")
+        else:
+            print(f"{file_path} 是真正的{fmt}文件，无需修正。")
+        return
+    try:
+        new_path = fix_extension(file_path, fmt)
+        if new_path != file_path:
+            print(f"已将 {file_path} 重命名为 {new_path}（实际为{fmt}）")
+        else:
+            target = os.path.join(os.path.dirname(file_path), corrected_name(os.path.basename(file_path), fmt))
+            print(f"{file_path} 实际为{fmt}，但目标文件 {target} 已存在，跳过。")
+    except Exception as e:
+        print(f"重命名失败: {e}")
 
 if __name__ == "__main__":
+    # 主流程（geter3.py）已在处理时按实际格式选择引擎并修正输出扩展名，本脚本仅用于单独修正文件名
     folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input_file')
     for fname in os.listdir(folder):
         if fname.lower().endswith('.doc') or fname.lower().endswith('.docx'):
-            fix_word_extension(os.path.join(folder, fname))
\ No newline at end of file
+            fix_word_extension(os.path.join(folder, fname))
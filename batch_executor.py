@@ -0,0 +1,272 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from multiprocessing.connection import wait
+
+import geter3
+import metrics
+
+# 工作进程超出处理预算时的退出码，主进程据此判断隔离原因
+EXIT_TIMEOUT = 70
+EXIT_MEMORY = 71
+_EXIT_REASONS = {EXIT_TIMEOUT: 'timeout', EXIT_MEMORY: 'memory'}
+
+# 看门狗检查处理时间和内存的间隔(秒)
+BUDGET_POLL_INTERVAL = 0.5
+# 工作进程超时后仍未自行退出（例如卡在不释放GIL的调用中）时，主进程再等待这么久后强制结束它
+KILL_GRACE = 10
+
+_MB = 1024 * 1024
+
+
+def process_memory():
+    """当前进程占用的内存（字节，Linux为常驻内存，Windows为私有内存），无法获取时为None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import win32api
+        import win32process
+
+        return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())['PagefileUsage']
+    except Exception:
+        return None
+
+
+class _TrackedSlot:
+    """
+    工作进程中的文件操作名额：持有期间在共享标志中记录，
+    进程被结束时主进程据此归还它未释放的名额，其他进程不会因此永远等待
+    """
+
+    def __init__(self, semaphore, held):
+        self.semaphore = semaphore
+        self.held = held
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        self.held.value = 1
+        return self
+
+    def __exit__(self, *exc):
+        self.held.value = 0
+        self.semaphore.release()
+
+
+class _Watchdog:
+    """
+    工作进程内的看门狗线程：当前文件处理超过timeout秒、或进程内存超过memory_limit字节时，
+    结束本进程的Word实例，再以EXIT_TIMEOUT/EXIT_MEMORY退出（主进程随后隔离该文件并启动新进程）
+    """
+
+    def __init__(self, timeout, memory_limit):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.started = None
+        self.getter = None
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(BUDGET_POLL_INTERVAL)
+            started = self.started
+            if started is None:
+                continue
+            if self.timeout and time.monotonic() - started > self.timeout:
+                self._expire(EXIT_TIMEOUT, f"处理超过 {self.timeout:g} 秒")
+            if self.memory_limit:
+                memory = process_memory()
+                if memory is not None and memory > self.memory_limit:
+                    self._expire(EXIT_MEMORY, f"内存 {memory / _MB:.0f}MB 超过上限")
+
+    def _expire(self, code, reason):
+        logging.error(f"工作进程(进程号 {os.getpid()}) {reason}，结束进程")
+        if self.getter is not None:
+            try:
+                self.getter.kill()
+            except Exception as e:
+                logging.error(f"结束Word进程失败: {e}")
+        os._exit(code)
+
+
+def _worker_main(conn, file_kwargs, io_limiter, metrics_settings=None, word_settings=None, budget=None,
+                 io_held=None):
+    """
+    工作进程：持有自己的引擎实例，逐个接收文件路径，返回 (处理结果, 本文件的性能指标汇总和记录, 是否需要回收本进程)。
+    budget为单个文件的处理预算（timeout秒、memory_mb）：由看门狗线程监控，超出时本进程直接退出；
+    处理完一个文件后内存仍超过上限时请求主进程回收本进程，避免下一个文件因此被隔离。
+    """
+    geter3._io_limiter = io_limiter if io_held is None else _TrackedSlot(io_limiter, io_held)
+    # 重新创建记录器，避免fork时继承主进程已有的记录
+    metrics.disable()
+    if metrics_settings is not None:
+        metrics.enable(**metrics_settings)
+    memory_limit = (budget or {}).get('memory_mb', 0) * _MB
+    watchdog = _Watchdog((budget or {}).get('timeout', 0), memory_limit) if budget else None
+    getter = None
+    try:
+        while True:
+            file_path = conn.recv()
+            if file_path is None:
+                break
+            # Word会话池只在遇到需要Word处理的文件时才创建，之后在本进程内复用
+            if getter is None and geter3.needs_word(file_path, file_kwargs.get('doc_engine', 'auto')):
+                getter = geter3.open_word_getter(word_settings)
+            if watchdog is not None:
+                watchdog.getter = getter
+                watchdog.started = time.monotonic()
+            try:
+                result = geter3.process_file(getter, file_path, **file_kwargs)
+            except Exception as e:
+                logging.error(f"处理文件时发生异常: {file_path}, {e}")
+                result = "error"
+            recycle = False
+            if watchdog is not None:
+                watchdog.started = None
+                if memory_limit:
+                    memory = process_memory()
+                    recycle = memory is not None and memory > memory_limit
+            conn.send((result, metrics.drain(), recycle))
+            if recycle:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        geter3.close_word_getter(getter)
+
+
+class _Worker:
+    """主进程中对一个工作进程的记录：通信管道、正在处理的文件和开始处理的时间"""
+
+    def __init__(self, ctx, file_kwargs, io_limiter, word_settings=None, budget=None):
+        self.conn, child_conn = ctx.Pipe()
+        self.io_held = ctx.Value('b', 0, lock=False) if budget else None
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, file_kwargs, io_limiter, metrics.worker_settings(), word_settings, budget,
+                  self.io_held),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.current = None
+        self.started = None
+
+    def dispatch(self, file_path):
+        self.current = file_path
+        self.started = time.monotonic()
+        self.conn.send(file_path)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=30)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+def run_parallel(file_paths, file_kwargs, workers, io_concurrency, word_settings=None, budget=None, counts=None):
+    """
+    多进程并行处理文件，返回各结果的文件数（collections.Counter，见geter3.log_summary）。
+    只累计计数、不保留每个文件的结果，长时间运行的守护进程也不会随处理的文件数占用更多内存；
+    传入counts时结果直接累计到其中，中途异常退出时已处理文件的计数不会丢失。
+    file_paths可以是列表，也可以是逐个给出文件的迭代器（如协调模式下按批认领的文件，见claim_queue.py，
+    或守护进程监听到的文件，见watch_daemon.py），只在有空闲的工作进程时才取下一个文件；同一路径可以出现多次。
+    word_settings为各工作进程中Word会话池的设置（见geter3.open_word_getter）。
+    每个工作进程一次只领取一个文件；某个进程崩溃时只把它正在处理的文件记为error，
+    并启动新进程继续处理剩余文件。
+    budget为单个文件的处理预算（timeout秒、memory_mb，0表示不限制）：超出预算或使进程崩溃的文件
+    被隔离到unsupport文件夹（见FileProcessor.quarantine），结果记为"quarantined"，
+    因此一个有问题的文件最多耗费它的预算，不会拖住整批处理。
+    """
+    ctx = multiprocessing.get_context()
+    io_limiter = ctx.BoundedSemaphore(max(1, io_concurrency))
+    timeout = (budget or {}).get('timeout', 0)
+    processor = geter3.FileProcessor(**file_kwargs) if budget else None
+    counts = Counter() if counts is None else counts
+    pending = iter(file_paths)
+    pool = []
+    for file_path in pending:
+        worker = _Worker(ctx, file_kwargs, io_limiter, word_settings, budget)
+        pool.append(worker)
+        worker.dispatch(file_path)
+        if len(pool) >= workers:
+            break
+
+    try:
+        while any(worker.current is not None for worker in pool):
+            busy = [worker for worker in pool if worker.current is not None]
+            # 启用超时预算时定期醒来，检查是否有卡住不退出的进程
+            wait([w.conn for w in busy] + [w.process.sentinel for w in busy],
+                 BUDGET_POLL_INTERVAL if timeout else None)
+            for index, worker in enumerate(pool):
+                if worker.current is None:
+                    continue
+                crashed = recycle = False
+                reason = None
+                if worker.conn.poll():
+                    try:
+                        result, drained, recycle = worker.conn.recv()
+                        counts[result] += 1
+                        metrics.merge(drained)
+                    except EOFError:
+                        crashed = True
+                elif not worker.process.is_alive():
+                    crashed = True
+                elif timeout and time.monotonic() - worker.started > timeout + KILL_GRACE:
+                    logging.error(f"工作进程超时后未能自行退出，强制结束(进程号 {worker.process.pid})")
+                    worker.kill()
+                    crashed = True
+                    reason = 'timeout'
+                else:
+                    continue
+
+                if crashed:
+                    worker.process.join()
+                    exitcode = worker.process.exitcode
+                    if worker.io_held is not None and worker.io_held.value:
+                        # 进程在持有文件操作名额时被结束，代它归还
+                        worker.io_held.value = 0
+                        io_limiter.release()
+                    if processor is None:
+                        logging.error(f"工作进程异常退出(exitcode={exitcode})，文件记为错误: {worker.current}")
+                        counts["error"] += 1
+                    else:
+                        reason = reason or _EXIT_REASONS.get(exitcode, 'crash')
+                        detail = {
+                            'timeout': f"处理超过 {timeout:g} 秒",
+                            'memory': f"工作进程内存超过 {budget.get('memory_mb', 0):g}MB",
+                        }.get(reason, f"工作进程异常退出(exitcode={exitcode})")
+                        logging.error(f"处理 {worker.current} 时{detail}，隔离该文件并启动新的工作进程")
+                        counts[processor.quarantine(worker.current, reason, detail)] += 1
+                worker.current = None
+                file_path = next(pending, None)
+                if crashed or recycle:
+                    worker.stop()
+                    if file_path is None:
+                        continue
+                    if recycle:
+                        logging.info(f"工作进程内存超过上限，回收重启(进程号 {worker.process.pid})")
+                    worker = pool[index] = _Worker(ctx, file_kwargs, io_limiter, word_settings, budget)
+
+                if file_path is not None:
+                    worker.dispatch(file_path)
+    finally:
+        for worker in pool:
+            worker.stop()
+
+    return counts
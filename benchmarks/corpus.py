@@ -0,0 +1,481 @@
+"""
+确定性的docx/doc测试语料生成器。
+
+相同的参数和随机种子总是生成字节完全相同的文件，用于基准测试之间的对比。
+"""
+import os
+import random
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_BASE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# 固定的zip时间戳，保证输出可复现
+_ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+# 一级标题依次使用的章节名（包含config.ini中默认的章节关键词）
+CHAPTERS = {
+    'zh': ['绪论', '研究背景', '总论', '需求分析', '建设方案', '实验设计', '实施计划', '投资估算', '结论'],
+    'en': ['Introduction', 'Background', 'Overview', 'Requirements', 'Design', 'Experiments',
+           'Implementation', 'Budget', 'Conclusion'],
+}
+_SUBTITLES = {
+    'zh': ['概述', '现状', '目标', '原则', '范围', '方法', '流程', '指标', '风险', '保障'],
+    'en': ['Summary', 'Status', 'Goals', 'Principles', 'Scope', 'Method', 'Process', 'Metrics',
+           'Risks', 'Support'],
+}
+_WORDS = {
+    'zh': list('本项目建设内容包括系统平台数据资源应用服务安全保障运行维护标准规范管理机制'),
+    'en': ['the', 'system', 'data', 'service', 'platform', 'project', 'design', 'network',
+           'security', 'standard', 'process', 'quality', 'resource', 'module'],
+}
+
+# 中文Word中内置标题样式的ID是"1"、"2"……，英文Word中是"Heading1"、"Heading2"……
+_STYLE_IDS = {'zh': '{level}', 'en': 'Heading{level}'}
+
+
+def _png(width, height, seed):
+    """生成一张确定性的RGB PNG图片"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(height):
+        rows.append(b'\x00' + bytes(rng.randrange(256) for _ in range(width * 3)))
+    raw = zlib.compress(b''.join(rows), 6)
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', raw) + chunk(b'IEND', b'')
+
+
+def _styles_xml(lang, max_depth):
+    styles = [
+        '<w:style w:type="paragraph" w:default="1" w:styleId="a"><w:name w:val="Normal"/></w:style>'
+    ]
+    for level in range(1, max_depth + 1):
+        style_id = _STYLE_IDS[lang].format(level=level)
+        based_on = 'a' if level == 1 else _STYLE_IDS[lang].format(level=level - 1)
+        styles.append(
+            f'<w:style w:type="paragraph" w:styleId="{style_id}">'
+            f'<w:name w:val="heading {level}"/><w:basedOn w:val="{based_on}"/>'
+            f'<w:next w:val="a"/><w:qFormat/>'
+            f'<w:pPr><w:keepNext/><w:outlineLvl w:val="{level - 1}"/></w:pPr></w:style>'
+        )
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:styles xmlns:w="{W_NS}">' + ''.join(styles) + '</w:styles>')
+
+
+def _paragraph(text, style_id=None):
+    ppr = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+    return f'<w:p>{ppr}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _image_paragraph(rel_id, index):
+    return (
+        '<w:p><w:r><w:drawing>'
+        '<wp:inline xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">'
+        f'<wp:extent cx="952500" cy="952500"/><wp:docPr id="{index}" name="Picture {index}"/>'
+        '<a:graphic xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        '<pic:pic xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:nvPicPr><pic:cNvPr id="{index}" name="image{index}.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rel_id}"/></pic:blipFill>'
+        '<pic:spPr/></pic:pic></a:graphicData></a:graphic></wp:inline>'
+        '</w:drawing></w:r></w:p>'
+    )
+
+
+def _table_rows(rng, lang, rows, cols):
+    words = _WORDS[lang]
+    sep = '' if lang == 'zh' else ' '
+    return [[sep.join(rng.choice(words) for _ in range(4)) for _ in range(cols)] for _ in range(rows)]
+
+
+def _table(rows):
+    cells = []
+    for row in rows:
+        cells.append('<w:tr>' + ''.join(f'<w:tc>{_paragraph(text)}</w:tc>' for text in row) + '</w:tr>')
+    return '<w:tbl>' + ''.join(cells) + '</w:tbl>'
+
+
+def _document_blocks(paragraphs, heading_every, max_depth, tables, images, lang, seed):
+    """
+    按文档顺序生成内容块：('heading', 级别, 文本)、('text', 文本)、('table', 各行单元格文本)、('image', 序号)。
+    返回 (内容块列表, 一级标题列表)。docx和doc生成器使用相同的内容。
+    """
+    rng = random.Random(seed)
+    chapters = CHAPTERS[lang]
+    subtitles = _SUBTITLES[lang]
+    words = _WORDS[lang]
+    sep = '' if lang == 'zh' else ' '
+
+    heading_count = max(len(chapters), paragraphs // max(1, heading_every))
+    heading_positions = set(rng.sample(range(1, paragraphs), min(heading_count, paragraphs - 1)))
+    table_positions = set(rng.sample(range(paragraphs), min(tables, paragraphs)))
+    image_positions = sorted(rng.sample(range(paragraphs), min(images, paragraphs)))
+    image_index = {pos: i for i, pos in enumerate(image_positions)}
+
+    blocks = []
+    top_titles = []
+    numbers = [0] * (max_depth + 1)
+    chapter_index = 0
+
+    def add_heading(level):
+        nonlocal chapter_index
+        numbers[level] += 1
+        for deeper in range(level + 1, max_depth + 1):
+            numbers[deeper] = 0
+        if level == 1:
+            name = chapters[chapter_index % len(chapters)]
+            if chapter_index >= len(chapters):
+                name += str(chapter_index // len(chapters) + 1)
+            chapter_index += 1
+            title = f'第{numbers[1]}章 {name}' if lang == 'zh' else f'Chapter {numbers[1]} {name}'
+            top_titles.append(title)
+        else:
+            number = '.'.join(str(n) for n in numbers[1:level + 1])
+            title = f'{number} {rng.choice(subtitles)}'
+        blocks.append(('heading', level, title))
+
+    # 前几个一级标题依次出现，保证所有章节名都存在
+    add_heading(1)
+    for pos in range(paragraphs):
+        if pos in heading_positions:
+            if chapter_index < len(chapters) and rng.random() < 0.5:
+                level = 1
+            else:
+                level = rng.randint(1, max_depth) if max_depth > 1 else 1
+            add_heading(level)
+        length = rng.randint(20, 120) if lang == 'zh' else rng.randint(8, 40)
+        blocks.append(('text', sep.join(rng.choice(words) for _ in range(length))))
+        if pos in table_positions:
+            blocks.append(('table', _table_rows(rng, lang, rows=4, cols=3)))
+        if pos in image_index:
+            blocks.append(('image', image_index[pos]))
+    while chapter_index < len(chapters):
+        add_heading(1)
+        blocks.append(('text', sep.join(rng.choice(words) for _ in range(10))))
+    return blocks, top_titles
+
+
+def generate_docx(path, paragraphs=1000, heading_every=10, max_depth=3, tables=0, images=0,
+                  lang='zh', seed=0, image_size=64):
+    """
+    生成一个docx测试文件。
+
+    paragraphs: 正文段落总数；heading_every: 平均每多少段出现一个标题；
+    max_depth: 标题最大级别；tables/images: 表格和图片的数量（随机分布在正文中）；
+    lang: 'zh'或'en'，决定标题样式ID和正文语言。
+    返回文件中的一级标题列表。
+    """
+    blocks, top_titles = _document_blocks(paragraphs, heading_every, max_depth, tables, images, lang, seed)
+    image_count = 0
+    body = []
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading':
+            body.append(_paragraph(block[2], _STYLE_IDS[lang].format(level=block[1])))
+        elif kind == 'text':
+            body.append(_paragraph(block[1]))
+        elif kind == 'table':
+            body.append(_table(block[1]))
+        else:
+            body.append(_image_paragraph(f'rId{100 + block[1]}', len(body)))
+            image_count += 1
+    image_rel = [f'rId{100 + i}' for i in range(image_count)]
+
+    body.append('<w:sectPr><w:headerReference w:type="default" r:id="rId3"/>'
+                '<w:pgSz w:w="11906" w:h="16838"/></w:sectPr>')
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>'
+                + ''.join(body) + '</w:body></w:document>')
+
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Default Extension="png" ContentType="image/png"/>'
+        '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-'
+        'officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-'
+        'officedocument.wordprocessingml.styles+xml"/>'
+        '<Override PartName="/word/header1.xml" ContentType="application/vnd.openxmlformats-'
+        'officedocument.wordprocessingml.header+xml"/>'
+        '</Types>'
+    )
+    package_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{REL_BASE}/officeDocument" Target="word/document.xml"/>'
+        '</Relationships>'
+    )
+    document_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{REL_BASE}/styles" Target="styles.xml"/>'
+        f'<Relationship Id="rId3" Type="{REL_BASE}/header" Target="header1.xml"/>'
+        + ''.join(f'<Relationship Id="{rel_id}" Type="{REL_BASE}/image" Target="media/image{i}.png"/>'
+                  for i, rel_id in enumerate(image_rel))
+        + '</Relationships>'
+    )
+    header = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              f'<w:hdr xmlns:w="{W_NS}">{_paragraph("header")}</w:hdr>')
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    members = [
+        ('[Content_Types].xml', content_types),
+        ('_rels/.rels', package_rels),
+        ('word/document.xml', document),
+        ('word/styles.xml', _styles_xml(lang, max_depth)),
+        ('word/_rels/document.xml.rels', document_rels),
+        ('word/header1.xml', header),
+    ]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, text in members:
+            zf.writestr(zipfile.ZipInfo(name, _ZIP_DATE), text.encode('utf-8'),
+                        compress_type=zipfile.ZIP_DEFLATED)
+        for i in range(len(image_rel)):
+            # 图片本身已压缩，按存储方式写入
+            zf.writestr(zipfile.ZipInfo(f'word/media/image{i}.png', _ZIP_DATE),
+                        _png(image_size, image_size, seed * 1000 + i), compress_type=zipfile.ZIP_STORED)
+    return top_titles
+
+
+# ---- doc（Word 97-2003二进制格式） ----
+
+_SECTOR_SIZE = 512
+_ENDOFCHAIN = 0xFFFFFFFE
+_FATSECT = 0xFFFFFFFD
+_FREESECT = 0xFFFFFFFF
+_NOSTREAM = 0xFFFFFFFF
+# 小于该大小的流要放在迷你流中，生成的流都补齐到这个大小以上
+_MINI_CUTOFF = 4096
+
+# 段落属性：标题段落设置样式和sprmPOutLvl，表格中的段落设置sprmPFInTable，行结束标记再加上sprmPFTtp。
+# 与Word保存的文件一样，这些sprm之前有修改制表位的sprmPChgTabs：表格段落使用一字节长度的形式（删除和添加各一个制表位），
+# 标题段落使用长度为255、按制表位个数计算长度的形式
+_SPRM_P_FINTABLE = 0x2416
+_SPRM_P_FTTP = 0x2417
+_SPRM_P_OUTLVL = 0x2640
+_SPRM_P_CHGTABS = 0xC615
+_CHG_TABS = struct.pack('<HBBhBhB', _SPRM_P_CHGTABS, 7, 1, 1440, 1, 720, 0)
+_CHG_TABS_CLOSE = struct.pack('<HBBhhBhB', _SPRM_P_CHGTABS, 255, 1, 1440, 1440, 1, 720, 0)
+_PAPX_CELL = struct.pack('<H', 0) + _CHG_TABS + struct.pack('<HB', _SPRM_P_FINTABLE, 1)
+_PAPX_ROW_END = struct.pack('<H', 0) + _CHG_TABS + struct.pack('<HBHB', _SPRM_P_FINTABLE, 1, _SPRM_P_FTTP, 1)
+# 每个PAPX FKP页中的段落数（页中还要放下各不相同的PAPX）
+_RUNS_PER_FKP = 20
+# 每个分段（piece）包含的段落数，英文语料中可用cp1252表示的分段按压缩格式存储
+_PARAGRAPHS_PER_PIECE = 500
+
+
+def _doc_paragraphs(blocks):
+    """把内容块展开为 (文本, 段落标记, PAPX)，PAPX为istd+grpprl，None表示默认属性"""
+    paragraphs = []
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading':
+            papx = struct.pack('<H', block[1]) + _CHG_TABS_CLOSE + struct.pack('<HB', _SPRM_P_OUTLVL, block[1] - 1)
+            paragraphs.append((block[2], '\r', papx))
+        elif kind == 'text':
+            paragraphs.append((block[1], '\r', None))
+        elif kind == 'table':
+            for row in block[1]:
+                for text in row:
+                    paragraphs.append((text, '\x07', _PAPX_CELL))
+                paragraphs.append(('', '\x07', _PAPX_ROW_END))
+    return paragraphs
+
+
+def _fkp_page(runs):
+    """runs为 [(起始fc, 结束fc, PAPX), ...]，生成一个512字节的PAPX FKP页"""
+    crun = len(runs)
+    page = bytearray(_SECTOR_SIZE)
+    fcs = [run[0] for run in runs] + [runs[-1][1]]
+    struct.pack_into(f'<{crun + 1}L', page, 0, *fcs)
+    offsets = {}
+    pos = _SECTOR_SIZE - 1
+    for i, (_, _, papx) in enumerate(runs):
+        if papx is None:
+            continue
+        if papx not in offsets:
+            data = bytes([0, (len(papx) + 1) // 2]) + papx + b'\x00' * (len(papx) % 2)
+            pos = (pos - len(data)) & ~1
+            page[pos:pos + len(data)] = data
+            offsets[papx] = pos // 2
+        page[(crun + 1) * 4 + i * 13] = offsets[papx]
+    page[-1] = crun
+    return bytes(page)
+
+
+def _stsh(max_depth):
+    """样式表：istd 0为Normal，istd 1-max_depth为内置标题样式（sti与级别相同）"""
+    styles = [(0, 0x0FFF, 'Normal', None)]
+    for level in range(1, max_depth + 1):
+        styles.append((level, 0, f'heading {level}', struct.pack('<HHB', level, _SPRM_P_OUTLVL, level - 1)))
+    entries = []
+    for sti, base, name, papx in styles:
+        papx = papx or struct.pack('<H', sti)
+        std = struct.pack('<5H', sti, 1 | base << 4, 2, 0, 0)
+        std += struct.pack('<H', len(name)) + name.encode('utf-16-le') + b'\x00\x00'
+        std += struct.pack('<H', len(papx)) + papx + b'\x00' * (len(papx) % 2)
+        std += struct.pack('<H', 0)
+        entries.append(struct.pack('<H', len(std)) + std)
+    stshi = struct.pack('<6H3h', len(styles), 10, 1, 15, 15, 0, 0, 0, 0)
+    return struct.pack('<H', len(stshi)) + stshi + b''.join(entries)
+
+
+def _compound_file(streams):
+    """把 {名称: 数据} 写成512字节扇区的OLE2复合文档（所有流都在根存储下，且不小于迷你流上限）"""
+    names = sorted(streams, key=lambda name: (len(name), name.upper()))
+    data = {name: streams[name] + b'\x00' * (-len(streams[name]) % _SECTOR_SIZE) for name in names}
+    starts = {}
+    sector = 0
+    for name in names:
+        starts[name] = sector
+        sector += len(data[name]) // _SECTOR_SIZE
+    dir_sector = sector
+    used = sector + 1
+    fat_count = 1
+    while fat_count * (_SECTOR_SIZE // 4) < used + fat_count:
+        fat_count += 1
+    if fat_count > 109:
+        raise ValueError('生成的doc文件过大')
+
+    fat = [_FREESECT] * (fat_count * (_SECTOR_SIZE // 4))
+    for name in names:
+        first = starts[name]
+        last = first + len(data[name]) // _SECTOR_SIZE - 1
+        for s in range(first, last):
+            fat[s] = s + 1
+        fat[last] = _ENDOFCHAIN
+    fat[dir_sector] = _ENDOFCHAIN
+    for s in range(used, used + fat_count):
+        fat[s] = _FATSECT
+
+    def entry(name, kind, child=_NOSTREAM, right=_NOSTREAM, start=_ENDOFCHAIN, size=0):
+        encoded = name.encode('utf-16-le')
+        return (encoded + b'\x00' * (64 - len(encoded))
+                + struct.pack('<HBB3L', len(encoded) + 2, kind, 1, _NOSTREAM, right, child)
+                + b'\x00' * 36 + struct.pack('<LQ', start, size))
+
+    # 各流按名称顺序通过右指针串联
+    entries = [entry('Root Entry', 5, child=1)]
+    for i, name in enumerate(names):
+        right = i + 2 if i + 1 < len(names) else _NOSTREAM
+        entries.append(entry(name, 2, right=right, start=starts[name], size=len(streams[name])))
+    while len(entries) % 4:
+        entries.append(b'\x00' * 64 + struct.pack('<HBB3L', 0, 0, 0, _NOSTREAM, _NOSTREAM, _NOSTREAM)
+                       + b'\x00' * 48)
+
+    header = bytearray(_SECTOR_SIZE)
+    header[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    struct.pack_into('<5H', header, 0x18, 0x3E, 3, 0xFFFE, 9, 6)
+    struct.pack_into('<9L', header, 0x28, 0, fat_count, dir_sector, 0, _MINI_CUTOFF,
+                     _ENDOFCHAIN, 0, _ENDOFCHAIN, 0)
+    difat = list(range(used, used + fat_count)) + [_FREESECT] * (109 - fat_count)
+    struct.pack_into('<109L', header, 0x4C, *difat)
+    return (bytes(header) + b''.join(data[name] for name in names) + b''.join(entries)
+            + struct.pack(f'<{len(fat)}L', *fat))
+
+
+def generate_doc(path, paragraphs=1000, heading_every=10, max_depth=3, tables=0, lang='zh', seed=0):
+    """
+    生成一个Word 97-2003格式的doc测试文件，内容与相同参数的generate_docx一致（不含图片）。
+    只写入doc_reader读取所需的结构：FIB、分段表、段落属性（PAPX FKP）、样式表和节表。
+    返回文件中的一级标题列表。
+    """
+    blocks, top_titles = _document_blocks(paragraphs, heading_every, max_depth, tables, 0, lang, seed)
+    paragraphs_ = _doc_paragraphs(blocks)
+
+    # 正文文本从1024字节处开始，每个分段紧接上一个分段存放
+    text_start = 1024
+    text = bytearray()
+    pieces = []
+    runs = []
+    cp = 0
+    for i in range(0, len(paragraphs_), _PARAGRAPHS_PER_PIECE):
+        chunk = paragraphs_[i:i + _PARAGRAPHS_PER_PIECE]
+        chars = ''.join(para_text + mark for para_text, mark, _ in chunk)
+        try:
+            encoded = chars.encode('cp1252')
+            width = 1
+        except UnicodeEncodeError:
+            encoded = chars.encode('utf-16-le')
+            width = 2
+        fc = text_start + len(text)
+        pieces.append((cp, fc * 2 | 0x40000000 if width == 1 else fc))
+        para_fc = fc
+        for para_text, mark, papx in chunk:
+            end_fc = para_fc + (len(para_text) + 1) * width
+            runs.append((para_fc, end_fc, papx))
+            para_fc = end_fc
+        text += encoded
+        cp += len(chars)
+    ccp_text = cp
+
+    fkp_start = text_start + len(text) + (-(text_start + len(text)) % _SECTOR_SIZE)
+    fkps = [_fkp_page(runs[i:i + _RUNS_PER_FKP]) for i in range(0, len(runs), _RUNS_PER_FKP)]
+    word_size = fkp_start + len(fkps) * _SECTOR_SIZE
+
+    # 1Table流：样式表、Clx（分段表）、PlcBtePapx、PlcfSed
+    stsh = _stsh(max_depth)
+    plc_pcd = struct.pack(f'<{len(pieces) + 1}L', *[p[0] for p in pieces], ccp_text)
+    plc_pcd += b''.join(struct.pack('<HLH', 0, fc, 0) for _, fc in pieces)
+    clx = struct.pack('<BL', 2, len(plc_pcd)) + plc_pcd
+    bte_fcs = [runs[i][0] for i in range(0, len(runs), _RUNS_PER_FKP)] + [runs[-1][1]]
+    bte = struct.pack(f'<{len(bte_fcs)}L', *bte_fcs)
+    bte += struct.pack(f'<{len(fkps)}L', *range(fkp_start // _SECTOR_SIZE, fkp_start // _SECTOR_SIZE + len(fkps)))
+    sed = struct.pack('<2L', 0, ccp_text) + struct.pack('<HLHL', 0, 0xFFFFFFFF, 0, 0xFFFFFFFF)
+    table = bytearray()
+    fc_lcb = [0] * (0x5D * 2)
+    for index, part in ((1, stsh), (33, clx), (13, bte), (6, sed)):
+        fc_lcb[index * 2] = len(table)
+        fc_lcb[index * 2 + 1] = len(part)
+        table += part
+    table += b'\x00' * max(0, _MINI_CUTOFF - len(table))
+
+    # FIB：FibBase、fibRgW（14项）、fibRgLw（22项，其中cbMac和ccpText）、fibRgFcLcb97（93对）
+    lid = 0x0804 if lang == 'zh' else 0x0409
+    fib = struct.pack('<7HLBB2H2L', 0xA5EC, 0xC1, 0, lid, 0, 0x1200, 0xBF, 0, 0, 0, 0, 0, 0, 0)
+    fib += struct.pack('<H', 14) + b'\x00' * 28
+    rg_lw = [0] * 22
+    rg_lw[0] = word_size
+    rg_lw[3] = ccp_text
+    fib += struct.pack('<H22l', 22, *rg_lw)
+    fib += struct.pack(f'<H{len(fc_lcb)}L', 0x5D, *fc_lcb) + struct.pack('<H', 0)
+    word = bytearray(fib + b'\x00' * (text_start - len(fib)))
+    word += text
+    word += b'\x00' * (fkp_start - len(word))
+    for page in fkps:
+        word += page
+    word += b'\x00' * max(0, _MINI_CUTOFF - len(word))
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(_compound_file({'WordDocument': bytes(word), '1Table': bytes(table)}))
+    return top_titles
+
+
+def generate_corpus(folder, count, seed=0, fmt='docx', **kwargs):
+    """
+    在folder中生成count个文档（每个文档使用不同的种子），返回文件路径列表。
+    fmt为'doc'时生成Word 97-2003格式（忽略images参数）。
+    """
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"doc_{i:05d}.{fmt}")
+        if fmt == 'doc':
+            generate_doc(path, seed=seed + i, **{k: v for k, v in kwargs.items() if k not in ('images', 'image_size')})
+        else:
+            generate_docx(path, seed=seed + i, **kwargs)
+        paths.append(path)
+    return paths
@@ -0,0 +1,431 @@
+"""
+Word COM的模拟实现，用于在没有Word的环境（如Linux）中运行WordHeadGetter路径。
+
+install()把假的win32com.client和pythoncom注册到sys.modules，之后导入head_geter即可。
+文档内容由DocxPackage解析（因此只支持zip格式的文件，扩展名可以是.doc），
+SaveAs通过DocxPackage.save_slice写出删除后剩余的区间。
+每次COM调用可以附加固定延迟，用来模拟跨进程调用的开销。
+还可以注入故障：每隔若干次打开文档让Word崩溃或卡死，每打开一个文档让进程内存增长，
+配合假的win32gui/win32process/win32api（按窗口标题找进程、查询内存、结束进程）测试Word会话池。
+"""
+import io
+import itertools
+import sys
+import threading
+import time
+import types
+
+# 跨进程COM调用的模拟延迟（秒），由install()设置
+_call_latency = 0.0
+# 自install()以来的COM调用次数
+_call_count = 0
+# 自install()以来打开文档的次数（所有实例合计，用于按间隔注入故障）
+_open_count = 0
+# 注入的故障，由install()或set_faults()设置
+_faults = {'crash_every': 0, 'hang_every': 0, 'leak_mb': 0.0}
+# 卡死的调用最长阻塞多久（秒）后自行失败，防止没有看门狗时测试永远挂起
+_HANG_LIMIT = 120
+
+# 模拟的WINWORD进程：进程号 -> FakeWordApplication
+_processes = {}
+_pids = itertools.count(10000)
+# 新启动的Word进程占用的内存
+_BASE_MEMORY = 100 * 1024 * 1024
+
+# Word进程退出后COM调用返回的HRESULT（RPC_S_SERVER_UNAVAILABLE）
+RPC_S_SERVER_UNAVAILABLE = -2147023174
+
+
+class com_error(Exception):
+    """模拟pywintypes.com_error，args为 (hresult, 描述, excepinfo, argerr)"""
+
+# Word中正文段落的大纲级别（wdOutlineLevelBodyText）
+_BODY_TEXT_LEVEL = 10
+
+
+def _tick(application):
+    global _call_count
+    _call_count += 1
+    application._check_alive()
+    if _call_latency:
+        time.sleep(_call_latency)
+
+
+class FakeStyle:
+    def __init__(self, application, name):
+        self._application = application
+        self._name = name
+
+    @property
+    def NameLocal(self):
+        _tick(self._application)
+        return self._name
+
+
+class FakeRange:
+    def __init__(self, document, start, end, text=''):
+        self._application = document._application
+        self._document = document
+        self._start = start
+        self._end = end
+        self._text = text
+
+    @property
+    def Text(self):
+        _tick(self._application)
+        return self._text
+
+    @property
+    def Start(self):
+        _tick(self._application)
+        return self._start
+
+    @property
+    def End(self):
+        _tick(self._application)
+        return self._end
+
+    def Delete(self):
+        _tick(self._application)
+        self._document._delete(self._start, self._end)
+
+
+class FakeParagraph:
+    def __init__(self, document, text, start, style_name, outline_level):
+        self._application = document._application
+        self._range = FakeRange(document, start, start + len(text) + 1, text + '\r')
+        self._style = FakeStyle(document._application, style_name)
+        self._outline_level = outline_level
+
+    @property
+    def Range(self):
+        _tick(self._application)
+        return self._range
+
+    @property
+    def Style(self):
+        _tick(self._application)
+        return self._style
+
+    @property
+    def OutlineLevel(self):
+        _tick(self._application)
+        return self._outline_level
+
+
+class FakeParagraphs:
+    def __init__(self, application, paragraphs):
+        self._application = application
+        self._paragraphs = paragraphs
+
+    @property
+    def Count(self):
+        _tick(self._application)
+        return len(self._paragraphs)
+
+    def __iter__(self):
+        for paragraph in self._paragraphs:
+            _tick(self._application)
+            yield paragraph
+
+
+class FakeWindow:
+    def __init__(self, application, document):
+        self._application = application
+        self._document = document
+
+    def Close(self):
+        _tick(self._application)
+        self._document.Close(False)
+
+
+class FakeWindows:
+    def __init__(self, application):
+        self._application = application
+
+    @property
+    def Count(self):
+        _tick(self._application)
+        return len(self._application._documents)
+
+    def __call__(self, index):
+        _tick(self._application)
+        return FakeWindow(self._application, self._application._documents[index - 1])
+
+
+class FakeDocument:
+    """
+    打开时把文件读入内存（与Word一样，之后对原文件的改动不影响已打开的文档）。
+    删除只记录保留的字符区间，SaveAs时一次性切片写出。
+    """
+
+    def __init__(self, application, path, heading_names):
+        from docx_slicer import DocxPackage
+
+        self._application = application
+        self.FullName = path
+        with open(path, 'rb') as f:
+            self._package = DocxPackage(io.BytesIO(f.read()))
+        self._window = (0, self._package.content_end)
+        self._history = []
+        self._closed = False
+        self._paragraphs = self._build_paragraphs(heading_names)
+
+    def _build_paragraphs(self, heading_names):
+        """标题段落使用真实的文本和位置，其余段落用正文占位，使段落总数与原文档一致"""
+        package = self._package
+        titles = package.flat_titles
+        body_count = max(0, package.paragraph_count - len(titles))
+        body_per_gap = body_count // (len(titles) + 1)
+        paragraphs = []
+        position = 0
+
+        def add_body(count):
+            nonlocal position
+            for _ in range(count):
+                paragraphs.append(FakeParagraph(self, '', position, heading_names['body'], _BODY_TEXT_LEVEL))
+                position += 1
+
+        add_body(body_per_gap)
+        for title, offset, level in titles:
+            name = heading_names['heading'].format(level=level)
+            paragraphs.append(FakeParagraph(self, title, offset, name, level))
+            position = offset + len(title) + 1
+            add_body(body_per_gap)
+        add_body(package.paragraph_count - len(paragraphs))
+        return paragraphs
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError('文档已关闭')
+
+    def _delete(self, start, end):
+        """删除当前坐标下的[start, end)，只支持删除开头或结尾（切片只会这样删除）"""
+        self._check_open()
+        lo, hi = self._window
+        length = hi - lo
+        start = max(0, min(start, length))
+        end = max(start, min(end, length))
+        self._history.append(self._window)
+        if start == 0:
+            self._window = (lo + end, hi)
+        elif end == length:
+            self._window = (lo, lo + start)
+        else:
+            self._history.pop()
+            raise NotImplementedError('FakeDocument只支持删除文档开头或结尾')
+
+    @property
+    def Paragraphs(self):
+        _tick(self._application)
+        self._check_open()
+        return FakeParagraphs(self._application, self._paragraphs)
+
+    @property
+    def Content(self):
+        _tick(self._application)
+        self._check_open()
+        lo, hi = self._window
+        return FakeRange(self, 0, hi - lo)
+
+    def Range(self, start, end):
+        _tick(self._application)
+        self._check_open()
+        return FakeRange(self, start, end)
+
+    def Undo(self, times=1):
+        _tick(self._application)
+        self._check_open()
+        undone = False
+        for _ in range(times):
+            if not self._history:
+                break
+            self._window = self._history.pop()
+            undone = True
+        return undone
+
+    def SaveAs(self, path, *args, **kwargs):
+        _tick(self._application)
+        self._check_open()
+        lo, hi = self._window
+        self._package.save_slice(path, lo, hi)
+
+    @property
+    def Windows(self):
+        _tick(self._application)
+        return FakeWindows(self._application)
+
+    def Close(self, save_changes=False):
+        _tick(self._application)
+        if self._closed:
+            return
+        self._closed = True
+        self._package.close()
+        if self in self._application._documents:
+            self._application._documents.remove(self)
+
+
+class FakeDocuments:
+    def __init__(self, application):
+        self._application = application
+
+    @property
+    def Count(self):
+        _tick(self._application)
+        return len(self._application._documents)
+
+    def Open(self, path, *args, **kwargs):
+        global _open_count
+        application = self._application
+        _tick(application)
+        _open_count += 1
+        application.memory += int(_faults['leak_mb'] * 1024 * 1024)
+        if _faults['crash_every'] and _open_count % _faults['crash_every'] == 0:
+            application._dead = True
+            raise com_error(RPC_S_SERVER_UNAVAILABLE, 'RPC 服务器不可用。', None, None)
+        if _faults['hang_every'] and _open_count % _faults['hang_every'] == 0:
+            application._hung = True
+            _tick(application)
+        document = FakeDocument(application, path, application.heading_names)
+        application._documents.append(document)
+        return document
+
+
+class FakeWordApplication:
+    """
+    模拟的Word.Application（一个模拟的WINWORD进程），heading_names决定标题样式名使用中文还是英文。
+    崩溃后的调用抛出RPC错误；卡死后的调用一直阻塞，直到进程被TerminateProcess结束。
+    """
+
+    def __init__(self, lang='zh'):
+        if lang == 'zh':
+            self.heading_names = {'heading': '标题 {level}', 'body': '正文'}
+        else:
+            self.heading_names = {'heading': 'Heading {level}', 'body': 'Normal'}
+        self.Visible = 1
+        self.Caption = 'Microsoft Word'
+        self.pid = next(_pids)
+        self.memory = _BASE_MEMORY
+        self._dead = False
+        self._hung = False
+        self._terminated = threading.Event()
+        self._documents = []
+        self.Documents = FakeDocuments(self)
+        self.Windows = FakeWindows(self)
+        _processes[self.pid] = self
+
+    def _check_alive(self):
+        if self._hung and not self._dead:
+            self._terminated.wait(_HANG_LIMIT)
+            self._dead = True
+        if self._dead:
+            raise com_error(RPC_S_SERVER_UNAVAILABLE, 'RPC 服务器不可用。', None, None)
+
+    def _terminate(self):
+        self._dead = True
+        self._terminated.set()
+        _processes.pop(self.pid, None)
+
+    def Quit(self, *args):
+        _tick(self)
+        for document in list(self._documents):
+            document.Close(False)
+        _processes.pop(self.pid, None)
+
+
+class _FakeProcessHandle:
+    def __init__(self, pid):
+        self.pid = pid
+
+
+def _open_process(access, inherit, pid):
+    if pid not in _processes:
+        raise OSError(f'进程不存在: {pid}')
+    return _FakeProcessHandle(pid)
+
+
+def _find_window(class_name, title):
+    """按窗口标题查找模拟的Word窗口，窗口句柄就是进程号"""
+    for pid, application in _processes.items():
+        if class_name == 'OpusApp' and application.Caption == title:
+            return pid
+    return 0
+
+
+def _process_memory(handle):
+    application = _processes.get(handle.pid)
+    memory = application.memory if application is not None else 0
+    return {'PagefileUsage': memory, 'WorkingSetSize': memory}
+
+
+def _terminate_process(handle, exit_code):
+    application = _processes.get(handle.pid)
+    if application is not None:
+        application._terminate()
+
+
+def set_faults(crash_every=0, hang_every=0, leak_mb=0.0):
+    """
+    设置注入的故障：每第crash_every次打开文档时Word崩溃，每第hang_every次打开文档时Word卡死，
+    每打开一个文档进程内存增长leak_mb（MB）。0表示不注入。
+    """
+    _faults.update(crash_every=crash_every, hang_every=hang_every, leak_mb=leak_mb)
+
+
+def install(latency=0.0, lang='zh', crash_every=0, hang_every=0, leak_mb=0.0):
+    """
+    注册假的win32com.client、pythoncom以及win32gui/win32process/win32api模块。
+    latency为每次COM调用附加的延迟（秒），lang为Word界面语言（决定样式名），其余参数见set_faults()。
+    """
+    global _call_latency, _open_count
+    _call_latency = latency
+    _open_count = 0
+    reset_call_count()
+    set_faults(crash_every, hang_every, leak_mb)
+
+    def dispatch(prog_id):
+        if not isinstance(prog_id, str):
+            # gencache.EnsureDispatch也接受已创建的对象
+            return prog_id
+        if prog_id != 'Word.Application':
+            raise ValueError(f'不支持的COM对象: {prog_id}')
+        return FakeWordApplication(lang)
+
+    client = types.ModuleType('win32com.client')
+    client.Dispatch = dispatch
+    client.DispatchEx = dispatch
+    client.gencache = types.SimpleNamespace(EnsureDispatch=dispatch)
+    package = types.ModuleType('win32com')
+    package.client = client
+    pythoncom = types.ModuleType('pythoncom')
+    pythoncom.CoInitialize = lambda: None
+    pythoncom.CoUninitialize = lambda: None
+    pythoncom.com_error = com_error
+    pywintypes = types.ModuleType('pywintypes')
+    pywintypes.com_error = com_error
+    win32gui = types.ModuleType('win32gui')
+    win32gui.FindWindow = _find_window
+    win32process = types.ModuleType('win32process')
+    win32process.GetWindowThreadProcessId = lambda hwnd: (hwnd, hwnd)
+    win32process.GetProcessMemoryInfo = _process_memory
+    win32api = types.ModuleType('win32api')
+    win32api.OpenProcess = _open_process
+    win32api.TerminateProcess = _terminate_process
+    win32api.CloseHandle = lambda handle: None
+    sys.modules['win32com'] = package
+    sys.modules['win32com.client'] = client
+    sys.modules['pythoncom'] = pythoncom
+    sys.modules['pywintypes'] = pywintypes
+    sys.modules['win32gui'] = win32gui
+    sys.modules['win32process'] = win32process
+    sys.modules['win32api'] = win32api
+
+
+def call_count():
+    """返回自install()以来的COM调用次数"""
+    return _call_count
+
+
+def reset_call_count():
+    global _call_count
+    _call_count = 0
@@ -0,0 +1,620 @@
+"""
+性能基准测试。
+
+在临时目录中生成确定性的测试语料，依次测量：
+标题提取（纯Python引擎 / doc读取器 / 模拟Word COM）、关键词匹配、切片、process_folder_by_delete的端到端吞吐量，
+以及只导出大纲（outline_export）的吞吐量和cli.py的冷启动耗时。
+结果写入JSON文件，可用--compare与之前的结果对比，发现性能回退；冷启动超过预算（--cold-start-budget）
+或启动时加载了应按需导入的模块时同样返回非零退出码。
+
+用法：
+    python benchmarks/run_benchmarks.py --docs 20 --paragraphs 2000 --output result.json
+    python benchmarks/run_benchmarks.py --compare baseline.json
+"""
+import argparse
+import compileall
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import corpus  # noqa: E402
+import fake_com  # noqa: E402
+
+# 冷启动时不应加载的模块：Word的COM绑定、进度条、Word会话池、HTTP服务等只在用到时才导入
+LAZY_MODULES = ('win32com', 'pythoncom', 'tqdm', 'head_geter', 'word_pool', 'slice_server', 'http.client')
+
+# 冷启动预算（秒）：在新进程中用cli.py切片一个文档的中位耗时
+COLD_START_BUDGET = 0.5
+
+# 切片使用的章节关键词：中文语料与config.ini默认值一致（绪论、实验设计）
+SECTIONS = {lang: ([names[0]], [names[5]]) for lang, names in corpus.CHAPTERS.items()}
+
+
+def summarize(samples, items=None):
+    """计算耗时样本（秒）的统计值；items为处理的条目数，用于计算吞吐量"""
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(p):
+        if not ordered:
+            return 0.0
+        index = min(count - 1, max(0, int(round(p / 100 * count + 0.5)) - 1))
+        return ordered[index]
+
+    total = sum(ordered)
+    stats = {
+        'count': count,
+        'total': total,
+        'mean': total / count if count else 0.0,
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'max': ordered[-1] if ordered else 0.0,
+    }
+    if items is not None and total > 0:
+        stats['throughput'] = items / total
+    return stats
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_extract_native(paths):
+    from docx_head_geter import DocxHeadGetter
+
+    getter = DocxHeadGetter()
+    samples = []
+    for path in paths:
+        elapsed, (tree, _) = timed(getter.get_document_titles_tree, path)
+        if tree is None:
+            raise RuntimeError(f'标题提取失败: {path}')
+        samples.append(elapsed)
+    return summarize(samples, len(paths))
+
+
+def bench_extract_doc(paths):
+    from doc_reader import DocHeadGetter
+
+    getter = DocHeadGetter()
+    samples = []
+    for path in paths:
+        elapsed, (tree, _) = timed(getter.get_document_titles_tree, path)
+        if tree is None:
+            raise RuntimeError(f'标题提取失败: {path}')
+        samples.append(elapsed)
+    return summarize(samples, len(paths))
+
+
+def bench_extract_com(paths):
+    from head_geter import WordHeadGetter
+
+    getter = WordHeadGetter()
+    samples = []
+    fake_com.reset_call_count()
+    try:
+        for path in paths:
+            elapsed, (tree, doc) = timed(getter.get_document_titles_tree, path)
+            if tree is None:
+                raise RuntimeError(f'标题提取失败: {path}')
+            doc.Close(False)
+            samples.append(elapsed)
+    finally:
+        getter.quit()
+    stats = summarize(samples, len(paths))
+    stats['com_calls_per_doc'] = fake_com.call_count() / len(paths)
+    return stats
+
+
+def _naive_first_match(keywords, titles):
+    """逐个关键词遍历标题的子串查找（KeywordMatcher之前的做法）"""
+    for keyword in keywords:
+        for index, title in enumerate(titles):
+            if keyword in title:
+                return index
+    return None
+
+
+# (关键词, 标题, 是否应命中)：编号前缀被忽略，但标题本身以数字开头时数字不能被当作编号去掉
+KEYWORD_CASES = [
+    ('绪论', '1. 绪论', True),
+    ('研究背景', '1.2 研究背景', True),
+    ('研究背景', '1.2研究背景', True),
+    ('结论', '3、结论', True),
+    ('总论', '第3章 总论', True),
+    ('2024年总结', '2024年总结', True),
+    ('2024年总结', '2023年总结', False),
+    ('5G建设方案', '5G建设方案', True),
+    ('5G建设方案', '4G建设方案', False),
+    ('10kV配电工程', '10 kV配电工程', True),
+    ('10kV配电工程', '35 kV配电工程', False),
+    ('2024年度总结', '2024 年度总结', True),
+    ('2024年度总结', '2023 年度总结', False),
+    ('概述', '2 概述', True),
+]
+
+
+def check_keyword_cases():
+    from keyword_matcher import KeywordMatcher
+
+    for keyword, title, expected in KEYWORD_CASES:
+        if bool(KeywordMatcher([keyword]).search(title)) != expected:
+            raise RuntimeError(f'关键词匹配结果错误: {keyword!r} / {title!r}，应{"" if expected else "不"}命中')
+
+
+def bench_keyword_matching(title_count, keyword_count, rounds, seed):
+    from keyword_matcher import KeywordMatcher
+
+    check_keyword_cases()
+    rng = random.Random(seed)
+    words = corpus.CHAPTERS['zh'] + ['概述', '现状', '目标', '方法', '流程', '指标', '风险']
+    titles = [f'第{i + 1}章 {rng.choice(words)}{rng.randint(1, 999)}' for i in range(title_count)]
+    # 关键词大多不命中，最后一个出现在标题末尾附近，是匹配的最坏情况
+    keywords = [f'不存在的章节{i}' for i in range(keyword_count - 1)] + [titles[-1].split()[-1]]
+
+    build_elapsed, matcher = timed(KeywordMatcher, keywords)
+    matcher_samples = []
+    naive_samples = []
+    for _ in range(rounds):
+        elapsed, match = timed(matcher.first_match, titles)
+        matcher_samples.append(elapsed)
+        elapsed, naive = timed(_naive_first_match, keywords, titles)
+        naive_samples.append(elapsed)
+    if match is None or naive is None:
+        raise RuntimeError('关键词匹配基准未命中')
+    return {
+        'matcher': summarize(matcher_samples, rounds),
+        'naive': summarize(naive_samples, rounds),
+        'build': build_elapsed,
+        'titles': title_count,
+        'keywords': keyword_count,
+    }
+
+
+def check_doc_reader(out_folder, lang):
+    """
+    生成内容相同的doc和docx（含表格，不含图片），检查doc读取器识别的标题（文本和级别）与docx一致、
+    整篇转换为docx后表格数也一致（段落属性解析出错时标题会丢失级别、表格段落会被当作正文）
+    """
+    from doc_reader import DocPackage
+    from docx_slicer import DocxPackage
+
+    doc_path = os.path.join(out_folder, 'check.doc')
+    docx_path = os.path.join(out_folder, 'check.docx')
+    output = os.path.join(out_folder, 'check_doc.docx')
+    corpus.generate_doc(doc_path, paragraphs=400, tables=5, lang=lang)
+    corpus.generate_docx(docx_path, paragraphs=400, tables=5, lang=lang)
+    with DocPackage(doc_path) as doc, DocxPackage(docx_path) as docx:
+        if [title[::2] for title in doc.flat_titles] != [title[::2] for title in docx.headings.to_flat()]:
+            raise RuntimeError('doc读取器识别的标题与docx不一致')
+        doc.save_slice(output, 0, doc.content_end)
+    counts = []
+    for path in (output, docx_path):
+        with zipfile.ZipFile(path) as zf:
+            counts.append(zf.read('word/document.xml').count(b'<w:tbl>'))
+    if counts[0] != counts[1]:
+        raise RuntimeError(f'doc读取器转换结果的表格数({counts[0]})与docx({counts[1]})不一致')
+
+
+def bench_slice_native(paths, out_folder, lang, package_class=None):
+    """package_class为doc_reader.DocPackage时先检查doc读取器（check_doc_reader），再测量doc切片并转换为docx"""
+    from docx_slicer import DocxPackage
+    from geter3 import find_slice_range
+    from keyword_matcher import KeywordMatcher
+
+    package_class = package_class or DocxPackage
+    if package_class is not DocxPackage:
+        check_doc_reader(out_folder, lang)
+    section1 = KeywordMatcher(SECTIONS[lang][0])
+    section2 = KeywordMatcher(SECTIONS[lang][1])
+    samples = []
+    out_bytes = 0
+    for path in paths:
+        output = os.path.join(out_folder, os.path.splitext(os.path.basename(path))[0] + '.docx')
+        start = time.perf_counter()
+        with package_class(path) as package:
+            slice_range = find_slice_range(package.headings, package.content_end, section1, section2)
+            if slice_range is None:
+                raise RuntimeError(f'未找到切片区间: {path}')
+            package.save_slice(output, *slice_range)
+        samples.append(time.perf_counter() - start)
+        out_bytes += os.path.getsize(output)
+    stats = summarize(samples, len(paths))
+    stats['output_bytes'] = out_bytes
+    return stats
+
+
+def _batch_config(root, workers, lang, pipeline=True, word=None, dedupe=False, budget=False):
+    """
+    构造与read_config结构一致、路径指向root下各文件夹的配置，dedupe为True时启用重复输入检测，
+    budget为True时按config.ini中建议的值（600秒、2048MB）启用单个文件的处理预算（每个文件在独立的工作进程中处理）
+    """
+    folders = {
+        'input_folder': 'input', 'output_folder': 'output', 'unsupport_folder': 'unsupport',
+        'old_folder': 'old', 'temp_folder': 'temp',
+    }
+    return {
+        'paths': {key: os.path.join(root, name) for key, name in folders.items()},
+        'chapter_settings': {
+            'section1': SECTIONS[lang][0], 'section2': SECTIONS[lang][1],
+            'section1_offset': 1, 'section2_offset': 1, 'section1_level': 1, 'section2_level': 1,
+        },
+        'slices': {},
+        'matching': {},
+        'processing': {'wait_time': 1.0, 'verbose': False, 'workers': workers, 'doc_engine': 'native',
+                       'pipeline': pipeline, 'file_timeout': 600 if budget else 0,
+                       'file_memory_mb': 2048 if budget else 0},
+        'word': word or {},
+        'daemon': {},
+        'cache': {},
+        'dedupe': {'enabled': dedupe, 'path': os.path.join(root, 'cache', 'outputs.sqlite3'),
+                   'store_folder': os.path.join(root, 'cache', 'outputs')},
+    }
+
+
+def _with_latency(func, latency):
+    """在每次调用前等待latency秒，模拟网络共享上的文件操作往返延迟"""
+    def wrapper(*args, **kwargs):
+        time.sleep(latency)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def bench_end_to_end(paths, root, workers, lang, engine, pipeline=True, io_latency=0.0, word=None,
+                     allow_failures=False, copies=1, budget=False):
+    """
+    把语料复制到输入文件夹后运行一次process_folder_by_delete，统计吞吐量。
+    engine为'word'时把所有docx路由到Word(COM)路径，由模拟的COM处理；doc语料由纯Python读取器处理。
+    pipeline为False时关闭单进程流水线；io_latency为识别格式和每次移动文件附加的延迟(秒)；
+    word为Word会话池设置；allow_failures为True时（注入了COM故障）不要求每个文档都切片成功。
+    copies大于1时每个文档以不同文件名放入copies份，并启用重复输入检测；budget见_batch_config。
+    """
+    import geter3
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    config = _batch_config(root, workers, lang, pipeline, word, dedupe=copies > 1, budget=budget)
+    input_folder = config['paths']['input_folder']
+    os.makedirs(input_folder)
+    for path in paths:
+        base, ext = os.path.splitext(os.path.basename(path))
+        for i in range(copies):
+            name = base + ext if i == 0 else f"{base}_copy{i}{ext}"
+            shutil.copy2(path, os.path.join(input_folder, name))
+
+    engine_for, sniff_format, move_file = geter3.engine_for, geter3.sniff_format, geter3.move_file
+    if engine == 'word':
+        geter3.engine_for = lambda fmt: 'word' if engine_for(fmt) else None
+    if io_latency > 0:
+        geter3.sniff_format = _with_latency(sniff_format, io_latency)
+        geter3.move_file = _with_latency(move_file, io_latency)
+    try:
+        elapsed, _ = timed(geter3.process_folder_by_delete, config)
+    finally:
+        geter3.engine_for, geter3.sniff_format, geter3.move_file = engine_for, sniff_format, move_file
+    files = len(paths) * copies
+    produced = len(os.listdir(config['paths']['output_folder']))
+    if produced != files and not allow_failures:
+        raise RuntimeError(f'端到端处理只生成了 {produced}/{files} 个切片')
+    return {
+        'total': elapsed,
+        'files': files,
+        'produced': produced,
+        'workers': workers,
+        'pipeline': pipeline,
+        'copies': copies,
+        'budget': budget,
+        'throughput': files / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def check_outline_resume(paths, root):
+    """
+    检查outline_export的--resume：修改过的文档和之前出错的文档重新导出，导出文件中每个文档只保留一条记录，
+    未修改的文档不重新解析
+    """
+    from outline_export import export_outlines
+
+    folder = os.path.join(root, 'resume')
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for i, path in enumerate(paths):
+        names.append(f'{i}{os.path.splitext(path)[1]}')
+        shutil.copy2(path, os.path.join(folder, names[-1]))
+    broken = os.path.join(folder, 'broken.docx')
+    with open(broken, 'wb') as f:
+        f.write(b'PK\x03\x04 truncated')
+    output = os.path.join(root, 'resume.jsonl')
+    export_outlines([folder], output, 1)
+    shutil.copy2(paths[0], broken)
+    changed = os.path.join(folder, names[-1])
+    st = os.stat(changed)
+    os.utime(changed, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    counts = export_outlines([folder], output, 1, resume=True)
+    if counts != {'success': 2}:
+        raise RuntimeError(f'--resume应只重新导出2个文档，实际为 {counts}')
+    with open(output, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    files = [record['file'] for record in records]
+    if len(files) != len(set(files)) or len(files) != len(paths) + 1:
+        raise RuntimeError(f'--resume后导出文件中的记录与文档不是一一对应: {files}')
+    if any(record['status'] != 'success' for record in records):
+        raise RuntimeError('--resume后仍保留了出错文档的旧记录')
+
+
+def bench_outline_export(paths, root, workers):
+    """对整个语料文件夹（docx和doc）运行一次outline_export，统计吞吐量，之前先检查--resume"""
+    from outline_export import export_outlines
+
+    check_outline_resume(paths, root)
+    output = os.path.join(root, 'outline.jsonl')
+    elapsed, counts = timed(export_outlines, [os.path.dirname(path) for path in paths], output, workers)
+    files = sum(counts.values())
+    if counts.get('success', 0) != files:
+        raise RuntimeError(f'大纲导出只成功了 {counts.get("success", 0)}/{files} 个文档')
+    return {
+        'total': elapsed,
+        'files': files,
+        'workers': workers,
+        'throughput': files / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def bench_cold_start(path, root, lang, rounds):
+    """
+    每次启动新的Python进程，测量 空解释器、import geter3、cli.py -h、cli.py slice一个文档 的耗时，
+    并记录import geter3后已加载的按需导入模块（应为空列表）。测量前先编译字节码，与实际部署时一致。
+    """
+    compileall.compile_dir(REPO_DIR, maxlevels=0, quiet=1)
+    cli = os.path.join(REPO_DIR, 'cli.py')
+    section1, section2 = SECTIONS[lang]
+    probe = (f"import json, sys, geter3; "
+             f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))")
+    commands = {
+        'interpreter': [sys.executable, '-c', 'pass'],
+        'import': [sys.executable, '-c', probe],
+        'help': [sys.executable, cli, '-h'],
+        'slice': [sys.executable, cli, '-c', os.path.join(REPO_DIR, 'config.ini'), 'slice', path,
+                  '-o', os.path.join(root, 'slices'), '--section1', ','.join(section1),
+                  '--section2', ','.join(section2)],
+    }
+    result = {}
+    eager = []
+    for name, command in commands.items():
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            completed = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+            samples.append(time.perf_counter() - started)
+            if completed.returncode != 0:
+                raise RuntimeError(f'{" ".join(command)} 返回 {completed.returncode}: {completed.stderr[-500:]}')
+        if name == 'import':
+            eager = json.loads(completed.stdout)
+        result[name] = summarize(samples)
+    result['eager_modules'] = eager
+    return result
+
+
+def bench_end_to_end_com(paths, root, args):
+    """通过Word会话池（模拟的COM）端到端处理，只在这一步注入崩溃、卡死和内存增长"""
+    fake_com.set_faults(args.com_crash_every, args.com_hang_every, args.com_leak_mb)
+    try:
+        return bench_end_to_end(
+            paths, root, args.workers, args.lang, 'word', io_latency=args.io_latency,
+            word={'document_timeout': args.word_timeout, 'probe_timeout': args.word_timeout},
+            allow_failures=bool(args.com_crash_every or args.com_hang_every)
+        )
+    finally:
+        fake_com.set_faults()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# 对比时使用的指标：(路径, 数值越大越好)
+_COMPARED_METRICS = [
+    (('extract_native', 'p50'), False),
+    (('extract_doc', 'p50'), False),
+    (('extract_com', 'p50'), False),
+    (('keyword_matching', 'matcher', 'p50'), False),
+    (('slice_native', 'p50'), False),
+    (('slice_doc', 'p50'), False),
+    (('end_to_end_native', 'throughput'), True),
+    (('end_to_end_sequential', 'throughput'), True),
+    (('end_to_end_doc', 'throughput'), True),
+    (('end_to_end_com', 'throughput'), True),
+    (('end_to_end_duplicates', 'throughput'), True),
+    (('end_to_end_isolated', 'throughput'), True),
+    (('outline_export', 'throughput'), True),
+    (('cold_start', 'import', 'p50'), False),
+    (('cold_start', 'slice', 'p50'), False),
+]
+
+
+def _lookup(results, path):
+    value = results.get('benchmarks', {})
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(current, baseline, threshold):
+    """打印与基线的对比，返回是否存在超过threshold（比例）的回退"""
+    regressed = False
+    print(f"{'指标':<40}{'基线':>14}{'本次':>14}{'变化':>10}", file=sys.stderr)
+    for path, higher_is_better in _COMPARED_METRICS:
+        old = _lookup(baseline, path)
+        new = _lookup(current, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > threshold:
+            flag = '  回退'
+            regressed = True
+        print(f"{'.'.join(path):<40}{old:>14.6f}{new:>14.6f}{change:>+10.1%}{flag}", file=sys.stderr)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Word-Geter性能基准测试')
+    parser.add_argument('--docs', type=int, default=10, help='测试语料的文档数')
+    parser.add_argument('--paragraphs', type=int, default=2000, help='每个文档的正文段落数')
+    parser.add_argument('--heading-every', type=int, default=15, help='平均每多少段出现一个标题')
+    parser.add_argument('--depth', type=int, default=3, help='标题最大级别')
+    parser.add_argument('--tables', type=int, default=5, help='每个文档的表格数')
+    parser.add_argument('--images', type=int, default=3, help='每个文档的图片数')
+    parser.add_argument('--lang', choices=['zh', 'en'], default='zh', help='标题样式的语言')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--com-latency', type=float, default=0.0,
+                        help='模拟Word每次COM调用的延迟(秒)')
+    parser.add_argument('--com-crash-every', type=int, default=0,
+                        help='模拟的Word每打开多少个文档崩溃一次（0表示不注入）')
+    parser.add_argument('--com-hang-every', type=int, default=0,
+                        help='模拟的Word每打开多少个文档卡死一次（0表示不注入）')
+    parser.add_argument('--com-leak-mb', type=float, default=0.0,
+                        help='模拟的Word每打开一个文档增长的内存(MB)')
+    parser.add_argument('--word-timeout', type=float, default=10.0,
+                        help='端到端测试中Word会话池处理单个文档的超时(秒)，超时视为卡死')
+    parser.add_argument('--io-latency', type=float, default=0.0,
+                        help='端到端测试中模拟每次文件操作（识别格式、移动文件）的网络延迟(秒)')
+    parser.add_argument('--duplicates', type=int, default=4,
+                        help='重复输入测试中每个文档以不同文件名放入的份数')
+    parser.add_argument('--workers', type=int, default=1, help='端到端测试的工作进程数')
+    parser.add_argument('--keep', action='store_true', help='保留生成的临时文件')
+    parser.add_argument('--output', help='结果JSON文件路径（默认输出到标准输出）')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='判定为回退的变化比例（默认0.2，即20%%）')
+    parser.add_argument('--cold-start-budget', type=float, default=COLD_START_BUDGET,
+                        help=f'cli.py切片一个文档的冷启动预算(秒，默认{COLD_START_BUDGET:g})')
+    args = parser.parse_args(argv)
+
+    fake_com.install(latency=args.com_latency, lang=args.lang)
+    # geter3在导入时配置日志，先导入再降低日志级别
+    import geter3  # noqa: F401
+    from doc_reader import DocPackage
+    logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix='word-geter-bench-')
+    try:
+        corpus_params = dict(
+            paragraphs=args.paragraphs, heading_every=args.heading_every, max_depth=args.depth,
+            tables=args.tables, images=args.images, lang=args.lang,
+        )
+        elapsed, paths = timed(corpus.generate_corpus, os.path.join(work_dir, 'corpus'), args.docs,
+                               seed=args.seed, **corpus_params)
+        print(f"已生成 {len(paths)} 个文档，用时 {elapsed:.2f} 秒: {work_dir}", file=sys.stderr)
+        # 内容相同的doc语料（不含图片）
+        doc_paths = corpus.generate_corpus(os.path.join(work_dir, 'corpus_doc'), args.docs,
+                                           seed=args.seed, fmt='doc', **corpus_params)
+
+        benchmarks = {}
+        steps = [
+            ('extract_native', lambda: bench_extract_native(paths)),
+            ('extract_doc', lambda: bench_extract_doc(doc_paths)),
+            ('extract_com', lambda: bench_extract_com(paths)),
+            ('keyword_matching', lambda: bench_keyword_matching(2000, 50, 20, args.seed)),
+            ('slice_native', lambda: bench_slice_native(paths, os.path.join(work_dir, 'slices'), args.lang)),
+            ('slice_doc', lambda: bench_slice_native(
+                doc_paths, os.path.join(work_dir, 'slices'), args.lang, DocPackage)),
+            ('end_to_end_native', lambda: bench_end_to_end(
+                paths, os.path.join(work_dir, 'e2e_native'), args.workers, args.lang, 'native',
+                io_latency=args.io_latency)),
+            ('end_to_end_sequential', lambda: bench_end_to_end(
+                paths, os.path.join(work_dir, 'e2e_sequential'), args.workers, args.lang, 'native',
+                pipeline=False, io_latency=args.io_latency)),
+            ('end_to_end_doc', lambda: bench_end_to_end(
+                doc_paths, os.path.join(work_dir, 'e2e_doc'), args.workers, args.lang, 'native',
+                io_latency=args.io_latency)),
+            ('end_to_end_com', lambda: bench_end_to_end_com(paths, os.path.join(work_dir, 'e2e_com'), args)),
+            ('end_to_end_duplicates', lambda: bench_end_to_end(
+                paths, os.path.join(work_dir, 'e2e_duplicates'), args.workers, args.lang, 'native',
+                io_latency=args.io_latency, copies=args.duplicates)),
+            ('end_to_end_isolated', lambda: bench_end_to_end(
+                paths, os.path.join(work_dir, 'e2e_isolated'), args.workers, args.lang, 'native',
+                io_latency=args.io_latency, budget=True)),
+            ('outline_export', lambda: bench_outline_export(
+                [paths[0], doc_paths[0]], os.path.join(work_dir, 'outline'), args.workers)),
+            ('cold_start', lambda: bench_cold_start(
+                paths[0], os.path.join(work_dir, 'cold_start'), args.lang, 5)),
+        ]
+        os.makedirs(os.path.join(work_dir, 'slices'))
+        for name, step in steps:
+            print(f"运行: {name}", file=sys.stderr)
+            benchmarks[name] = step()
+
+        results = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'revision': _git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'docs': args.docs,
+                'seed': args.seed,
+                'com_latency': args.com_latency,
+                'com_faults': {'crash_every': args.com_crash_every, 'hang_every': args.com_hang_every,
+                               'leak_mb': args.com_leak_mb},
+                'io_latency': args.io_latency,
+                'duplicates': args.duplicates,
+                'corpus': corpus_params,
+                'corpus_bytes': sum(os.path.getsize(path) for path in paths),
+            },
+            'benchmarks': benchmarks,
+        }
+    finally:
+        if args.keep:
+            print(f"临时文件已保留: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            status = 1
+    cold_start = benchmarks['cold_start']
+    if cold_start['slice']['p50'] > args.cold_start_budget:
+        print(f"冷启动超出预算：cli.py切片一个文档用时 {cold_start['slice']['p50']:.3f} 秒，"
+              f"预算 {args.cold_start_budget:g} 秒", file=sys.stderr)
+        status = 1
+    if cold_start['eager_modules']:
+        print(f"导入geter3时加载了应按需导入的模块: {', '.join(cold_start['eager_modules'])}", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
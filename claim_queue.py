@@ -0,0 +1,325 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from file_ops import write_atomic
+from journal import BatchJournal
+
+# 输入文件夹中存放认领记录的子文件夹（以.开头，不会被当作输入文件）
+CLAIMS_FOLDER = '.claims'
+LEASE_SUFFIX = '.lease'
+# 回收标记：<节点>.lease.reclaim-<回收它的节点>
+RECLAIM_SUFFIX = '.reclaim-'
+# 节点的处理日志放在它的认领文件夹中，节点失联后由回收它的节点按日志恢复
+JOURNAL_NAME = 'journal.jsonl'
+
+# Word锁文件和隐藏文件，不认领
+_IGNORED_PREFIXES = ('~$', '.')
+
+
+def default_node_id():
+    """默认的节点标识：主机名-进程号（同一台机器上的多个进程互不冲突）"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _recover_journal(path, fsync=True):
+    """按节点的处理日志回滚或前滚中断的文件（原文件留在或退回节点的认领文件夹），然后删除日志"""
+    if not os.path.exists(path):
+        return
+    journal = BatchJournal(path, fsync)
+    try:
+        journal.recover()
+    finally:
+        journal.close()
+    os.remove(path)
+
+
+class ClaimQueue:
+    """
+    多个节点共享同一个输入文件夹时的文件认领队列。
+    - 认领：把文件从输入文件夹重命名到本节点的认领文件夹 <输入文件夹>/.claims/<节点>/，
+      同一文件系统内的重命名是原子的，同一个文件只有一个节点能认领成功；每次列出文件夹后认领最多batch_size个文件，
+      减少共享文件夹上的元数据往返
+    - 租约：本节点的租约文件 .claims/<节点>.lease 由后台线程每heartbeat_interval秒改写一次。
+      其他节点观察到某个租约超过lease_timeout秒（按观察者自己的时钟计算，不受各节点时钟偏差影响）没有变化时，
+      认为该节点已失联：先把租约原子地重命名为回收标记（只有一个节点能成功），再按它的处理日志恢复中断的文件，
+      把它认领但未处理完的文件退回输入文件夹，由各节点重新认领
+    - 本节点的租约被其他节点回收后（例如长时间失去网络连接），不再认领新文件
+    lease_timeout应明显大于heartbeat_interval；处理中的文件不影响续约（续约在后台线程中进行）。
+    """
+
+    def __init__(self, input_folder, node_id=None, lease_timeout=120, heartbeat_interval=15, batch_size=8,
+                 fsync=True):
+        self.input_folder = input_folder
+        self.node_id = node_id or default_node_id()
+        self.lease_timeout = lease_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.batch_size = max(1, batch_size)
+        self.fsync = fsync
+        self.claims_folder = os.path.join(input_folder, CLAIMS_FOLDER)
+        self.folder = os.path.join(self.claims_folder, self.node_id)
+        self.lease_path = os.path.join(self.claims_folder, self.node_id + LEASE_SUFFIX)
+        self.journal_path = os.path.join(self.folder, JOURNAL_NAME)
+        # 本节点的租约已被其他节点回收
+        self.lost = False
+        self.claimed = 0
+        self.reclaimed = 0
+        self._renewals = 0
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self._waiting = False
+        # 观察到的其他节点的租约：节点 -> (租约文件的签名, 首次观察到该签名的时间)
+        self._observed = {}
+
+    def start(self):
+        """创建认领文件夹和租约，开始后台续约"""
+        if os.path.isdir(self.folder):
+            # 配置了固定的节点标识时，上次异常退出留下的文件先恢复并退回输入文件夹
+            self._release()
+        os.makedirs(self.folder, exist_ok=True)
+        self._renew(create=True)
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+        logging.info(f"协调模式：节点 {self.node_id}，租约 {self.lease_timeout:g} 秒，每批认领 {self.batch_size} 个文件")
+        return self
+
+    def _renew(self, create=False):
+        """
+        改写租约。续约时（create为False）只原地改写已有的租约文件：租约被其他节点重命名为回收标记后，
+        打开失败（FileNotFoundError），不会像先写临时文件再替换那样把租约重新创建出来
+        """
+        self._renewals += 1
+        record = {'node': self.node_id, 'host': socket.gethostname(), 'pid': os.getpid(),
+                  'renewals': self._renewals, 'time': time.time()}
+        data = json.dumps(record).encode('utf-8')
+        if create:
+            write_atomic(self.lease_path, data)
+            return
+        with open(self.lease_path, 'r+b') as f:
+            f.write(data)
+            f.truncate()
+
+    def _reclaim_started(self):
+        """其他节点是否已开始回收本节点（租约已不存在，或存在本节点的回收标记）"""
+        if not os.path.exists(self.lease_path):
+            return True
+        prefix = self.node_id + LEASE_SUFFIX + RECLAIM_SUFFIX
+        try:
+            return any(name.startswith(prefix) for name in os.listdir(self.claims_folder))
+        except OSError:
+            return False
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self._renew()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"续约失败: {e}")
+                continue
+            # 改写后再确认一次：回收可能恰好发生在打开租约文件之后
+            if self._reclaim_started():
+                # 租约已被其他节点回收，不能再重新创建（它认领的文件可能已被别的节点处理）
+                logging.error(f"节点 {self.node_id} 的租约已被其他节点回收，停止认领新文件")
+                self.lost = True
+                return
+
+    def _lease_files(self):
+        """其他节点的租约（及回收标记）：节点 -> 文件名"""
+        leases = {}
+        try:
+            names = os.listdir(self.claims_folder)
+        except OSError as e:
+            logging.error(f"读取认领文件夹失败: {e}")
+            return leases
+        for name in names:
+            # 只认 <节点>.lease 和 <节点>.lease.reclaim-<节点>，不包括改写租约时的临时文件（<节点>.lease.tmp）
+            if name.endswith(LEASE_SUFFIX):
+                node = name[:-len(LEASE_SUFFIX)]
+            else:
+                node, sep, reclaimer = name.partition(LEASE_SUFFIX + RECLAIM_SUFFIX)
+                if not sep or not reclaimer:
+                    continue
+            if node and node != self.node_id:
+                leases[node] = name
+        return leases
+
+    def _expired(self, node, name):
+        """租约文件在lease_timeout秒内没有变化（按本节点的时钟计算）"""
+        try:
+            st = os.stat(os.path.join(self.claims_folder, name))
+        except OSError:
+            self._observed.pop(node, None)
+            return False
+        signature = (name, st.st_size, st.st_mtime_ns)
+        now = time.monotonic()
+        seen = self._observed.get(node)
+        if seen is None or seen[0] != signature:
+            self._observed[node] = (signature, now)
+            return False
+        return now - seen[1] >= self.lease_timeout
+
+    def reclaim_expired(self):
+        """回收租约已过期的节点认领的文件，返回退回输入文件夹的文件数"""
+        returned = 0
+        for node, name in self._lease_files().items():
+            if self._expired(node, name):
+                returned += self._reclaim(node, name)
+        return returned
+
+    def _reclaim(self, node, name):
+        marker = os.path.join(self.claims_folder, f"{node}{LEASE_SUFFIX}{RECLAIM_SUFFIX}{self.node_id}")
+        try:
+            # 只有一个节点能把租约重命名成功，由它负责回收
+            os.rename(os.path.join(self.claims_folder, name), marker)
+        except OSError:
+            return 0
+        self._observed.pop(node, None)
+        logging.warning(f"节点 {node} 的租约已过期，回收它认领的文件")
+        folder = os.path.join(self.claims_folder, node)
+        # 按失联节点的日志恢复中断的文件，随后和它认领的其他文件一起退回输入文件夹
+        _recover_journal(os.path.join(folder, JOURNAL_NAME), self.fsync)
+        returned = failed = 0
+        for file_name in os.listdir(folder) if os.path.isdir(folder) else []:
+            target = os.path.join(self.input_folder, file_name)
+            try:
+                if os.path.exists(target):
+                    raise FileExistsError(f"输入文件夹中已有同名文件: {target}")
+                os.rename(os.path.join(folder, file_name), target)
+                returned += 1
+            except OSError as e:
+                logging.error(f"退回文件失败: {file_name}, {e}")
+                failed += 1
+        if failed:
+            # 回收标记保留，租约超时后再次回收
+            return returned
+        try:
+            if os.path.isdir(folder):
+                os.rmdir(folder)
+            os.remove(marker)
+        except OSError as e:
+            logging.error(f"清理节点 {node} 的认领记录失败: {e}")
+        self.reclaimed += returned
+        logging.info(f"已把节点 {node} 的 {returned} 个文件退回输入文件夹")
+        return returned
+
+    def claim_batch(self):
+        """
+        认领最多batch_size个文件，返回认领后的路径（位于本节点的认领文件夹中）。
+        输入文件夹中没有可认领的文件时返回空列表；先回收失联节点的文件，使它们可以被认领。
+        """
+        if self.lost:
+            return []
+        self.reclaim_expired()
+        try:
+            names = [name for name in os.listdir(self.input_folder) if not name.startswith(_IGNORED_PREFIXES)]
+        except OSError as e:
+            logging.error(f"读取输入文件夹失败: {e}")
+            return []
+        # 各节点按不同顺序尝试，减少同时争抢同一个文件
+        random.shuffle(names)
+        claimed = []
+        for name in names:
+            if len(claimed) >= self.batch_size:
+                break
+            source = os.path.join(self.input_folder, name)
+            target = os.path.join(self.folder, name)
+            if os.path.exists(target) or not os.path.isfile(source):
+                continue
+            try:
+                os.rename(source, target)
+            except FileNotFoundError:
+                # 已被其他节点认领
+                continue
+            except OSError as e:
+                logging.error(f"认领文件失败: {name}, {e}")
+                continue
+            claimed.append(target)
+        if claimed:
+            self.claimed += len(claimed)
+            logging.info(f"节点 {self.node_id} 认领了 {len(claimed)} 个文件")
+        return claimed
+
+    def _pending_elsewhere(self):
+        """其他节点（包括尚未回收的失联节点）的认领文件夹中是否还有文件"""
+        for node in self._lease_files():
+            folder = os.path.join(self.claims_folder, node)
+            try:
+                if any(name != JOURNAL_NAME for name in os.listdir(folder)):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def wait_for_others(self):
+        """
+        输入文件夹中已没有可认领的文件时调用：其他节点还有未处理完的文件时等待一个续约间隔后返回True
+        （这些节点失联时文件会被回收，需要继续认领），否则返回False
+        """
+        if self.lost or not self._pending_elsewhere():
+            return False
+        if not self._waiting:
+            logging.info("输入文件夹中已没有可认领的文件，等待其他节点处理完（节点失联时回收它认领的文件）")
+            self._waiting = True
+        time.sleep(self.heartbeat_interval)
+        return True
+
+    def batches(self):
+        """逐批认领文件，直到没有可认领的文件"""
+        while True:
+            claimed = self.claim_batch()
+            if not claimed:
+                return
+            yield claimed
+
+    def claimed_files(self):
+        """逐个给出认领的文件，一批处理完后才认领下一批（本节点最多占着batch_size个未开始处理的文件）"""
+        for claimed in self.batches():
+            yield from claimed
+
+    def close(self):
+        """
+        停止续约；按处理日志恢复中断的文件（处理被异常中止时），把认领了但未处理的文件退回输入文件夹，
+        删除认领文件夹和租约。调用前应关闭本进程打开的处理日志（见geter3.process_claimed）。
+        """
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self.lost or not os.path.isdir(self.folder):
+            return
+        self._release()
+        try:
+            os.rmdir(self.folder)
+            os.remove(self.lease_path)
+        except OSError as e:
+            logging.error(f"清理认领记录失败: {e}")
+        logging.info(f"节点 {self.node_id}：认领 {self.claimed} 个文件，回收失联节点的文件 {self.reclaimed} 个")
+
+    def _release(self):
+        """
+        按本节点的处理日志恢复中断的文件，把认领文件夹中的文件退回输入文件夹。
+        输入文件夹中已有同名的（更新的）文件时不覆盖它，文件留在认领文件夹中，
+        认领记录和租约随之保留，租约过期后由其他节点再次尝试回收
+        """
+        _recover_journal(self.journal_path, self.fsync)
+        for file_name in os.listdir(self.folder):
+            target = os.path.join(self.input_folder, file_name)
+            try:
+                if os.path.exists(target):
+                    raise FileExistsError(f"输入文件夹中已有同名文件: {target}")
+                os.rename(os.path.join(self.folder, file_name), target)
+                logging.info(f"未处理的文件已退回输入文件夹: {file_name}")
+            except OSError as e:
+                logging.error(f"退回文件失败: {file_name}, {e}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
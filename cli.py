@@ -0,0 +1,213 @@
+import argparse
+import logging
+import os
+import sys
+
+# 各命令只在执行时才导入用到的模块：切片引擎、Word的COM绑定、进度条、HTTP服务等都按需加载，
+# 因此定时任务触发的短时运行、或每个请求启动一次的子进程只承担实际用到部分的启动开销
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# fix-extension只处理这些扩展名的文件
+_WORD_EXTENSIONS = ('.doc', '.docx')
+
+
+def _load_config(config_file):
+    """读取并检查配置文件，有误时返回None"""
+    from geter3 import read_config
+
+    config = read_config(config_file)
+    if config is None:
+        logging.error(f"无法加载配置文件 {config_file}，程序退出")
+    return config
+
+
+def cmd_run(args):
+    """按配置处理input_file文件夹（与python geter3.py相同）"""
+    config = _load_config(args.config)
+    if config is None:
+        return 1
+    from geter3 import process_folder_by_delete
+
+    process_folder_by_delete(config)
+    return 0
+
+
+def _slice_spec(config, args):
+    """--slice使用[Slice:<名称>]，--section1等参数覆盖[ChapterSettings]中的对应设置"""
+    from slicer import make_slice_spec
+
+    matching = config.get('matching', {})
+    if args.slice:
+        settings = config.get('slices', {}).get(args.slice)
+        if settings is None:
+            logging.error(f"未配置命名切片: [Slice:{args.slice}]")
+            return None
+        return make_slice_spec(args.slice, settings, matching)
+    settings = dict(config.get('chapter_settings', {}))
+    for key in ['section1', 'section2']:
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = [keyword for keyword in value.split(',') if keyword.strip()]
+    for key in ['section1_offset', 'section2_offset', 'section1_level', 'section2_level']:
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = value
+    return make_slice_spec(None, settings, matching)
+
+
+def cmd_slice(args):
+    """
+    切片指定的文档，结果写为 <输出文件夹>/<文件名>_<切片名或slice>.<扩展名>，不移动或修改输入文件。
+    docx和（按设置）doc在内存中切片；rtf、html等需要Word的格式第一次遇到时才启动Word。
+    """
+    config = _load_config(args.config)
+    if config is None:
+        return 1
+    spec = _slice_spec(config, args)
+    if spec is None:
+        return 2
+    from format_sniffer import sniff_data
+    from geter3 import choose_engine, open_heading_cache, output_base, resolve_doc_engine
+    from slicer import slice_bytes
+
+    doc_engine = resolve_doc_engine(config['processing'].get('doc_engine', 'auto'))
+    cache = open_heading_cache(config, BASE_DIR)
+    word_service = None
+    status = 0
+    try:
+        for path in args.documents:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                fmt = sniff_data(data)
+                engine = choose_engine(fmt, doc_engine)
+                if engine == 'word':
+                    if word_service is None:
+                        # 与HTTP服务相同：Word在专用线程中处理，通过临时文件打开上传的内容
+                        from slice_server import SliceService
+                        word_service = SliceService(config, BASE_DIR)
+                    content, ext = word_service.slice(data, spec)
+                elif engine is not None:
+                    content, ext = slice_bytes(data, spec, cache), '.docx'
+                else:
+                    logging.error(f"不支持的格式({fmt}): {path}")
+                    status = 1
+                    continue
+            except Exception as e:
+                logging.error(f"切片失败: {path}, {e}")
+                status = 1
+                continue
+            if content is None:
+                logging.warning(f"未找到指定章节或切片区间超出标题范围: {path}")
+                status = 1
+                continue
+            folder = args.output_folder or os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder, exist_ok=True)
+            base = output_base(os.path.basename(path), ext)
+            out_path = os.path.join(folder, f"{base}_{spec['name'] or 'slice'}{ext}")
+            with open(out_path, 'wb') as f:
+                f.write(content)
+            logging.info(f"已切片: {path} -> {out_path}")
+    finally:
+        if word_service is not None:
+            word_service.close()
+        if cache is not None:
+            cache.close()
+    return status
+
+
+def cmd_outline(args):
+    """导出文档的标题大纲，参数见outline_export.py"""
+    import outline_export
+
+    return outline_export.main(args.args)
+
+
+def _iter_word_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(_WORD_EXTENSIONS) and not name.startswith('~$'):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def cmd_fix_extension(args):
+    """按文件内容判断的实际格式修正doc/docx文件的扩展名（默认处理input_file文件夹）"""
+    from format_sniffer import corrected_name, fix_extension, sniff_format
+
+    paths = args.paths or [os.path.join(BASE_DIR, 'input_file')]
+    renamed = 0
+    for path in _iter_word_files(paths):
+        try:
+            fmt = sniff_format(path)
+            name = os.path.basename(path)
+            if corrected_name(name, fmt) == name:
+                if fmt in ('zip', 'ole', 'unknown'):
+                    logging.warning(f"{path} 不是Word文档（{fmt}），建议人工确认")
+                continue
+            if args.dry_run:
+                logging.info(f"{path} 实际为{fmt}，应改名为 {corrected_name(name, fmt)}")
+                continue
+            new_path = fix_extension(path, fmt)
+            if new_path != path:
+                logging.info(f"已将 {path} 重命名为 {new_path}（实际为{fmt}）")
+                renamed += 1
+            else:
+                logging.warning(f"{path} 实际为{fmt}，但目标文件 {corrected_name(name, fmt)} 已存在，未重命名")
+        except OSError as e:
+            logging.error(f"修正扩展名失败: {path}, {e}")
+    logging.info(f"修正了 {renamed} 个文件的扩展名")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Word文档切片工具')
+    parser.add_argument('-c', '--config', default='config.ini', help='配置文件路径（默认config.ini）')
+    commands = parser.add_subparsers(dest='command', metavar='命令')
+    commands.required = True
+
+    run = commands.add_parser('run', help='按配置处理input_file文件夹')
+    run.set_defaults(func=cmd_run)
+
+    slice_parser = commands.add_parser('slice', help='切片指定的文档，不移动输入文件')
+    slice_parser.add_argument('documents', nargs='+', help='要切片的文档')
+    slice_parser.add_argument('-o', '--output-folder', help='输出文件夹（默认与文档相同）')
+    slice_parser.add_argument('--slice', help='使用[Slice:<名称>]的设置')
+    slice_parser.add_argument('--section1', help='起始章节关键词（逗号分隔），覆盖[ChapterSettings]')
+    slice_parser.add_argument('--section2', help='结束章节关键词（逗号分隔），覆盖[ChapterSettings]')
+    for key in ['section1_offset', 'section2_offset', 'section1_level', 'section2_level']:
+        slice_parser.add_argument('--' + key.replace('_', '-'), dest=key, type=int,
+                                  help=f'覆盖[ChapterSettings]的{key}')
+    slice_parser.set_defaults(func=cmd_slice)
+
+    # 其余参数原样交给outline_export.py解析
+    outline = commands.add_parser('outline', add_help=False, help='导出文档的标题大纲（参数见outline -h）')
+    outline.set_defaults(func=cmd_outline)
+
+    fix = commands.add_parser('fix-extension', help='按实际格式修正doc/docx文件的扩展名')
+    fix.add_argument('paths', nargs='*', help='文件或文件夹（默认为input_file文件夹）')
+    fix.add_argument('-n', '--dry-run', action='store_true', help='只列出需要修正的文件，不重命名')
+    fix.set_defaults(func=cmd_fix_extension)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.func is cmd_outline:
+        args.args = extra
+    elif extra:
+        parser.error(f"无法识别的参数: {' '.join(extra)}")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        logging.warning("已中断")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
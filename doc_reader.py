@@ -0,0 +1,778 @@
+import logging
+import re
+import struct
+import sys
+import zipfile
+from array import array
+from bisect import bisect_right
+
+from docx_head_geter import BODY_TEXT_LEVEL, DocxDocument, heading_level
+from heading_index import HeadingIndex
+import metrics
+
+# 写出XML文本时需要转义的字符（不使用xml.sax.saxutils，它会连带导入urllib.request、http.client等，拖慢启动）
+_XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# 复合文档中的特殊扇区号
+_MAXREGSECT = 0xFFFFFFFA
+_NOSTREAM = 0xFFFFFFFF
+
+# Word 97-2003文档的FIB标识和最低版本号（更早的Word 6.0/95格式结构不同）
+WORD_IDENT = 0xA5EC
+MIN_NFIB = 0x00C0
+
+_FIB_ENCRYPTED = 0x0100
+_FIB_WHICH_TABLE = 0x0200
+
+# FibRgFcLcb97中用到的 (fc, lcb) 对的序号
+_FC_STSHF = 1
+_FC_PLCFSED = 6
+_FC_PLCFBTEPAPX = 13
+_FC_CLX = 33
+
+# 段落属性中用到的sprm
+_SPRM_P_ISTD = 0x4600
+_SPRM_P_FINTABLE = 0x2416
+_SPRM_P_FTTP = 0x2417
+_SPRM_P_OUTLVL = 0x2640
+_SPRM_P_ITAP = 0x6649
+_SPRM_P_FINNERTTP = 0x244C
+# sprmTDefTable：操作数长度由两字节计数给出
+_SPRM_T_DEFTABLE = 0xD608
+# sprmPChgTabs：操作数长度为一字节计数，为255时按其中删除和添加的制表位个数计算
+_SPRM_P_CHGTABS = 0xC615
+# spra -> 操作数字节数（6为变长）
+_SPRA_SIZES = (1, 1, 2, 4, 2, 2, None, 3)
+
+_FKP_SIZE = 512
+_ISTD_NIL = 0x0FFF
+
+# 段落结束符：段落标记、单元格/行结束符，以及作为节结束的分页符
+_PARA_MARK_RE = re.compile('[\r\x07\x0c]')
+_FIELD_SPLIT_RE = re.compile('([\x13\x14\x15])')
+_SURROGATE_RE = re.compile('[\ud800-\udfff]')
+_RUN_SPLIT_RE = re.compile('([\t\x0b\x0c])')
+
+# 文本中需要去掉的控制字符（图片、脚注引用等占位符）；保留制表符、换行符和分页符，不间断连字符改为"-"
+_TEXT_TABLE = {code: None for code in range(0x20) if code not in (0x09, 0x0b, 0x0c)}
+_TEXT_TABLE[0x1e] = '-'
+# 标题文本中换行符和分页符也去掉（与docx引擎一致）
+_TITLE_TABLE = dict(_TEXT_TABLE)
+_TITLE_TABLE.update({0x0b: None, 0x0c: None})
+
+
+class DocFormatError(Exception):
+    """文件不是可以读取的Word 97-2003文档（已加密、版本过旧或结构损坏）"""
+
+
+def _u32_array(data):
+    values = array('I')
+    values.frombytes(data[:len(data) - len(data) % 4])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class CompoundFile:
+    """
+    只读的OLE2复合文档（CFB）解析器。整个文件读入内存后按FAT/miniFAT扇区链拼出各个流，
+    只提供根存储下的流（WordDocument、0Table/1Table等）。
+    """
+
+    def __init__(self, data):
+        if len(data) < 512 or data[:8] != CFB_SIGNATURE:
+            raise DocFormatError('不是OLE2复合文档')
+        self.data = data
+        major, _, sector_shift, mini_shift = struct.unpack_from('<HHHH', data, 0x1a)
+        if sector_shift not in (9, 12) or mini_shift != 6:
+            raise DocFormatError(f'不支持的扇区大小: {sector_shift}')
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        (num_fat, first_dir, _, self.mini_cutoff, first_mini_fat, _,
+         first_difat, num_difat) = struct.unpack_from('<8L', data, 0x2c)
+
+        # DIFAT：文件头中的109项，之后是DIFAT扇区链（每个扇区最后一项指向下一个扇区）
+        difat = list(struct.unpack_from('<109L', data, 0x4c))
+        per_sector = self.sector_size // 4 - 1
+        sector = first_difat
+        for _ in range(num_difat):
+            if sector > _MAXREGSECT:
+                break
+            entries = _u32_array(self._sector(sector))
+            difat.extend(entries[:per_sector])
+            sector = entries[per_sector]
+        fat_data = b''.join(self._sector(s) for s in difat[:num_fat] if s <= _MAXREGSECT)
+        self.fat = _u32_array(fat_data)
+
+        directory = self._read_chain(first_dir, self.fat, self.sector_size, self._sector)
+        self._entries = self._read_directory(directory, major)
+        root_start, root_size = self._root
+        if root_start <= _MAXREGSECT and root_size:
+            self.mini_stream = self._read_chain(root_start, self.fat, self.sector_size, self._sector)
+            self.mini_fat = _u32_array(self._read_chain(first_mini_fat, self.fat, self.sector_size, self._sector))
+        else:
+            self.mini_stream = b''
+            self.mini_fat = array('I')
+
+    def _sector(self, sector):
+        offset = (sector + 1) * self.sector_size
+        if offset >= len(self.data):
+            raise DocFormatError(f'扇区超出文件范围: {sector}')
+        return self.data[offset:offset + self.sector_size]
+
+    def _mini_sector(self, sector):
+        offset = sector * self.mini_sector_size
+        return self.mini_stream[offset:offset + self.mini_sector_size]
+
+    @staticmethod
+    def _read_chain(start, fat, sector_size, read_sector, size=None):
+        """沿扇区链读出数据，链出现循环或越界时报错"""
+        chunks = []
+        sector = start
+        while sector <= _MAXREGSECT:
+            if sector >= len(fat) or len(chunks) > len(fat):
+                raise DocFormatError('扇区链损坏')
+            chunks.append(read_sector(sector))
+            if size is not None and len(chunks) * sector_size >= size:
+                break
+            sector = fat[sector]
+        data = b''.join(chunks)
+        return data if size is None else data[:size]
+
+    def _read_directory(self, directory, major):
+        """读取目录项，返回根存储下的 {流名称: (起始扇区, 大小)}"""
+        entries = []
+        for offset in range(0, len(directory) - 127, 128):
+            name_len, entry_type = struct.unpack_from('<HB', directory, offset + 0x40)
+            left, right, child = struct.unpack_from('<3L', directory, offset + 0x44)
+            start, size = struct.unpack_from('<LQ', directory, offset + 0x74)
+            if major == 3:
+                size &= 0xFFFFFFFF
+            name = directory[offset:offset + max(name_len - 2, 0)].decode('utf-16-le', 'replace')
+            entries.append((name, entry_type, left, right, child, start, size))
+        if not entries or entries[0][1] != 5:
+            raise DocFormatError('缺少根存储')
+        self._root = (entries[0][5], entries[0][6])
+
+        # 根存储的子项组织为一棵红黑树，遍历整棵树（不进入子存储，ObjectPool中嵌入的文档不会混入）
+        streams = {}
+        pending = [entries[0][4]]
+        seen = set()
+        while pending:
+            index = pending.pop()
+            if index == _NOSTREAM or index >= len(entries) or index in seen:
+                continue
+            seen.add(index)
+            name, entry_type, left, right, _, start, size = entries[index]
+            if entry_type == 2:
+                streams[name] = (start, size)
+            pending.extend((left, right))
+        return streams
+
+    def has_stream(self, name):
+        return name in self._entries
+
+    def read_stream(self, name):
+        """读取根存储下的流，不存在时抛出KeyError"""
+        start, size = self._entries[name]
+        if size < self.mini_cutoff:
+            return self._read_chain(start, self.mini_fat, self.mini_sector_size, self._mini_sector, size)
+        return self._read_chain(start, self.fat, self.sector_size, self._sector, size)
+
+
+def _iter_sprms(grpprl, pos=0):
+    """遍历grpprl中的 (sprm, 操作数)"""
+    end = len(grpprl)
+    while pos + 2 <= end:
+        sprm = grpprl[pos] | grpprl[pos + 1] << 8
+        pos += 2
+        size = _SPRA_SIZES[sprm >> 13]
+        if size is None:
+            if sprm == _SPRM_T_DEFTABLE:
+                if pos + 2 > end:
+                    return
+                size = (grpprl[pos] | grpprl[pos + 1] << 8) + 1
+            elif sprm == _SPRM_P_CHGTABS and pos < end and grpprl[pos] == 255:
+                # PChgTabsOperand：cTabs个删除位置和关闭区间（各2字节），cTabs个添加位置（2字节）和类型（1字节）
+                if pos + 2 > end:
+                    return
+                added = pos + 2 + 4 * grpprl[pos + 1]
+                if added >= end:
+                    return
+                size = added + 1 - pos + 3 * grpprl[added]
+            else:
+                if pos >= end:
+                    return
+                size = grpprl[pos] + 1
+        yield sprm, grpprl[pos:pos + size]
+        pos += size
+
+
+class _ParagraphProps:
+    """段落属性中与标题识别和表格结构有关的部分"""
+
+    __slots__ = ('istd', 'outline', 'in_table', 'ttp', 'depth', 'inner_ttp')
+
+    def __init__(self, istd=0):
+        self.istd = istd
+        # 段落直接设置的大纲级别（0-8，9为正文），未设置时为None
+        self.outline = None
+        self.in_table = False
+        self.ttp = False
+        self.depth = 0
+        self.inner_ttp = False
+
+    def apply(self, grpprl, pos=0):
+        for sprm, operand in _iter_sprms(grpprl, pos):
+            if not operand:
+                continue
+            if sprm == _SPRM_P_OUTLVL:
+                self.outline = operand[0]
+            elif sprm == _SPRM_P_ISTD and len(operand) >= 2:
+                self.istd = operand[0] | operand[1] << 8
+            elif sprm == _SPRM_P_FINTABLE:
+                self.in_table = bool(operand[0])
+            elif sprm == _SPRM_P_FTTP:
+                self.ttp = bool(operand[0])
+            elif sprm == _SPRM_P_ITAP and len(operand) >= 4:
+                self.depth = struct.unpack_from('<l', operand)[0]
+            elif sprm == _SPRM_P_FINNERTTP:
+                self.inner_ttp = bool(operand[0])
+        return self
+
+    def copy(self):
+        props = _ParagraphProps(self.istd)
+        for name in self.__slots__[1:]:
+            setattr(props, name, getattr(self, name))
+        return props
+
+    @property
+    def table_depth(self):
+        """表格嵌套深度，不在表格中为0"""
+        if self.depth > 0:
+            return self.depth
+        return 1 if self.in_table else 0
+
+
+_DEFAULT_PROPS = _ParagraphProps()
+
+
+class _FieldFilter:
+    """去掉域代码，只保留域结果。域可以嵌套，也可以跨越多个段落（如目录）"""
+
+    def __init__(self):
+        # 每层域当前是否处于域代码部分
+        self.stack = []
+
+    def feed(self, text):
+        if not self.stack and '\x13' not in text:
+            return text
+        parts = []
+        for part in _FIELD_SPLIT_RE.split(text):
+            if part == '\x13':
+                self.stack.append(True)
+            elif part == '\x14':
+                if self.stack:
+                    self.stack[-1] = False
+            elif part == '\x15':
+                if self.stack:
+                    self.stack.pop()
+            elif part and True not in self.stack:
+                parts.append(part)
+        return ''.join(parts)
+
+
+def _clean_text(text, table=_TEXT_TABLE):
+    """去掉控制字符；UTF-16代理项重新配对，无法配对的替换为U+FFFD"""
+    text = text.translate(table)
+    if _SURROGATE_RE.search(text):
+        text = text.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+    return text
+
+
+def _read_styles(data):
+    """
+    解析样式表（STSH），返回 {istd: (样式名, 大纲级别或None)}，大纲级别已沿基准样式继承链解析。
+    内置标题样式（sti 1-9）的名称统一为"heading N"，与Word中的"标题 N"/"Heading N"同样识别为标题。
+    """
+    if len(data) < 6:
+        return {}
+    cb_stshi = struct.unpack_from('<H', data, 0)[0]
+    cstd, cb_base = struct.unpack_from('<HH', data, 2)
+    pos = 2 + cb_stshi
+    raw = {}
+    for istd in range(cstd):
+        if pos + 2 > len(data):
+            break
+        cb_std = struct.unpack_from('<H', data, pos)[0]
+        std = data[pos + 2:pos + 2 + cb_std]
+        pos += 2 + cb_std
+        if cb_std == 0:
+            continue
+        try:
+            sti = struct.unpack_from('<H', std, 0)[0] & 0x0FFF
+            stk_base, cupx_next = struct.unpack_from('<HH', std, 2)
+            cch = struct.unpack_from('<H', std, cb_base)[0]
+            name = std[cb_base + 2:cb_base + 2 + 2 * cch].decode('utf-16-le', 'replace')
+            outline = None
+            upx = cb_base + 4 + 2 * cch
+            # 段落样式的第一个UPX为段落属性：istd + grpprl
+            if stk_base & 0x0F == 1 and cupx_next & 0x0F >= 1:
+                cb_upx = struct.unpack_from('<H', std, upx)[0]
+                props = _ParagraphProps().apply(std[upx + 2:upx + 2 + cb_upx], 2)
+                outline = props.outline
+        except struct.error:
+            continue
+        if 1 <= sti <= 9 and heading_level(name, None) is None:
+            name = f'heading {sti}'
+        raw[istd] = (name, stk_base >> 4, outline)
+
+    styles = {}
+    for istd, (name, base, outline) in raw.items():
+        # 沿继承链查找大纲级别，防止循环引用
+        seen = {istd}
+        while outline is None and base != _ISTD_NIL and base in raw and base not in seen:
+            seen.add(base)
+            _, next_base, outline = raw[base]
+            base = next_base
+        styles[istd] = (name, outline)
+    return styles
+
+
+class DocPackage:
+    """
+    已解析的doc（Word 97-2003二进制格式）文档，接口与DocxPackage一致。
+    直接读取复合文档中的WordDocument和0Table/1Table流：通过分段表（piece table）得到正文文本和字符位置，
+    通过段落属性（PAPX FKP）和样式表（STSH）判断标题级别，无需Word。
+    切片时只把区间内的段落转换为docx：保留文本、标题样式和表格结构，字符格式、图片等不保留。
+    """
+
+    engine = 'doc'
+
+    def __init__(self, source, index=None):
+        self.source = source
+        with metrics.span('open') as span:
+            if hasattr(source, 'read'):
+                data = source.read()
+            else:
+                with open(source, 'rb') as f:
+                    data = f.read()
+            cfb = CompoundFile(data)
+            self.word = cfb.read_stream('WordDocument')
+            self._read_fib()
+            table_name = '1Table' if self.fib_flags & _FIB_WHICH_TABLE else '0Table'
+            try:
+                self.table = cfb.read_stream(table_name)
+            except KeyError:
+                raise DocFormatError(f'缺少{table_name}流')
+            self._read_pieces()
+            self._read_bte()
+            self._read_sections()
+            self.styles = _read_styles(self._table_part(_FC_STSHF))
+            span.set(engine='doc', main_size=len(self.word))
+        self._fkps = {}
+        self._props = {}
+
+        if index is not None:
+            # 使用缓存的索引，跳过正文扫描
+            self.headings = HeadingIndex.from_flat(index['titles'])
+            self.content_end = index['content_end']
+            self.paragraph_count = index['paragraph_count']
+        else:
+            with metrics.span('extract', engine='doc') as span:
+                titles = self._scan_titles()
+                span.set(paragraphs=self.paragraph_count, titles=len(titles))
+            self.headings = HeadingIndex.from_flat(titles)
+            self.content_end = self.ccp_text
+
+    @property
+    def titles(self):
+        """标题树（与get_document_titles_tree的结构相同）"""
+        return self.headings.to_tree()
+
+    @property
+    def flat_titles(self):
+        """[(标题, 偏移量, 级别), ...]"""
+        return self.headings.to_flat()
+
+    def index_record(self):
+        """导出可缓存的索引记录（标题列表和字符总数）"""
+        return {
+            'titles': [list(title) for title in self.flat_titles],
+            'content_end': self.content_end,
+            'paragraph_count': self.paragraph_count,
+        }
+
+    def close(self):
+        # 文件已整体读入内存，没有需要关闭的句柄
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_fib(self):
+        word = self.word
+        if len(word) < 154:
+            raise DocFormatError('WordDocument流过短')
+        ident, nfib = struct.unpack_from('<HH', word, 0)
+        if ident != WORD_IDENT:
+            raise DocFormatError('WordDocument流标识不正确')
+        if nfib < MIN_NFIB:
+            raise DocFormatError(f'不支持Word 6.0/95及更早版本的doc格式（nFib={nfib:#x}）')
+        self.fib_flags = struct.unpack_from('<H', word, 0x0a)[0]
+        if self.fib_flags & _FIB_ENCRYPTED:
+            raise DocFormatError('文档已加密')
+
+        # FibBase之后依次为fibRgW、fibRgLw、fibRgFcLcb，各部分以自身的计数开头
+        pos = 32
+        csw = struct.unpack_from('<H', word, pos)[0]
+        pos += 2 + csw * 2
+        cslw = struct.unpack_from('<H', word, pos)[0]
+        self.ccp_text = struct.unpack_from('<l', word, pos + 2 + 12)[0]
+        pos += 2 + cslw * 4
+        cb_fc_lcb = struct.unpack_from('<H', word, pos)[0]
+        if cb_fc_lcb <= _FC_CLX:
+            raise DocFormatError('FIB过短')
+        self._fc_lcb = struct.unpack_from(f'<{cb_fc_lcb * 2}L', word, pos + 2)
+
+    def _table_part(self, index):
+        fc, lcb = self._fc_lcb[index * 2], self._fc_lcb[index * 2 + 1]
+        if lcb == 0 or fc + lcb > len(self.table):
+            return b''
+        return self.table[fc:fc + lcb]
+
+    def _read_pieces(self):
+        """解析Clx：先跳过（并保存）Prc中的grpprl，再读取分段表PlcPcd"""
+        clx = self._table_part(_FC_CLX)
+        pos = 0
+        self._prcs = []
+        while pos < len(clx) and clx[pos] == 1:
+            cb = struct.unpack_from('<h', clx, pos + 1)[0]
+            self._prcs.append(clx[pos + 3:pos + 3 + cb])
+            pos += 3 + cb
+        if pos >= len(clx) or clx[pos] != 2:
+            raise DocFormatError('分段表损坏')
+        lcb = struct.unpack_from('<L', clx, pos + 1)[0]
+        plc = clx[pos + 5:pos + 5 + lcb]
+        count = (len(plc) - 4) // 12
+        if count <= 0:
+            raise DocFormatError('分段表为空')
+        cps = struct.unpack_from(f'<{count + 1}L', plc)
+        pieces = []
+        for i in range(count):
+            fc_raw, prm = struct.unpack_from('<LH', plc, (count + 1) * 4 + i * 8 + 2)
+            compressed = bool(fc_raw & 0x40000000)
+            fc = fc_raw & 0x3FFFFFFF
+            if compressed:
+                fc //= 2
+            pieces.append((cps[i], cps[i + 1], fc, compressed, prm))
+        self.pieces = pieces
+
+    def _read_bte(self):
+        """PlcBtePapx：各PAPX FKP覆盖的文件偏移区间和所在页号"""
+        plc = self._table_part(_FC_PLCFBTEPAPX)
+        count = (len(plc) - 4) // 8
+        if count <= 0:
+            self._bte_fcs = ()
+            self._bte_pns = ()
+            return
+        self._bte_fcs = struct.unpack_from(f'<{count + 1}L', plc)
+        self._bte_pns = [pn & 0x3FFFFF for pn in struct.unpack_from(f'<{count}L', plc, (count + 1) * 4)]
+
+    def _read_sections(self):
+        """节结束位置：位于这些位置之前的分页符是节结束符，同时结束段落"""
+        plc = self._table_part(_FC_PLCFSED)
+        count = (len(plc) - 4) // 16
+        self._section_ends = frozenset(struct.unpack_from(f'<{count + 1}L', plc)[1:]) if count > 0 else frozenset()
+
+    def _fkp(self, pn):
+        fkp = self._fkps.get(pn)
+        if fkp is None:
+            page = self.word[pn * _FKP_SIZE:(pn + 1) * _FKP_SIZE]
+            if len(page) < _FKP_SIZE:
+                raise DocFormatError(f'段落属性页超出范围: {pn}')
+            crun = page[-1]
+            fkp = (page, struct.unpack_from(f'<{crun + 1}L', page), crun)
+            self._fkps[pn] = fkp
+        return fkp
+
+    def _paragraph_props(self, fc, prm):
+        """文件偏移fc处段落标记所在段落的属性"""
+        i = bisect_right(self._bte_fcs, fc) - 1
+        if i < 0 or i >= len(self._bte_pns):
+            props = _DEFAULT_PROPS
+        else:
+            pn = self._bte_pns[i]
+            page, rgfc, crun = self._fkp(pn)
+            j = min(max(bisect_right(rgfc, fc) - 1, 0), crun - 1)
+            key = (pn, j)
+            props = self._props.get(key)
+            if props is None:
+                props = self._parse_papx(page, crun, j)
+                self._props[key] = props
+        # 快速保存的文档中，分段上的属性修改（Prm1）覆盖FKP中的属性
+        if prm & 1 and (prm >> 1) < len(self._prcs):
+            props = props.copy().apply(self._prcs[prm >> 1])
+        return props
+
+    @staticmethod
+    def _parse_papx(page, crun, j):
+        offset = page[(crun + 1) * 4 + j * 13] * 2
+        if offset == 0:
+            return _DEFAULT_PROPS
+        cb = page[offset]
+        if cb == 0:
+            start, size = offset + 2, page[offset + 1] * 2
+        else:
+            start, size = offset + 1, cb * 2 - 1
+        grpprl = page[start:start + size]
+        if len(grpprl) < 2:
+            return _DEFAULT_PROPS
+        return _ParagraphProps(grpprl[0] | grpprl[1] << 8).apply(grpprl, 2)
+
+    def _decode(self, fc, compressed, count):
+        if compressed:
+            return self.word[fc:fc + count].decode('cp1252', 'replace')
+        return self.word[fc:fc + count * 2].decode('utf-16-le', 'surrogatepass')
+
+    def _iter_paragraphs(self):
+        """按文档顺序产生正文段落：(起始字符位置, 结束字符位置, 不含段落标记的文本, 段落标记, 段落属性)"""
+        end_cp = self.ccp_text
+        para_start = 0
+        pending = []
+        for cp_start, cp_end, fc, compressed, prm in self.pieces:
+            if cp_start >= end_cp:
+                break
+            text = self._decode(fc, compressed, min(cp_end, end_cp) - cp_start)
+            width = 1 if compressed else 2
+            begin = 0
+            for match in _PARA_MARK_RE.finditer(text):
+                k = match.start()
+                mark = text[k]
+                if mark == '\x0c' and cp_start + k + 1 not in self._section_ends:
+                    continue
+                pending.append(text[begin:k])
+                yield (para_start, cp_start + k + 1, ''.join(pending), mark,
+                       self._paragraph_props(fc + k * width, prm))
+                pending = []
+                begin = k + 1
+                para_start = cp_start + k + 1
+            if begin < len(text):
+                pending.append(text[begin:])
+        if pending:
+            yield para_start, end_cp, ''.join(pending), '', _DEFAULT_PROPS
+
+    def _heading_level(self, props):
+        name, outline = self.styles.get(props.istd, ('', None))
+        if props.outline is not None:
+            outline = props.outline
+        return heading_level(name, outline)
+
+    def _scan_titles(self):
+        """扫描正文，返回 [(标题, 偏移量, 级别), ...]"""
+        titles = []
+        fields = _FieldFilter()
+        count = 0
+        for start, _, text, _, props in self._iter_paragraphs():
+            count += 1
+            text = fields.feed(text)
+            level = self._heading_level(props)
+            if level is not None:
+                titles.append((_clean_text(text, _TITLE_TABLE).strip(), start, level))
+        self.paragraph_count = count
+        return titles
+
+    def _slice_body(self, start, end):
+        """把与[start, end)相交的段落转换为WordprocessingML的body内容"""
+        blocks = []
+        rows = []
+        row = []
+        cell = []
+
+        def flush_table():
+            if cell:
+                row.append(list(cell))
+                cell.clear()
+            if row:
+                rows.append(list(row))
+                row.clear()
+            if rows:
+                blocks.append(_table_xml(rows))
+                rows.clear()
+
+        fields = _FieldFilter()
+        for para_start, para_end, text, mark, props in self._iter_paragraphs():
+            text = fields.feed(text)
+            if para_end <= start:
+                continue
+            if para_start >= end:
+                break
+            depth = props.table_depth
+            if depth == 0:
+                flush_table()
+                blocks.append(_paragraph_xml(text, self._heading_level(props)))
+            elif depth == 1 and props.ttp:
+                # 行结束标记
+                if cell:
+                    row.append(list(cell))
+                    cell.clear()
+                rows.append(list(row))
+                row.clear()
+            elif depth > 1 and props.inner_ttp:
+                # 嵌套表格的行结束标记：嵌套表格的内容展开为外层单元格中的段落
+                continue
+            else:
+                cell.append(_paragraph_xml(text, self._heading_level(props)))
+                if depth == 1 and mark == '\x07':
+                    row.append(list(cell))
+                    cell.clear()
+        flush_table()
+        # 正文最后一个块必须是段落
+        if not blocks or not blocks[-1].startswith('<w:p'):
+            blocks.append('<w:p/>')
+        return ''.join(blocks)
+
+    def save_slice(self, output, start, end):
+        """按字符区间[start, end)切片，转换为docx写出"""
+        with metrics.span('cut', engine='doc'):
+            body = self._slice_body(start, end)
+        with metrics.span('save', engine='doc'):
+            write_docx(output, body)
+        return True
+
+
+def _paragraph_xml(text, level=None):
+    ppr = ''
+    if level is not None and level < BODY_TEXT_LEVEL:
+        ppr = f'<w:pPr><w:pStyle w:val="Heading{level}"/></w:pPr>'
+    runs = []
+    for part in _RUN_SPLIT_RE.split(_clean_text(text)):
+        if part == '\t':
+            runs.append('<w:tab/>')
+        elif part == '\x0b':
+            runs.append('<w:br/>')
+        elif part == '\x0c':
+            runs.append('<w:br w:type="page"/>')
+        elif part:
+            runs.append(f'<w:t xml:space="preserve">{part.translate(_XML_ESCAPES)}</w:t>')
+    if not runs:
+        return f'<w:p>{ppr}</w:p>'
+    return f'<w:p>{ppr}<w:r>{"".join(runs)}</w:r></w:p>'
+
+
+# 转换出的表格总宽度（缇），按A4纸去掉页边距后的宽度平均分配各列
+_TABLE_WIDTH = 8306
+
+
+def _table_xml(rows):
+    cols = max(len(row) for row in rows) or 1
+    width = _TABLE_WIDTH // cols
+    parts = ['<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="0" w:type="auto"/></w:tblPr><w:tblGrid>']
+    parts.append(f'<w:gridCol w:w="{width}"/>' * cols)
+    parts.append('</w:tblGrid>')
+    for row in rows:
+        if not row:
+            continue
+        parts.append('<w:tr>')
+        for cell in row:
+            parts.append(f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>')
+            parts.append(''.join(cell) or '<w:p/>')
+            parts.append('</w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_CONTENT_TYPES_XML = (
+    _XML_HEADER
+    + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+_PACKAGE_RELS_XML = (
+    _XML_HEADER
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_DOCUMENT_RELS_XML = (
+    _XML_HEADER
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# 标题字号（半磅）：一级16磅、二级14磅、三级13磅，其余12磅
+_HEADING_SIZES = {1: 32, 2: 28, 3: 26}
+
+
+def _styles_xml():
+    styles = [
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>',
+        '<w:style w:type="table" w:styleId="TableGrid"><w:name w:val="Table Grid"/><w:tblPr><w:tblBorders>'
+        + ''.join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+                  for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+        + '</w:tblBorders></w:tblPr></w:style>',
+    ]
+    for level in range(1, 10):
+        styles.append(
+            f'<w:style w:type="paragraph" w:styleId="Heading{level}"><w:name w:val="heading {level}"/>'
+            f'<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+            f'<w:pPr><w:keepNext/><w:outlineLvl w:val="{level - 1}"/></w:pPr>'
+            f'<w:rPr><w:b/><w:sz w:val="{_HEADING_SIZES.get(level, 24)}"/></w:rPr></w:style>'
+        )
+    return _XML_HEADER + f'<w:styles xmlns:w="{_W_NS}">' + ''.join(styles) + '</w:styles>'
+
+
+def write_docx(output, body):
+    """把body内容写成只含document.xml和styles.xml的最小docx（A4纸）"""
+    document = (
+        _XML_HEADER + f'<w:document xmlns:w="{_W_NS}"><w:body>{body}'
+        '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+        '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" '
+        'w:header="851" w:footer="992" w:gutter="0"/></w:sectPr></w:body></w:document>'
+    )
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zout:
+        zout.writestr('[Content_Types].xml', _CONTENT_TYPES_XML)
+        zout.writestr('_rels/.rels', _PACKAGE_RELS_XML)
+        zout.writestr('word/document.xml', document.encode('utf-8'))
+        zout.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS_XML)
+        zout.writestr('word/styles.xml', _styles_xml())
+
+
+class DocHeadGetter:
+    """
+    纯Python的doc标题提取器，接口与WordHeadGetter一致，无需Word/COM。
+    标题偏移量为正文中的字符位置（与COM的Range.Start一致）。
+    """
+
+    def get_document_titles_tree(self, file_path):
+        try:
+            with DocPackage(file_path) as package:
+                doc = DocxDocument(file_path, package.content_end, package.paragraph_count)
+                return package.titles, doc
+        except Exception as e:
+            logging.error(f"解析doc失败: {file_path}, {e}")
+            return None, None
+
+    def quit(self):
+        pass
@@ -0,0 +1,366 @@
+import logging
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+# WordprocessingML命名空间（兼容Transitional和Strict两种格式）
+W_NAMESPACES = (
+    'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'http://purl.oclc.org/ooxml/wordprocessingml/main',
+)
+MC_NAMESPACE = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+PKG_REL_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Word中正文文本的大纲级别（与COM的wdOutlineLevelBodyText一致）
+BODY_TEXT_LEVEL = 10
+
+# 每次送入解析器的字节数
+CHUNK_SIZE = 256 * 1024
+
+# 在运行（w:r）中各占一个字符位置的元素
+_SINGLE_CHAR_ELEMENTS = frozenset([
+    'tab', 'br', 'cr', 'noBreakHyphen', 'softHyphen', 'sym', 'fldChar',
+    'footnoteReference', 'endnoteReference', 'commentReference', 'ptab',
+])
+# 嵌入对象：计为一个字符，其内部（文本框等）属于其他文字流，跳过
+_EMBEDDED_ELEMENTS = frozenset(['drawing', 'pict', 'object'])
+# 计入字符位置的文本元素
+_TEXT_ELEMENTS = frozenset(['t', 'delText', 'instrText', 'delInstrText'])
+
+_HEADING_NAME_RE = re.compile(r'^(?:标题|heading)\s*(\d+)?', re.IGNORECASE)
+
+
+class DocxDocument:
+    """docx解析结果的轻量句柄，代替COM的Document对象"""
+
+    __slots__ = ('path', 'content_end', 'paragraph_count', 'blocks')
+
+    def __init__(self, path, content_end, paragraph_count, blocks=None):
+        self.path = path
+        # 文档字符总数（对应COM中的doc.Content.End）
+        self.content_end = content_end
+        self.paragraph_count = paragraph_count
+        # body下各块级元素：(起始字节, 结束标签字节, 起始字符偏移, 元素名)
+        self.blocks = blocks
+
+
+def read_relationships(zf, part_name):
+    """读取某个部件的关系文件，返回 {rId: (type, target_part)}"""
+    folder, base = posixpath.split(part_name)
+    rels_name = posixpath.join(folder, '_rels', base + '.rels')
+    try:
+        data = zf.read(rels_name)
+    except KeyError:
+        return {}
+    return parse_relationships(data, part_name)
+
+
+def parse_relationships(data, part_name):
+    """解析rels文件内容，目标路径解析为相对于包根目录的部件名"""
+    folder = posixpath.dirname(part_name)
+    rels = {}
+    root = ET.fromstring(data)
+    for rel in root.iter('{%s}Relationship' % PKG_REL_NAMESPACE):
+        if rel.get('TargetMode') == 'External':
+            target = None
+        else:
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get('Id')] = (rel.get('Type', ''), target)
+    return rels
+
+
+def find_main_part(zf):
+    """通过包关系定位主文档部件（通常是word/document.xml）"""
+    for rel_type, target in read_relationships(zf, '').values():
+        if rel_type.endswith('/officeDocument') and target:
+            return target
+    return 'word/document.xml'
+
+
+def load_heading_styles(zf, main_part):
+    """
+    解析styles.xml，返回 (styles, default_style_id)。
+    styles: {styleId: (名称, 大纲级别或None)}，已沿basedOn继承链解析大纲级别。
+    """
+    styles_part = None
+    for rel_type, target in read_relationships(zf, main_part).values():
+        if rel_type.endswith('/styles') and target:
+            styles_part = target
+            break
+    if styles_part is None:
+        return {}, None
+    try:
+        root = ET.fromstring(zf.read(styles_part))
+    except KeyError:
+        return {}, None
+
+    raw = {}
+    default_id = None
+    ns = root.tag[1:].split('}')[0] if root.tag.startswith('{') else W_NAMESPACES[0]
+    w = '{%s}' % ns
+    for style in root.iter(w + 'style'):
+        if style.get(w + 'type', 'paragraph') != 'paragraph':
+            continue
+        style_id = style.get(w + 'styleId')
+        name_el = style.find(w + 'name')
+        name = name_el.get(w + 'val', '') if name_el is not None else style_id or ''
+        based_el = style.find(w + 'basedOn')
+        based_on = based_el.get(w + 'val') if based_el is not None else None
+        outline = None
+        lvl_el = style.find(w + 'pPr/' + w + 'outlineLvl')
+        if lvl_el is not None:
+            try:
+                outline = int(lvl_el.get(w + 'val'))
+            except (TypeError, ValueError):
+                outline = None
+        raw[style_id] = (name, based_on, outline)
+        if style.get(w + 'default') in ('1', 'true', 'on'):
+            default_id = style_id
+
+    styles = {}
+    for style_id, (name, based_on, outline) in raw.items():
+        # 沿继承链查找大纲级别，防止循环引用
+        seen = {style_id}
+        parent = based_on
+        while outline is None and parent in raw and parent not in seen:
+            seen.add(parent)
+            outline = raw[parent][2]
+            parent = raw[parent][1]
+        styles[style_id] = (name, outline)
+    return styles, default_id
+
+
+def heading_level(style_name, outline_lvl):
+    """
+    判断样式是否为标题样式并返回级别（1-9，正文为10），非标题返回None。
+    与COM路径一致：只认"标题 N"/"Heading N"样式，级别取大纲级别。
+    """
+    match = _HEADING_NAME_RE.match(style_name or '')
+    if match is None:
+        return None
+    if outline_lvl is not None:
+        return outline_lvl + 1 if 0 <= outline_lvl < 9 else BODY_TEXT_LEVEL
+    if match.group(1):
+        return min(int(match.group(1)), BODY_TEXT_LEVEL)
+    return BODY_TEXT_LEVEL
+
+
+def build_titles_tree(titles):
+    """根据标题的等级和偏移值构建树状结构（与WordHeadGetter保持一致）"""
+    root = []
+    for title in titles:
+        if title["级别"] == 1 or not root:
+            root.append(title)
+        else:
+            # 找到最近的上级标题
+            parent = root[-1]  # 从最后一个一级标题开始
+            while parent["children"] and parent["children"][-1]["级别"] < title["级别"]:
+                parent = parent["children"][-1]
+            parent["children"].append(title)
+    return root
+
+
+def titles_tree_from_flat(flat_titles):
+    """由 [(标题, 偏移量, 级别), ...] 重建标题树"""
+    return build_titles_tree([
+        {"标题": title, "偏移量": offset, "级别": level, "children": []}
+        for title, offset, level in flat_titles
+    ])
+
+
+class _DocumentScanner:
+    """
+    基于expat的document.xml流式扫描器。
+    按Word的规则累计字符位置（段落标记、单元格/行结束符各占1个字符），
+    同时收集标题段落，可选记录body下每个块级元素的字节区间。
+    """
+
+    def __init__(self, styles, default_style, record_blocks=False):
+        self.styles = styles
+        self.default_style = default_style
+        self.record_blocks = record_blocks
+        self.titles = []
+        self.blocks = [] if record_blocks else None
+        self.position = 0
+        self.paragraph_count = 0
+
+        self._local = {}
+        self._depth = 0
+        self._body_depth = None
+        self._block_start = None
+        self._run_depth = 0
+        self._skip_depth = None
+        self._counting = False
+        self._in_ppr = False
+        self._para_style = None
+        self._para_outline = None
+        self._para_start = 0
+        self._para_text = None
+        self._para_level = None
+
+        parser = expat.ParserCreate(namespace_separator='}')
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._chars
+        self._parser = parser
+
+    def _name(self, name):
+        local = self._local.get(name)
+        if local is None:
+            ns, _, tag = name.rpartition('}')
+            if ns in W_NAMESPACES:
+                local = tag
+            elif ns == MC_NAMESPACE:
+                local = 'mc:' + tag
+            else:
+                local = ''
+            self._local[name] = local
+        return local
+
+    def _attr(self, attrs, key):
+        for ns in W_NAMESPACES:
+            value = attrs.get(ns + '}' + key)
+            if value is not None:
+                return value
+        return None
+
+    def _start(self, name, attrs):
+        self._depth += 1
+        if self._skip_depth is not None:
+            return
+        tag = self._name(name)
+
+        if self._body_depth is not None and self._depth == self._body_depth + 1 and self.record_blocks:
+            self._block_start = (self._parser.CurrentByteIndex, self.position, tag)
+
+        if tag == 'p':
+            self._para_start = self.position
+            self._para_style = None
+            self._para_outline = None
+            self._para_text = None
+        elif tag == 'r':
+            self._run_depth += 1
+        elif tag in _TEXT_ELEMENTS:
+            self._counting = True
+        elif self._run_depth:
+            if tag in _SINGLE_CHAR_ELEMENTS:
+                self.position += 1
+            elif tag in _EMBEDDED_ELEMENTS:
+                self.position += 1
+                self._skip_depth = self._depth
+        elif tag == 'pPr':
+            self._in_ppr = True
+        elif self._in_ppr:
+            if tag == 'pStyle':
+                self._para_style = self._attr(attrs, 'val')
+            elif tag == 'outlineLvl':
+                try:
+                    self._para_outline = int(self._attr(attrs, 'val'))
+                except (TypeError, ValueError):
+                    pass
+        elif tag == 'body':
+            self._body_depth = self._depth
+        elif tag == 'mc:Fallback':
+            # AlternateContent的备用内容与Choice重复，不计入
+            self._skip_depth = self._depth
+
+    def _end(self, name):
+        depth = self._depth
+        self._depth -= 1
+        if self._skip_depth is not None:
+            if depth == self._skip_depth:
+                self._skip_depth = None
+            return
+        tag = self._name(name)
+
+        if tag == 'pPr':
+            self._in_ppr = False
+            style_id = self._para_style or self.default_style
+            name_, outline = self.styles.get(style_id, ('', None))
+            if self._para_outline is not None:
+                outline = self._para_outline
+            level = heading_level(name_, outline)
+            if level is not None:
+                self._para_text = []
+                self._para_level = level
+        elif tag == 'p':
+            self.paragraph_count += 1
+            if self._para_text is not None:
+                self.titles.append({
+                    "标题": ''.join(self._para_text).strip(),
+                    "偏移量": self._para_start,
+                    "级别": self._para_level,
+                    "children": []
+                })
+                self._para_text = None
+            # 段落标记
+            self.position += 1
+        elif tag == 'r':
+            self._run_depth -= 1
+        elif tag in _TEXT_ELEMENTS:
+            self._counting = False
+        elif tag == 'tr':
+            # 行结束标记
+            self.position += 1
+        elif tag == 'tab' and self._run_depth and self._para_text is not None:
+            self._para_text.append('\t')
+
+        if self._block_start is not None and self._body_depth is not None and depth == self._body_depth + 1:
+            byte_start, char_start, block_tag = self._block_start
+            self.blocks.append((byte_start, self._parser.CurrentByteIndex, char_start, block_tag))
+            self._block_start = None
+
+    def _chars(self, data):
+        if self._counting and self._skip_depth is None:
+            self.position += len(data)
+            if self._para_text is not None and self._run_depth:
+                self._para_text.append(data)
+
+    def feed(self, data, final=False):
+        self._parser.Parse(data, final)
+
+
+def scan_document(zf, main_part=None, record_blocks=False, data=None):
+    """扫描docx的主文档部件，返回完成扫描的_DocumentScanner"""
+    if main_part is None:
+        main_part = find_main_part(zf)
+    styles, default_style = load_heading_styles(zf, main_part)
+    scanner = _DocumentScanner(styles, default_style, record_blocks)
+    if data is not None:
+        scanner.feed(data, True)
+        return scanner
+    with zf.open(main_part) as stream:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+    scanner.feed(b'', True)
+    return scanner
+
+
+class DocxHeadGetter:
+    """
+    纯Python的docx标题提取器，接口与WordHeadGetter一致，无需Word/COM。
+    直接流式解析zip中的word/document.xml，通过styles.xml解析标题级别。
+    """
+
+    def get_document_titles_tree(self, file_path):
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                scanner = scan_document(zf)
+            doc = DocxDocument(file_path, scanner.position, scanner.paragraph_count)
+            return build_titles_tree(scanner.titles), doc
+        except Exception as e:
+            logging.error(f"解析docx失败: {file_path}, {e}")
+            return None, None
+
+    def quit(self):
+        pass
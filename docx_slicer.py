@@ -0,0 +1,306 @@
+import logging
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from xml.parsers import expat
+
+from docx_head_geter import find_main_part, parse_relationships, read_relationships, scan_document
+from heading_index import HeadingIndex
+import metrics
+
+OFFICE_REL_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# 切片后可能失去引用的关系类型（按类型URI的最后一段判断）
+# styles、numbering、settings等由类型隐式引用的部件不在此列，始终保留
+_PRUNABLE_REL_TYPES = frozenset([
+    'image', 'header', 'footer', 'hyperlink', 'oleObject', 'package', 'chart',
+    'diagramData', 'diagramLayout', 'diagramQuickStyle', 'diagramColors',
+    'diagramDrawing', 'video', 'audio', 'media', 'control', 'hdphoto', 'aFChunk',
+])
+
+# 注释类部件：(关系类型, 正文中的引用元素, 需要始终保留的条目属性)
+_NOTE_PARTS = (
+    ('footnotes', 'footnoteReference', 'type'),
+    ('endnotes', 'endnoteReference', 'type'),
+    ('comments', 'commentReference', None),
+)
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_REL_PREFIX_RE = re.compile(rb'xmlns:([\w.-]+)="' + re.escape(OFFICE_REL_NAMESPACE.encode()) + rb'"')
+_RELATIONSHIP_RE = re.compile(rb'<Relationship\b[^>]*?\bId="([^"]*)"[^>]*?/>')
+_OVERRIDE_RE = re.compile(rb'<Override\b[^>]*?\bPartName="([^"]*)"[^>]*?/>')
+_TAG_PREFIX_RE = re.compile(rb'<([\w.-]+:)?')
+
+
+def copy_raw_member(src_fp, info, zout):
+    """将源zip中的成员按原始压缩字节写入目标zip，不解压也不重新压缩"""
+    src_fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src_fp.read(_LOCAL_HEADER.size))
+    src_fp.seek(header[-2] + header[-1], os.SEEK_CUR)
+    raw = src_fp.read(info.compress_size)
+
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    # 大小已写入本地文件头，不再使用数据描述符
+    zinfo.flag_bits = info.flag_bits & ~0x08
+
+    fp = zout.fp
+    fp.seek(zout.start_dir)
+    zinfo.header_offset = fp.tell()
+    fp.write(zinfo.FileHeader(zinfo.file_size > zipfile.ZIP64_LIMIT))
+    fp.write(raw)
+    zout.start_dir = fp.tell()
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+
+
+def _element_end(data, index):
+    """expat给出的结束事件位置指向结束标签（或自闭合标签）的开头，返回标签之后的位置"""
+    return data.index(b'>', index) + 1
+
+
+def _referenced_rel_ids(data):
+    """收集XML中所有关系命名空间属性引用的关系ID"""
+    prefixes = set(_REL_PREFIX_RE.findall(data)) or {b'r'}
+    pattern = rb'\b(?:' + b'|'.join(re.escape(p) for p in prefixes) + rb'):[\w.-]+="([^"]*)"'
+    return {m.decode('utf-8') for m in re.findall(pattern, data)}
+
+
+def _referenced_note_ids(data, element):
+    pattern = rb'<[\w.-]*:?' + element.encode() + rb'\b[^>]*?:id="(-?\d+)"'
+    return {m.decode('ascii') for m in re.findall(pattern, data)}
+
+
+def _filter_notes(data, keep_ids, keep_attr):
+    """按ID过滤footnotes/endnotes/comments部件中的条目，保留字节原样"""
+    spans = []
+    state = {'depth': 0, 'start': None, 'keep': True}
+    parser = expat.ParserCreate(namespace_separator='}')
+
+    def start(name, attrs):
+        state['depth'] += 1
+        if state['depth'] == 2:
+            note_id = keep = None
+            for key, value in attrs.items():
+                local = key.rpartition('}')[2]
+                if local == 'id':
+                    note_id = value
+                elif keep_attr and local == keep_attr:
+                    keep = True
+            state['start'] = parser.CurrentByteIndex
+            state['keep'] = keep or note_id in keep_ids
+
+    def end(name):
+        if state['depth'] == 2 and not state['keep']:
+            spans.append((state['start'], _element_end(data, parser.CurrentByteIndex)))
+        state['depth'] -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.Parse(data, True)
+    if not spans:
+        return data
+    parts = []
+    last = 0
+    for begin, finish in spans:
+        parts.append(data[last:begin])
+        last = finish
+    parts.append(data[last:])
+    return b''.join(parts)
+
+
+def _prune_relationships(rels_data, rels, referenced):
+    """删除不再被引用的关系条目，返回 (新的rels字节, 被删除的rId集合)"""
+    removed = {rid for rid, (rel_type, _) in rels.items()
+               if rid not in referenced and rel_type.rpartition('/')[2] in _PRUNABLE_REL_TYPES}
+    if not removed:
+        return rels_data, removed
+
+    def replace(match):
+        return b'' if match.group(1).decode('utf-8') in removed else match.group(0)
+
+    return _RELATIONSHIP_RE.sub(replace, rels_data), removed
+
+
+def _rels_name(part_name):
+    folder, base = posixpath.split(part_name)
+    return posixpath.join(folder, '_rels', base + '.rels')
+
+
+class DocxPackage:
+    """
+    已解析的docx包。只解析一次document.xml（同时得到标题索引和body块级元素的位置），
+    之后可以按字符区间切出任意多份文档。
+    """
+
+    # 标题索引缓存中使用的引擎名
+    engine = 'docx'
+
+    def __init__(self, source, index=None):
+        self.source = source
+        with metrics.span('open') as span:
+            self.zf = zipfile.ZipFile(source)
+            try:
+                self.main_part = find_main_part(self.zf)
+                self.data = self.zf.read(self.main_part)
+            except Exception:
+                self.zf.close()
+                raise
+            span.set(engine='docx', main_size=len(self.data))
+        if index is None:
+            try:
+                with metrics.span('extract', engine='docx') as span:
+                    scanner = scan_document(self.zf, self.main_part, record_blocks=True, data=self.data)
+                    span.set(paragraphs=scanner.paragraph_count, titles=len(scanner.titles))
+            except Exception:
+                self.zf.close()
+                raise
+        if index is not None:
+            # 使用缓存的索引，跳过document.xml的解析
+            self.headings = HeadingIndex.from_flat(index['titles'])
+            self.content_end = index['content_end']
+            self.paragraph_count = index['paragraph_count']
+            self.blocks = [tuple(block) for block in index['blocks']]
+        else:
+            self.headings = HeadingIndex.from_flat((t["标题"], t["偏移量"], t["级别"]) for t in scanner.titles)
+            self.content_end = scanner.position
+            self.paragraph_count = scanner.paragraph_count
+            self.blocks = scanner.blocks
+
+    @property
+    def titles(self):
+        """标题树（与get_document_titles_tree的结构相同）"""
+        return self.headings.to_tree()
+
+    @property
+    def flat_titles(self):
+        """[(标题, 偏移量, 级别), ...]"""
+        return self.headings.to_flat()
+
+    def index_record(self):
+        """导出可缓存的索引记录（标题列表、字符总数和块级元素位置）"""
+        return {
+            'titles': [list(title) for title in self.flat_titles],
+            'content_end': self.content_end,
+            'paragraph_count': self.paragraph_count,
+            'blocks': [list(block) for block in self.blocks],
+        }
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _slice_main(self, start, end):
+        """只重写body：保留与[start, end)相交的块级元素和最后的w:sectPr"""
+        data = self.data
+        blocks = self.blocks
+        if not blocks:
+            return data
+        sect_pr = blocks[-1] if blocks[-1][3] == 'sectPr' else None
+        content = blocks[:-1] if sect_pr else blocks
+        tail_start = sect_pr[0] if sect_pr else _element_end(data, blocks[-1][1])
+
+        kept = []
+        last_tag = None
+        for i, (byte_start, end_index, char_start, tag) in enumerate(content):
+            char_end = content[i + 1][2] if i + 1 < len(content) else self.content_end
+            if char_end > start and char_start < end:
+                kept.append(data[byte_start:_element_end(data, end_index)])
+                last_tag = tag
+        # 正文最后一个块必须是段落，否则Word会认为文档损坏
+        if last_tag != 'p':
+            prefix = _TAG_PREFIX_RE.match(data, blocks[0][0]).group(1) or b''
+            kept.append(b'<' + prefix + b'p/>')
+        return data[:blocks[0][0]] + b''.join(kept) + data[tail_start:]
+
+    def _collect_parts(self, modified):
+        """从包关系出发遍历，返回所有可达部件名"""
+        reachable = set()
+        pending = ['']
+        while pending:
+            part = pending.pop()
+            rels_name = _rels_name(part)
+            if rels_name in modified:
+                rels = parse_relationships(modified[rels_name], part)
+            else:
+                rels = read_relationships(self.zf, part)
+            for _, target in rels.values():
+                if target and target not in reachable:
+                    reachable.add(target)
+                    pending.append(target)
+        return reachable
+
+    def save_slice(self, output, start, end):
+        """按字符区间[start, end)切片并写出，未改动的zip成员按原始压缩字节复制"""
+        zf = self.zf
+        with metrics.span('cut'):
+            modified = {}
+            new_main = self._slice_main(start, end)
+            modified[self.main_part] = new_main
+
+            main_rels = read_relationships(zf, self.main_part)
+            for rel_suffix, ref_element, keep_attr in _NOTE_PARTS:
+                for rel_type, target in main_rels.values():
+                    if rel_type.endswith('/' + rel_suffix) and target in zf.NameToInfo:
+                        keep_ids = _referenced_note_ids(new_main, ref_element)
+                        modified[target] = _filter_notes(zf.read(target), keep_ids, keep_attr)
+
+            # 重写过的部件需要清理其关系文件中的失效引用
+            for part in list(modified):
+                rels_name = _rels_name(part)
+                if rels_name not in zf.NameToInfo:
+                    continue
+                rels = read_relationships(zf, part)
+                rels_data, removed = _prune_relationships(
+                    zf.read(rels_name), rels, _referenced_rel_ids(modified[part]))
+                if removed:
+                    modified[rels_name] = rels_data
+
+            before = self._collect_parts({})
+            dropped = before - self._collect_parts(modified)
+            dropped |= {_rels_name(part) for part in dropped}
+            dropped &= set(zf.NameToInfo)
+            if dropped:
+                content_types = zf.read('[Content_Types].xml')
+
+                def replace(match):
+                    return b'' if match.group(1).decode('utf-8').lstrip('/') in dropped else match.group(0)
+
+                modified['[Content_Types].xml'] = _OVERRIDE_RE.sub(replace, content_types)
+
+        with metrics.span('save'):
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in zf.infolist():
+                    name = info.filename
+                    if name in dropped:
+                        continue
+                    if name in modified:
+                        zinfo = zipfile.ZipInfo(name, info.date_time)
+                        zinfo.external_attr = info.external_attr
+                        zout.writestr(zinfo, modified[name], compress_type=zipfile.ZIP_DEFLATED)
+                    else:
+                        copy_raw_member(zf.fp, info, zout)
+        if dropped:
+            logging.info(f"已移除不再引用的部件: {len(dropped)} 个")
+        return True
+
+
+def slice_docx(input_path, output_path, start, end):
+    """按字符区间切片docx。输入和输出可以是同一个文件"""
+    temp_output = output_path + '.tmp'
+    with DocxPackage(input_path) as package:
+        package.save_slice(temp_output, start, end)
+    os.replace(temp_output, output_path)
+    return True
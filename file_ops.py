@@ -0,0 +1,133 @@
+import errno
+import logging
+import os
+import shutil
+import time
+
+import metrics
+
+# Windows下跨卷移动时的错误码（ERROR_NOT_SAME_DEVICE）
+_WIN_NOT_SAME_DEVICE = 17
+
+
+def _is_cross_device(error):
+    return error.errno == errno.EXDEV or getattr(error, 'winerror', None) == _WIN_NOT_SAME_DEVICE
+
+
+def move_file(src, dst):
+    """
+    移动文件。同一文件系统内使用原子的os.replace重命名，不复制数据；
+    只有跨文件系统时才复制到目标目录的临时文件，再重命名并删除源文件。
+    """
+    with metrics.span('move') as span:
+        try:
+            os.replace(src, dst)
+            return
+        except OSError as e:
+            if not _is_cross_device(e):
+                raise
+        span.set(cross_device=True)
+        partial = dst + '.part'
+        try:
+            shutil.copy2(src, partial)
+            os.replace(partial, dst)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.remove(src)
+
+
+def write_atomic(path, data):
+    """把内容写到同目录的临时文件（path + '.tmp'）再重命名，读者不会看到写了一半的文件"""
+    partial = path + '.tmp'
+    try:
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def is_file_free(path):
+    """文件不存在或可以以读写方式打开时视为未被占用（Windows下Word持有的文件会打开失败）"""
+    if not os.path.exists(path):
+        return True
+    if not os.access(path, os.W_OK):
+        # 只读文件无法通过读写打开来判断，直接视为可用
+        return True
+    try:
+        with open(path, 'r+b'):
+            return True
+    except OSError:
+        return False
+
+
+def wait_until_free(path, timeout, initial_delay=0.005, max_delay=0.25):
+    """
+    轮询等待文件被释放，间隔从initial_delay开始指数增长到max_delay。
+    文件可用时立即返回True，超过timeout秒仍被占用时返回False。
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if is_file_free(path):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning(f"等待文件释放超时: {path}")
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+# Linux的FICLONE ioctl：在支持写时复制的文件系统（btrfs、XFS等）上共享数据块
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """创建dst为src的写时复制副本，平台或文件系统不支持时返回False"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_or_copy(src, dst, mode='hardlink'):
+    """
+    让dst与src内容相同而不重新生成：mode为hardlink时创建硬链接，reflink时创建写时复制的副本，
+    不支持时（跨文件系统、文件系统不支持、mode为copy）退回复制。
+    先写到目标目录的临时文件再原子重命名，返回实际使用的方式。
+    """
+    with metrics.span('link') as span:
+        partial = dst + '.part'
+        method = 'copy'
+        try:
+            if os.path.exists(partial):
+                os.remove(partial)
+            if mode == 'hardlink':
+                try:
+                    os.link(src, partial)
+                    method = 'hardlink'
+                except OSError:
+                    pass
+            elif mode == 'reflink' and _reflink(src, partial):
+                method = 'reflink'
+            if method == 'copy':
+                shutil.copy2(src, partial)
+            os.replace(partial, dst)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        span.set(method=method)
+    return method
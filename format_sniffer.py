@@ -0,0 +1,246 @@
+import io
+import logging
+import os
+import re
+import struct
+import zipfile
+import zlib
+
+# 只读取文件开头的这么多字节来判断格式
+HEAD_SIZE = 8 * 1024
+
+ZIP_SIGNATURE = b'PK\x03\x04'
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# 查找WordDocument流时最多读取的目录扇区数，防止损坏文件中的循环扇区链
+MAX_DIR_SECTORS = 128
+# 大于此值的扇区号表示链结束或特殊扇区
+_MAXREGSECT = 0xFFFFFFFA
+RTF_SIGNATURE = b'{\\rtf'
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CONTENT_TYPES = '[Content_Types].xml'
+
+# OOXML主文档部件的内容类型 -> 格式
+_MAIN_CONTENT_TYPES = {
+    b'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml': 'docx',
+    b'application/vnd.ms-word.document.macroEnabled.main+xml': 'docm',
+    b'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml': 'dotx',
+    b'application/vnd.ms-word.template.macroEnabledTemplate.main+xml': 'dotm',
+}
+
+# 各格式的正确扩展名
+FORMAT_EXTENSIONS = {
+    'docx': '.docx',
+    'docm': '.docm',
+    'dotx': '.dotx',
+    'dotm': '.dotm',
+    'doc': '.doc',
+    'rtf': '.rtf',
+    'html': '.html',
+    'mht': '.mht',
+    'wordml': '.xml',
+}
+
+# 纯Python引擎可以直接处理的格式（zip格式的Word文档），其余Word格式需要通过Word打开
+NATIVE_FORMATS = frozenset(['docx', 'docm', 'dotx', 'dotm'])
+# 纯Python的doc读取器可以处理的格式（切片结果转换为docx），也可以通过Word打开
+LEGACY_FORMATS = frozenset(['doc'])
+WORD_FORMATS = frozenset(['doc', 'rtf', 'html', 'mht', 'wordml'])
+
+_HTML_RE = re.compile(rb'^\s*(?:<!--.*?-->\s*)*<(?:!doctype\s+html|html|head|meta)\b', re.I | re.S)
+_MHT_RE = re.compile(rb'^\s*(?:[\w-]+:[^\r\n]*\r?\n)*?mime-version:', re.I)
+
+
+def _zip_first_member(head):
+    """从文件开头的本地文件头中读取第一个zip成员，返回 (名称, 内容)，内容无法直接得到时为None"""
+    if len(head) < _LOCAL_HEADER.size:
+        return None, None
+    _, _, flags, method, _, _, _, compress_size, _, name_len, extra_len = _LOCAL_HEADER.unpack_from(head)
+    start = _LOCAL_HEADER.size + name_len + extra_len
+    name = head[_LOCAL_HEADER.size:_LOCAL_HEADER.size + name_len].decode('utf-8', 'replace')
+    # 使用数据描述符时本地文件头中没有压缩后大小
+    if flags & 0x08 or start + compress_size > len(head):
+        return name, None
+    raw = head[start:start + compress_size]
+    try:
+        if method == zipfile.ZIP_STORED:
+            return name, raw
+        if method == zipfile.ZIP_DEFLATED:
+            return name, zlib.decompress(raw, -15)
+    except zlib.error:
+        pass
+    return name, None
+
+
+def _ooxml_format(content_types):
+    for content_type, fmt in _MAIN_CONTENT_TYPES.items():
+        if content_type in content_types:
+            return fmt
+    return 'zip'
+
+
+def _sniff_zip(source, head):
+    # Word保存的文件中[Content_Types].xml总是第一个成员，通常可以直接从开头几KB中解出
+    name, content = _zip_first_member(head)
+    if name == _CONTENT_TYPES and content is not None:
+        return _ooxml_format(content)
+    # 其他工具生成的文件顺序不同，退回到读取zip目录
+    try:
+        with zipfile.ZipFile(source) as zf:
+            if _CONTENT_TYPES not in zf.NameToInfo:
+                return 'zip'
+            return _ooxml_format(zf.read(_CONTENT_TYPES))
+    except (zipfile.BadZipFile, OSError, RuntimeError, zlib.error):
+        return 'unknown'
+
+
+def _cfb_sector(f, sector_size, sector):
+    f.seek((sector + 1) * sector_size)
+    data = f.read(sector_size)
+    return data if len(data) == sector_size else None
+
+
+def _cfb_next_sector(f, head, sector_size, sector):
+    """按FAT查找扇区链中的下一个扇区，链结束或结构损坏时返回None"""
+    per_sector = sector_size // 4
+    fat_index, entry = divmod(sector, per_sector)
+    if fat_index < 109:
+        fat_sector = struct.unpack_from('<L', head, 0x4c + fat_index * 4)[0]
+    else:
+        # 第109个之后的FAT扇区记录在DIFAT扇区链中，每个扇区的最后一项指向下一个DIFAT扇区
+        hops, slot = divmod(fat_index - 109, per_sector - 1)
+        difat_sector = struct.unpack_from('<L', head, 0x44)[0]
+        for _ in range(hops + 1):
+            data = _cfb_sector(f, sector_size, difat_sector) if difat_sector <= _MAXREGSECT else None
+            if data is None:
+                return None
+            difat_sector = struct.unpack_from('<L', data, sector_size - 4)[0]
+        fat_sector = struct.unpack_from('<L', data, slot * 4)[0]
+    data = _cfb_sector(f, sector_size, fat_sector) if fat_sector <= _MAXREGSECT else None
+    if data is None:
+        return None
+    next_sector = struct.unpack_from('<L', data, entry * 4)[0]
+    return next_sector if next_sector <= _MAXREGSECT else None
+
+
+def _sniff_cfb(f, head):
+    """
+    OLE2复合文档：沿目录流的扇区链查找WordDocument流，区分Word文档和Excel等其他OLE文件。
+    目录流可能不连续（512字节的扇区每个只有4个目录项），最多读取MAX_DIR_SECTORS个目录扇区
+    """
+    if len(head) < 512:
+        return 'unknown'
+    sector_shift = struct.unpack_from('<H', head, 0x1e)[0]
+    sector = struct.unpack_from('<L', head, 0x30)[0]
+    if not 7 <= sector_shift <= 16:
+        return 'unknown'
+    sector_size = 1 << sector_shift
+    for _ in range(MAX_DIR_SECTORS):
+        directory = _cfb_sector(f, sector_size, sector) if sector <= _MAXREGSECT else None
+        if directory is None:
+            break
+        for offset in range(0, len(directory) - 127, 128):
+            name_len = struct.unpack_from('<H', directory, offset + 0x40)[0]
+            if 2 <= name_len <= 64:
+                name = directory[offset:offset + name_len - 2].decode('utf-16-le', 'replace')
+                if name == 'WordDocument':
+                    return 'doc'
+        sector = _cfb_next_sector(f, head, sector_size, sector)
+        if sector is None:
+            break
+    return 'ole'
+
+
+def _strip_bom(head):
+    for bom, encoding in ((b'\xef\xbb\xbf', 'utf-8'), (b'\xff\xfe', 'utf-16-le'), (b'\xfe\xff', 'utf-16-be')):
+        if head.startswith(bom):
+            head = head[len(bom):]
+            if encoding != 'utf-8':
+                head = head.decode(encoding, 'ignore').encode('utf-8')
+            return head
+    return head
+
+
+def sniff_format(path):
+    """
+    只读取文件开头几KB判断文件的真实格式，返回FORMAT_EXTENSIONS中的格式名，
+    或'zip'（非Word的zip）、'ole'（非Word的OLE2文件）、'unknown'。
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(HEAD_SIZE)
+            if head.startswith(CFB_SIGNATURE):
+                return _sniff_cfb(f, head)
+    except OSError as e:
+        logging.error(f"读取文件失败: {path}, {e}")
+        return 'unknown'
+    return _sniff_head(path, head)
+
+
+def sniff_data(data):
+    """判断已读入内存的文件内容的真实格式，返回值与sniff_format相同"""
+    head = data[:HEAD_SIZE]
+    if head.startswith(CFB_SIGNATURE):
+        return _sniff_cfb(io.BytesIO(data), head)
+    return _sniff_head(io.BytesIO(data), head)
+
+
+def _sniff_head(source, head):
+    """按开头的字节判断zip、RTF、HTML等格式，source为zip目录需要时读取的文件路径或文件对象"""
+    if head.startswith(ZIP_SIGNATURE):
+        return _sniff_zip(source, head)
+    text = _strip_bom(head)
+    if text.startswith(RTF_SIGNATURE):
+        return 'rtf'
+    if _MHT_RE.match(text):
+        return 'mht'
+    if _HTML_RE.match(text):
+        return 'html'
+    if text.lstrip().startswith(b'<?xml'):
+        # Word 2003 XML（<w:wordDocument>）；扁平OPC等其他XML不作为Word文档处理
+        if b'<w:wordDocument' in text or b'schemas.microsoft.com/office/word/2003/wordml' in text:
+            return 'wordml'
+        if b'<html' in text.lower():
+            return 'html'
+    return 'unknown'
+
+
+def engine_for(fmt):
+    """
+    返回处理该格式的最低成本引擎：'native'（纯Python）、'legacy'（纯Python的doc读取器）、
+    'word'（Word COM），不支持时为None
+    """
+    if fmt in NATIVE_FORMATS:
+        return 'native'
+    if fmt in LEGACY_FORMATS:
+        return 'legacy'
+    if fmt in WORD_FORMATS:
+        return 'word'
+    return None
+
+
+def corrected_name(file_name, fmt):
+    """按真实格式修正文件扩展名，格式未知或扩展名已正确时原样返回"""
+    ext = FORMAT_EXTENSIONS.get(fmt)
+    base, current = os.path.splitext(file_name)
+    if ext is None or current.lower() == ext:
+        return file_name
+    return base + ext
+
+
+def fix_extension(path, fmt=None):
+    """
+    按真实格式重命名文件，返回新路径（无需修改、或目标文件已存在时返回原路径，由调用方输出结果）。
+    fmt为调用方已判断出的格式，为None时读取文件判断
+    """
+    if fmt is None:
+        fmt = sniff_format(path)
+    folder, name = os.path.split(path)
+    new_name = corrected_name(name, fmt)
+    if new_name == name:
+        return path
+    new_path = os.path.join(folder, new_name)
+    if os.path.exists(new_path):
+        return path
+    os.rename(path, new_path)
+    return new_path
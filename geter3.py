@@ -1,10 +1,24 @@
 import os
+import json
 import shutil
 import logging
 import time
+import contextlib
 import configparser
-from functools import wraps
-from head_geter import WordHeadGetter, find_section_offsets
+import importlib.util
+import metrics
+from collections import Counter
+from doc_reader import DocPackage
+from docx_slicer import DocxPackage
+from file_ops import move_file, wait_until_free, write_atomic
+from format_sniffer import FORMAT_EXTENSIONS, engine_for, sniff_format
+from heading_cache import HeadingCache, data_digest, file_digest
+from heading_index import HeadingIndex
+from journal import BatchJournal
+from keyword_matcher import KeywordMatcher
+from output_index import LINK_MODES, OutputIndex
+from slicer import (find_slice_range, find_spec_range, make_slice_spec, open_package, render_slice,
+                    spec_fingerprint)
 
 # 设置日志格式
 logging.basicConfig(
@@ -13,19 +27,26 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-def timeit_log(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        logging.info(f"开始执行: {func.__name__}")
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        logging.info(f"结束执行: {func.__name__}，耗时: {end_time - start_time:.2f} 秒")
-        return result
-    return wrapper
+# 并行模式下由工作进程设置的文件操作信号量
+_io_limiter = None
+
+def _read_chapter_section(section):
+    """读取一组章节设置（[ChapterSettings]或[Slice:<名称>]）"""
+    chapter_settings = {}
+    for key in section:
+        # 处理特殊情况：多个关键词用逗号分隔
+        if key in ['section1', 'section2']:
+            chapter_settings[key] = section[key].split(',')
+        else:
+            # 尝试将其他参数转换为整数
+            try:
+                chapter_settings[key] = int(section[key])
+            except ValueError:
+                chapter_settings[key] = section[key]
+    return chapter_settings
 
 def read_config(config_file='config.ini'):
-    """从配置文件读取参数"""
+    """从配置文件读取参数并检查（见validate_config），文件不存在或设置有误时返回None"""
     config = configparser.ConfigParser()
     
     # 检查配置文件是否存在
@@ -34,8 +55,21 @@ def read_config(config_file='config.ini'):
         return None
     
     # 读取配置文件
-    config.read(config_file, encoding='utf-8')
+    try:
+        config.read(config_file, encoding='utf-8')
+        settings = _parse_config(config)
+    except (configparser.Error, ValueError) as e:
+        logging.error(f"配置文件 {config_file} 格式错误: {e}")
+        return None
     
+    # 启动时检查一次，之后各处直接使用
+    errors = validate_config(settings)
+    for error in errors:
+        logging.error(f"配置文件 {config_file}: {error}")
+    return None if errors else settings
+
+def _parse_config(config):
+    """把ConfigParser中的各配置段转换为read_config返回的字典，数值设置转换为int或float"""
     # 读取路径配置
     paths = {}
     if 'Paths' in config:
@@ -45,41 +79,393 @@ def read_config(config_file='config.ini'):
     # 读取章节设置
     chapter_settings = {}
     if 'ChapterSettings' in config:
-        for key in config['ChapterSettings']:
-            # 处理特殊情况：多个关键词用逗号分隔
-            if key in ['section1', 'section2']:
-                chapter_settings[key] = config['ChapterSettings'][key].split(',')
-            else:
-                # 尝试将其他参数转换为整数
-                try:
-                    chapter_settings[key] = int(config['ChapterSettings'][key])
-                except ValueError:
-                    chapter_settings[key] = config['ChapterSettings'][key]
+        chapter_settings = _read_chapter_section(config['ChapterSettings'])
+    
+    # 读取命名切片设置：[Slice:<名称>]，每个切片输出为 <文件名>_<名称>.docx
+    slices = {}
+    for section_name in config.sections():
+        if section_name.startswith('Slice:'):
+            name = section_name[len('Slice:'):].strip()
+            if name:
+                slices[name] = _read_chapter_section(config[section_name])
     
     # 读取处理设置
     processing = {}
     if 'Processing' in config:
         for key in config['Processing']:
             # 尝试将数值参数转换为适当的类型
-            if key == 'wait_time':
+            if key in ['wait_time', 'prefetch_max_mb', 'file_timeout', 'file_memory_mb']:
                 processing[key] = float(config['Processing'][key])
-            elif key == 'verbose':
+            elif key in ['workers', 'io_concurrency', 'prefetch']:
+                processing[key] = int(config['Processing'][key])
+            elif key in ['verbose', 'pipeline']:
                 processing[key] = config['Processing'][key].lower() == 'true'
             else:
                 processing[key] = config['Processing'][key]
     
+    # 读取关键词匹配设置（标题归一化选项）
+    matching = {}
+    if 'Matching' in config:
+        for key in ['fold_width', 'strip_whitespace', 'strip_numbering', 'ignore_case']:
+            if key in config['Matching']:
+                matching[key] = config['Matching'][key].lower() == 'true'
+    
+    # 读取Word会话池设置
+    word = {}
+    if 'Word' in config:
+        for key in config['Word']:
+            if key in ['document_timeout', 'probe_timeout', 'max_memory_mb']:
+                word[key] = float(config['Word'][key])
+            elif key in ['size', 'max_documents', 'retries']:
+                word[key] = int(config['Word'][key])
+    
+    # 读取守护进程设置
+    daemon = {}
+    if 'Daemon' in config:
+        for key in config['Daemon']:
+            if key in ['poll_interval', 'settle_time']:
+                daemon[key] = float(config['Daemon'][key])
+            elif key == 'queue_size':
+                daemon[key] = int(config['Daemon'][key])
+            elif key == 'use_inotify':
+                daemon[key] = config['Daemon'][key].lower() == 'true'
+            else:
+                daemon[key] = config['Daemon'][key]
+    
+    # 读取HTTP服务设置
+    service = {}
+    if 'Service' in config:
+        for key in config['Service']:
+            if key in ['port', 'max_concurrency', 'queue_size']:
+                service[key] = int(config['Service'][key])
+            elif key in ['queue_timeout', 'max_upload_mb']:
+                service[key] = float(config['Service'][key])
+            else:
+                service[key] = config['Service'][key]
+    
+    # 读取缓存设置
+    cache = {}
+    if 'Cache' in config:
+        for key in config['Cache']:
+            if key == 'enabled':
+                cache[key] = config['Cache'][key].lower() == 'true'
+            elif key == 'max_size_mb':
+                cache[key] = float(config['Cache'][key])
+            else:
+                cache[key] = config['Cache'][key]
+    
+    # 读取重复输入设置
+    dedupe = {}
+    if 'Dedupe' in config:
+        for key in config['Dedupe']:
+            if key == 'enabled':
+                dedupe[key] = config['Dedupe'][key].lower() == 'true'
+            elif key == 'max_size_mb':
+                dedupe[key] = float(config['Dedupe'][key])
+            else:
+                dedupe[key] = config['Dedupe'][key]
+    
+    # 读取处理日志设置
+    journal = {}
+    if 'Journal' in config:
+        for key in config['Journal']:
+            if key in ['enabled', 'fsync']:
+                journal[key] = config['Journal'][key].lower() == 'true'
+            else:
+                journal[key] = config['Journal'][key]
+    
+    # 读取多节点协调设置
+    cluster = {}
+    if 'Cluster' in config:
+        for key in config['Cluster']:
+            if key == 'enabled':
+                cluster[key] = config['Cluster'][key].lower() == 'true'
+            elif key in ['lease_timeout', 'heartbeat_interval']:
+                cluster[key] = float(config['Cluster'][key])
+            elif key == 'batch_size':
+                cluster[key] = int(config['Cluster'][key])
+            else:
+                cluster[key] = config['Cluster'][key]
+    
+    # 读取性能指标设置
+    metrics_settings = {}
+    if 'Metrics' in config:
+        for key in config['Metrics']:
+            if key == 'enabled':
+                metrics_settings[key] = config['Metrics'][key].lower() == 'true'
+            else:
+                metrics_settings[key] = config['Metrics'][key]
+    
     return {
         'paths': paths,
         'chapter_settings': chapter_settings,
-        'processing': processing
+        'slices': slices,
+        'matching': matching,
+        'processing': processing,
+        'word': word,
+        'daemon': daemon,
+        'service': service,
+        'cache': cache,
+        'dedupe': dedupe,
+        'journal': journal,
+        'cluster': cluster,
+        'metrics': metrics_settings
     }
 
-@timeit_log
+def _check_chapter_settings(errors, section, settings):
+    for key in ['section1', 'section2']:
+        if key in settings and not any(keyword.strip() for keyword in settings[key]):
+            errors.append(f"[{section}] {key}不能为空")
+    for key in ['section1_offset', 'section2_offset', 'section1_level', 'section2_level']:
+        value = settings.get(key)
+        if value is not None and not isinstance(value, int):
+            errors.append(f"[{section}] {key}应为整数: {value}")
+        elif key.endswith('_level') and value is not None and value < 1:
+            errors.append(f"[{section}] {key}应不小于1: {value}")
+
+def _check_range(errors, section, settings, key, minimum, exclusive=False):
+    value = settings.get(key)
+    if value is None:
+        return
+    if value < minimum or (exclusive and value == minimum):
+        errors.append(f"[{section}] {key}应{'大于' if exclusive else '不小于'}{minimum:g}: {value:g}")
+
+def validate_config(config):
+    """
+    检查read_config读出的设置，返回错误说明的列表（没有错误时为空列表）。
+    read_config读取时检查一次，之后处理过程中不再逐项校验。
+    """
+    errors = []
+    _check_chapter_settings(errors, 'ChapterSettings', config.get('chapter_settings', {}))
+    for name, settings in config.get('slices', {}).items():
+        _check_chapter_settings(errors, f'Slice:{name}', settings)
+    
+    processing = config.get('processing', {})
+    for key in ['workers', 'wait_time', 'prefetch_max_mb', 'file_timeout', 'file_memory_mb']:
+        _check_range(errors, 'Processing', processing, key, 0)
+    for key in ['io_concurrency', 'prefetch']:
+        _check_range(errors, 'Processing', processing, key, 1)
+    doc_engine = processing.get('doc_engine', 'auto').lower()
+    if doc_engine not in DOC_ENGINES:
+        errors.append(f"[Processing] doc_engine应为{'、'.join(DOC_ENGINES)}之一: {doc_engine}")
+    
+    word = config.get('word', {})
+    _check_range(errors, 'Word', word, 'size', 1)
+    for key in ['max_documents', 'retries', 'document_timeout', 'probe_timeout', 'max_memory_mb']:
+        _check_range(errors, 'Word', word, key, 0)
+    
+    daemon = config.get('daemon', {})
+    _check_range(errors, 'Daemon', daemon, 'poll_interval', 0, exclusive=True)
+    _check_range(errors, 'Daemon', daemon, 'settle_time', 0)
+    _check_range(errors, 'Daemon', daemon, 'queue_size', 1)
+    
+    service = config.get('service', {})
+    _check_range(errors, 'Service', service, 'port', 0)
+    if service.get('port', 0) > 65535:
+        errors.append(f"[Service] port应不大于65535: {service['port']}")
+    _check_range(errors, 'Service', service, 'max_concurrency', 1)
+    for key in ['queue_size', 'queue_timeout']:
+        _check_range(errors, 'Service', service, key, 0)
+    _check_range(errors, 'Service', service, 'max_upload_mb', 0, exclusive=True)
+    
+    for section in ['cache', 'dedupe']:
+        _check_range(errors, section.capitalize(), config.get(section, {}), 'max_size_mb', 0)
+    link_mode = config.get('dedupe', {}).get('link_mode', 'reflink').lower()
+    if link_mode not in LINK_MODES:
+        errors.append(f"[Dedupe] link_mode应为{'、'.join(LINK_MODES)}之一: {link_mode}")
+    
+    cluster = config.get('cluster', {})
+    _check_range(errors, 'Cluster', cluster, 'heartbeat_interval', 0, exclusive=True)
+    _check_range(errors, 'Cluster', cluster, 'batch_size', 1)
+    if cluster.get('enabled', False) and cluster.get('lease_timeout', 120) <= cluster.get('heartbeat_interval', 15):
+        errors.append(f"[Cluster] lease_timeout应大于heartbeat_interval: "
+                      f"{cluster.get('lease_timeout', 120):g} <= {cluster.get('heartbeat_interval', 15):g}")
+    return errors
+
+def open_heading_cache(config, base_dir):
+    """根据配置创建标题索引缓存，未启用时返回None"""
+    settings = config.get('cache', {})
+    if not settings.get('enabled', False):
+        return None
+    path = os.path.join(base_dir, settings.get('path', 'cache/heading_index.sqlite3'))
+    max_bytes = int(settings.get('max_size_mb', 256) * 1024 * 1024)
+    logging.info(f"已启用标题索引缓存: {path}")
+    return HeadingCache(path, max_bytes)
+
+def open_output_index(config, base_dir):
+    """根据配置创建重复输入的切片结果索引，未启用时返回None"""
+    settings = config.get('dedupe', {})
+    if not settings.get('enabled', False):
+        return None
+    path = os.path.join(base_dir, settings.get('path', 'cache/outputs.sqlite3'))
+    store_folder = os.path.join(base_dir, settings.get('store_folder', 'cache/outputs'))
+    link_mode = settings.get('link_mode', 'reflink').lower()
+    if link_mode not in LINK_MODES:
+        logging.warning(f"link_mode设置无效: {link_mode}，改为reflink")
+        link_mode = 'reflink'
+    max_bytes = int(settings.get('max_size_mb', 1024) * 1024 * 1024)
+    logging.info(f"已启用重复输入检测: {path}")
+    return OutputIndex(path, store_folder, link_mode, max_bytes)
+
+def open_batch_journal(config, base_dir, claims=None):
+    """
+    根据配置打开处理日志并恢复上次中断的处理，未启用时返回None。
+    协调模式下日志放在本节点的认领文件夹中（节点失联后由回收它的节点按日志恢复），不需要启动时恢复。
+    """
+    settings = config.get('journal', {})
+    if not settings.get('enabled', False):
+        return None
+    if claims is not None:
+        journal = BatchJournal(claims.journal_path, settings.get('fsync', True))
+        logging.info(f"已启用处理日志: {journal.path}")
+        return journal
+    path = os.path.join(base_dir, settings.get('path', 'journal/batch.jsonl'))
+    journal = BatchJournal(path, settings.get('fsync', True))
+    logging.info(f"已启用处理日志: {path}")
+    journal.recover()
+    journal.compact()
+    return journal
+
+def open_claim_queue(config, base_dir):
+    """根据配置创建多节点协调的文件认领队列（见claim_queue.py），未启用时返回None"""
+    settings = config.get('cluster', {})
+    if not settings.get('enabled', False):
+        return None
+    from claim_queue import ClaimQueue
+    input_folder = os.path.join(base_dir, config['paths'].get('input_folder', 'input_file'))
+    return ClaimQueue(
+        input_folder,
+        node_id=settings.get('node_id') or None,
+        lease_timeout=settings.get('lease_timeout', 120),
+        heartbeat_interval=settings.get('heartbeat_interval', 15),
+        batch_size=settings.get('batch_size', 8),
+        fsync=config.get('journal', {}).get('fsync', True)
+    )
+
+def slice_docx_native_multi(input_path, jobs, cache=None, package_class=DocxPackage, data=None, digest=None):
+    """
+    一次解析docx，按多个切片规格分别输出（在内存中切片后写出，见slicer.py）。
+    jobs为[(spec, output_path), ...]，返回每个切片是否成功的列表。
+    package_class为DocPackage时读取doc，切片结果转换为docx。
+    data为已预读到内存的文件内容时直接从内存解析，不再读取input_path。
+    digest为已算出的文件内容哈希时，查询缓存不再重新计算。
+    """
+    done = [False] * len(jobs)
+    try:
+        with open_package(input_path if data is None else data, package_class, cache, digest) as package:
+            for i, (spec, output_path) in enumerate(jobs):
+                try:
+                    content = render_slice(package, spec)
+                    if content is None:
+                        logging.warning(f"切片[{spec['name']}]未找到指定章节或切片区间超出标题范围: {input_path}")
+                        continue
+                    write_atomic(output_path, content)
+                    logging.info(f"切片[{spec['name']}]完成: {output_path}")
+                    done[i] = True
+                except Exception as e:
+                    logging.error(f"切片[{spec['name']}]保存失败: {e}")
+    except Exception as e:
+        logging.error(f"处理{input_path}时发生异常: {e}")
+    return done
+
+def slice_word_multi_with_getter(getter, input_path, jobs, cache=None, digest=None):
+    """
+    通过Word一次打开并解析文档，按多个切片规格分别输出。
+    每个切片删除区间外内容并另存后，用Undo恢复原文档再切下一个；恢复失败时重新打开。
+    """
+    done = [False] * len(jobs)
+    index = None
+    if cache is not None:
+        if digest is None:
+            digest = file_digest(input_path)
+        index = cache.get(digest, 'word')
+    if index is not None:
+        headings = HeadingIndex.from_flat(index['titles'])
+        doc = None
+    else:
+        titles, doc = getter.get_document_titles_tree(input_path)
+        if titles is None:
+            logging.warning(f"无法解析文档结构: {input_path}")
+            return done
+        headings = HeadingIndex.from_tree(titles)
+        if cache is not None:
+            cache.put(digest, 'word', {'titles': headings.to_flat()})
+
+    try:
+        for i, (spec, output_path) in enumerate(jobs):
+            if doc is None:
+                doc = getter.open_document(input_path)
+            content_end = doc.Content.End
+            slice_range = find_spec_range(headings, content_end, spec)
+            if slice_range is None:
+                logging.warning(f"切片[{spec['name']}]未找到指定章节或切片区间超出标题范围: {input_path}")
+                continue
+            start, end = slice_range
+            end = min(end, content_end)
+            start = max(start, 0)
+            try:
+                logging.info(f"开始切片[{spec['name']}]: {output_path}，范围: {start} - {end}")
+                with metrics.span('cut', engine='word'):
+                    doc.Range(end, content_end).Delete()
+                    doc.Range(0, start).Delete()
+                with metrics.span('save', engine='word'):
+                    doc.SaveAs(output_path)
+                done[i] = True
+            except Exception as e:
+                logging.error(f"切片[{spec['name']}]保存失败: {e}")
+            # 撤销删除，恢复原文档供下一个切片使用
+            try:
+                doc.Undo(2)
+                restored = doc.Content.End == content_end
+            except Exception:
+                restored = False
+            if not restored:
+                doc.Close(False)
+                doc = None
+    except Exception as e:
+        logging.error(f"处理{input_path}时发生异常: {e}")
+    finally:
+        if doc is not None:
+            try:
+                doc.Close(False)
+            except Exception as close_err:
+                logging.error(f"关闭文档时发生异常: {close_err}")
+    return done
+
+def slice_docx_native(input_path, output_path, section1_keywords, section2_keywords,
+                      section1_offset=1, section2_offset=1, section1_level=1, section2_level=1,
+                      cache=None, package_class=DocxPackage, data=None, digest=None):
+    """
+    不依赖Word，直接重写docx的document.xml完成切片（在内存中切片后写出，见slicer.py）。
+    package_class为DocPackage时读取doc，切片区间内的段落转换为docx输出。
+    data为已预读到内存的文件内容时直接从内存解析，不再读取input_path。
+    digest为已算出的文件内容哈希时，查询缓存不再重新计算。
+    """
+    spec = dict(
+        name=None, section1_keywords=section1_keywords, section2_keywords=section2_keywords,
+        section1_offset=section1_offset, section2_offset=section2_offset,
+        section1_level=section1_level, section2_level=section2_level
+    )
+    try:
+        with open_package(input_path if data is None else data, package_class, cache, digest) as package:
+            content = render_slice(package, spec)
+        if content is None:
+            logging.warning(f"未找到指定章节或切片区间超出标题范围: {output_path}")
+            return False
+        write_atomic(output_path, content)
+        logging.info(f"切片完成: {output_path}")
+        return True
+    except Exception as e:
+        logging.error(f"处理{output_path}时发生异常: {e}")
+        return False
+
 def slice_word_by_delete_with_getter(getter, input_path, output_path, section1_keywords, section2_keywords, 
-                                     section1_offset=1, section2_offset=1, section1_level=1, section2_level=1):
+                                     section1_offset=1, section2_offset=1, section1_level=1, section2_level=1,
+                                     cache=None, digest=None):
     """根据关键词列表切片文档"""
     if os.path.abspath(input_path) != os.path.abspath(output_path):
-        shutil.copy2(input_path, output_path)
+        with metrics.span('copy'):
+            shutil.copy2(input_path, output_path)
     
     # 确保输出文件不是只读的
     try:
@@ -88,68 +474,42 @@ def slice_word_by_delete_with_getter(getter, input_path, output_path, section1_k
     except Exception as e:
         logging.error(f"修改文件权限失败: {e}")
     
-    # 获取文档标题结构
-    titles, doc = getter.get_document_titles_tree(output_path)
-    if titles is None:
-        logging.warning(f"无法解析文档结构: {output_path}")
-        return False
-
-    # 获取指定等级的标题
-    level1_titles = [node for node in titles if node.get("级别", 1) == section1_level]
-    level2_titles = [node for node in titles if node.get("级别", 1) == section2_level]
-    offsets1 = [(node["标题"], node["偏移量"]) for node in level1_titles]
-    offsets2 = [(node["标题"], node["偏移量"]) for node in level2_titles]
-    
-    # 找到section1和section2的index
-    start_idx = end_idx = None
-    
-    # 遍历所有section1关键词，找到匹配的第一个
-    for keyword in section1_keywords:
-        if start_idx is not None:
-            break
-        for idx, (title, _) in enumerate(offsets1):
-            if keyword in title:
-                start_idx = idx
-                logging.info(f"找到起始章节: {keyword} 在 {title}")
-                break
-    
-    # 遍历所有section2关键词，找到匹配的第一个
-    for keyword in section2_keywords:
-        if end_idx is not None:
-            break
-        for idx, (title, _) in enumerate(offsets2):
-            if keyword in title:
-                end_idx = idx
-                logging.info(f"找到结束章节: {keyword} 在 {title}")
-                break
-    
-    # 如果未找到指定章节，尝试关闭文档并返回False
-    if start_idx is None or end_idx is None:
-        logging.warning(f"未找到指定章节: {output_path}")
+    # 获取文档标题结构，命中缓存时只打开文档，不再逐段读取
+    index = None
+    if cache is not None:
+        if digest is None:
+            digest = file_digest(output_path)
+        index = cache.get(digest, 'word')
+    if index is not None:
+        headings = HeadingIndex.from_flat(index['titles'])
         try:
-            if doc is not None:
-                doc.Close(False)
+            doc = getter.open_document(output_path)
         except Exception as e:
-            logging.error(f"关闭文档时发生异常: {e}")
-        return False
-    
-    # 计算实际切片区间
-    start_target_idx = start_idx + section1_offset
-    end_target_idx = end_idx + section2_offset
-    if start_target_idx >= len(offsets1) or end_target_idx > len(offsets2):
-        logging.warning(f"切片区间超出标题范围: {output_path}")
+            logging.warning(f"无法打开文档: {output_path}, {e}")
+            return False
+    else:
+        titles, doc = getter.get_document_titles_tree(output_path)
+        if titles is None:
+            logging.warning(f"无法解析文档结构: {output_path}")
+            return False
+        headings = HeadingIndex.from_tree(titles)
+        if cache is not None:
+            cache.put(digest, 'word', {'titles': headings.to_flat()})
+
+    # 计算切片区间
+    slice_range = find_slice_range(
+        headings, doc.Content.End, section1_keywords, section2_keywords,
+        section1_offset, section2_offset, section1_level, section2_level
+    )
+    if slice_range is None:
+        logging.warning(f"未找到指定章节或切片区间超出标题范围: {output_path}")
         try:
             if doc is not None:
                 doc.Close(False)
         except Exception as e:
             logging.error(f"关闭文档时发生异常: {e}")
         return False
-    
-    start = offsets1[start_target_idx][1]
-    if end_target_idx == len(offsets2):
-        end = doc.Content.End
-    else:
-        end = offsets2[end_target_idx][1]
+    start, end = slice_range
 
     try:
         # 验证切片点范围
@@ -161,15 +521,17 @@ def slice_word_by_delete_with_getter(getter, input_path, output_path, section1_k
 
         # 执行切片操作
         logging.info(f"开始切片: {output_path}，范围: {start} - {end}")
-        doc.Range(end, content_end).Delete()
-        logging.info(f"删除结束部分: {output_path}")
-        doc.Range(0, start).Delete()
-        logging.info(f"删除开始部分: {output_path}")
+        with metrics.span('cut', engine='word'):
+            doc.Range(end, content_end).Delete()
+            logging.info(f"删除结束部分: {output_path}")
+            doc.Range(0, start).Delete()
+            logging.info(f"删除开始部分: {output_path}")
         
         # 保存文件到临时文件，避免只读问题
         temp_save_path = output_path + ".tmp"
         try:
-            doc.SaveAs(temp_save_path)
+            with metrics.span('save', engine='word'):
+                doc.SaveAs(temp_save_path)
             logging.info(f"临时文件保存成功: {temp_save_path}")
             
             # 关闭文档
@@ -204,101 +566,500 @@ def slice_word_by_delete_with_getter(getter, input_path, output_path, section1_k
                 logging.error(f"关闭文档时发生异常: {close_err}")
         return False
 
-@timeit_log
-def process_file(getter, file_path, temp_folder, output_folder, unsupport_folder, old_folder, 
-                 section1_keywords, section2_keywords, section1_offset, section2_offset, 
-                 section1_level, section2_level, wait_time=1):
-    """处理单个文件"""
-    ext = os.path.splitext(file_path)[1].lower()
-    file_name = os.path.basename(file_path)
-
-    if ext not in ['.doc', '.docx']:
-        target_path = os.path.join(unsupport_folder, file_name)
-        logging.info(f"{file_path} 不是doc/docx，已剪切到: {target_path}")
+def io_slot():
+    """获取一个文件操作名额，并行模式下限制同时读写temp/output/old文件夹的进程数"""
+    if _io_limiter is None:
+        return contextlib.nullcontext()
+    return _io_limiter
+
+def open_word_getter(settings=None):
+    """创建Word会话池（设置见config.ini的[Word]），Word实例在第一次处理文档时才启动"""
+    from word_pool import WordSessionPool
+    return WordSessionPool(**(settings or {}))
+
+def close_word_getter(getter):
+    """关闭所有Word标签页并退出所有Word实例"""
+    if getter is None:
+        return
+    getter.close()
+
+# 按扩展名接收的输入文件，实际格式由文件内容判断
+WORD_EXTENSIONS = ('.doc', '.docx')
+
+# doc文件的处理方式：word（通过Word，保留全部格式）、native（纯Python读取并转换为docx）、auto
+DOC_ENGINES = ('auto', 'word', 'native')
+
+def resolve_doc_engine(setting='auto'):
+    """把doc_engine设置解析为'word'或'native'：auto在安装了pywin32（可以调用Word）时选择word"""
+    setting = (setting or 'auto').lower()
+    if setting in ('word', 'native'):
+        return setting
+    return 'word' if importlib.util.find_spec('win32com') is not None else 'native'
+
+def choose_engine(fmt, doc_engine='auto'):
+    """按文件格式选择引擎：'native'（docx）、'legacy'（纯Python读取doc）、'word'，不支持时为None"""
+    engine = engine_for(fmt)
+    if engine == 'legacy' and resolve_doc_engine(doc_engine) == 'word':
+        return 'word'
+    return engine
+
+def needs_word(file_path, doc_engine='auto'):
+    """判断文件是否需要通过Word(COM)处理：按文件内容判断为rtf、html等格式（以及按设置交给Word的doc）"""
+    if os.path.splitext(file_path)[1].lower() not in WORD_EXTENSIONS:
+        return False
+    return choose_engine(sniff_format(file_path), doc_engine) == 'word'
+
+def output_base(file_name, ext):
+    """
+    输出文件名（不含切片后缀和扩展名）：输出扩展名与原文件相同时为原文件名去掉扩展名，
+    不同时（如纯Python读取的a.doc输出为docx）保留原扩展名（a.doc），
+    避免同一文件夹中的a.doc和a.docx写到同一个临时文件和输出文件
+    """
+    base, current = os.path.splitext(file_name)
+    return base if current.lower() == ext else file_name
+
+class FileJob:
+    """
+    一个文件在各处理阶段之间传递的状态。
+    顺序处理时三个阶段依次执行；流水线模式（pipeline.py）下准备和收尾在I/O线程中执行，切片在主线程中执行。
+    """
+
+    __slots__ = ('file_path', 'file_name', 'size', 'started', 'fmt', 'engine', 'temp_path', 'out_path',
+                 'outputs', 'data', 'digest', 'spec_key', 'claimed', 'duplicate', 'done', 'success', 'result',
+                 'error')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.size = None
+        self.started = time.perf_counter()
+        self.fmt = None
+        self.engine = None
+        self.temp_path = None
+        self.out_path = None
+        # 命名切片：(规格, 临时输出路径, 最终输出路径)
+        self.outputs = []
+        # 预读到内存的文件内容（只用于纯Python引擎）
+        self.data = None
+        # 文件内容的SHA-256和切片设置的键（启用重复输入检测时）
+        self.digest = None
+        self.spec_key = None
+        # 本文件是这份内容的第一份，负责在收尾时登记结果
+        self.claimed = False
+        # 内容相同的文件已切片过时，其保存的结果 [(名称, 路径), ...]
+        self.duplicate = None
+        self.done = None
+        self.success = False
+        # 准备阶段即可确定的结果（如不支持的文件），确定后跳过后续阶段
+        self.result = None
+        # 准备或切片阶段发生的异常，在收尾阶段按"error"处理
+        self.error = None
+
+    @property
+    def native(self):
+        return self.engine in ('native', 'legacy')
+
+class FileProcessor:
+    """
+    单个文件的处理流程，分为三个阶段：
+    prepare（识别格式，Word文件复制到临时文件夹，需要时把文件预读到内存）、
+    slice（解析标题并切片，结果写到临时文件夹）、
+    finish（等待Word释放文件，移动输出文件和原文件）。
+    参数与process_file相同；slices为命名切片规格列表时，文档只打开和解析一次，每个切片输出为 <文件名>_<名称>.<扩展名>。
+    doc_engine决定doc文件由Word处理还是由纯Python读取器转换为docx（见resolve_doc_engine）。
+    journal为BatchJournal时记录每个文件的状态转换，崩溃后可据此恢复（见journal.py）。
+    dedupe为OutputIndex时按内容哈希识别重复的输入，内容和切片设置都相同的文件只切片一次，
+    之后的重复文件直接链接出已有的结果（见output_index.py）。
+    """
+
+    def __init__(self, temp_folder, output_folder, unsupport_folder, old_folder,
+                 section1_keywords, section2_keywords, section1_offset, section2_offset,
+                 section1_level, section2_level, wait_time=1, cache=None, slices=None, doc_engine='auto',
+                 journal=None, dedupe=None):
+        self.temp_folder = temp_folder
+        self.output_folder = output_folder
+        self.unsupport_folder = unsupport_folder
+        self.old_folder = old_folder
+        self.section1_keywords = section1_keywords
+        self.section2_keywords = section2_keywords
+        self.section1_offset = section1_offset
+        self.section2_offset = section2_offset
+        self.section1_level = section1_level
+        self.section2_level = section2_level
+        self.wait_time = wait_time
+        self.cache = cache
+        self.slices = slices
+        self.doc_engine = doc_engine
+        self.journal = journal
+        self.dedupe = dedupe
+        if slices:
+            self._fingerprint = [spec_fingerprint(spec) for spec in slices]
+        else:
+            self._fingerprint = [spec_fingerprint(dict(
+                section1_keywords=section1_keywords, section2_keywords=section2_keywords,
+                section1_offset=section1_offset, section2_offset=section2_offset,
+                section1_level=section1_level, section2_level=section2_level
+            ))]
+
+    def process(self, getter, file_path):
+        """依次执行三个阶段，返回"success"、"duplicate"、"failed"、"error"或"unsupported" """
+        job = self.prepare(file_path)
+        self.slice(getter, job)
+        return self.finish(job)
+
+    def prepare(self, file_path, prefetch_limit=0):
+        """
+        准备阶段（只做I/O）：只读取文件开头判断真实格式并选择引擎，不支持的文件直接移动到unsupport文件夹。
+        prefetch_limit大于0时，不超过该大小（字节）的纯Python引擎文件整个读入内存，切片时不再读取磁盘。
+        """
+        job = FileJob(file_path)
+        ext = os.path.splitext(file_path)[1].lower()
+        file_name = job.file_name
         try:
-            shutil.copy2(file_path, target_path)  # 复制到不支持文件夹
-            os.remove(file_path)  # 删除源文件
+            job.size = os.path.getsize(file_path)
+        except OSError:
+            pass
+
+        real_ext = self._plan(job)
+        fmt, engine = job.fmt, job.engine
+        if engine is None:
+            target_path = os.path.join(self.unsupport_folder, file_name)
+            if fmt is None:
+                logging.info(f"{file_path} 不是doc/docx，已剪切到: {target_path}")
+            else:
+                logging.info(f"{file_path} 不是Word文档（{fmt}），已剪切到: {target_path}")
+            try:
+                with io_slot():
+                    move_file(file_path, target_path)
+            except Exception as e:
+                logging.error(f"文件操作失败: {e}")
+            job.result = "unsupported"
+            return job
+
+        if engine == 'legacy':
+            logging.info(f"{file_name} 为doc格式，由纯Python读取器处理，切片结果转换为docx")
+        elif real_ext != ext:
+            logging.info(f"{file_name} 的实际格式为{fmt}，输出文件扩展名改为{real_ext}")
+        ext = real_ext
+
+        if self.journal is not None:
+            self.journal.begin(
+                file_path, os.path.join(self.old_folder, file_name), os.path.join(self.unsupport_folder, file_name),
+                job.temp_path, job.out_path,
+                [(spec['name'], temp_out, final_out) for spec, temp_out, final_out in job.outputs]
+            )
+
+        try:
+            if not job.native:
+                # Word会锁定打开的文件，先复制到临时文件夹再处理
+                with io_slot(), metrics.span('copy'):
+                    shutil.copy2(file_path, job.temp_path)
+            elif prefetch_limit and job.size is not None and job.size <= prefetch_limit:
+                with io_slot(), metrics.span('read', size=job.size):
+                    with open(file_path, 'rb') as f:
+                        job.data = f.read()
+            if self.dedupe is not None:
+                with metrics.span('hash', size=job.size):
+                    job.digest = file_digest(file_path) if job.data is None else data_digest(job.data)
+                job.spec_key = OutputIndex.key(engine, ext, self._fingerprint)
         except Exception as e:
-            logging.error(f"文件操作失败: {e}")
-        return "unsupported"
+            job.error = e
+        return job
 
-    base_name = os.path.splitext(file_name)[0]
-    temp_path = os.path.join(temp_folder, file_name)
-    out_path = os.path.join(output_folder, base_name + '_slice' + ext)
+    def _plan(self, job, source=None):
+        """
+        识别格式并选择引擎（读取source，默认为job.file_path），确定临时文件和输出文件的路径，
+        返回输出文件的扩展名，不支持的文件返回None
+        """
+        source = source or job.file_path
+        ext = os.path.splitext(job.file_path)[1].lower()
+        job.fmt = fmt = sniff_format(source) if ext in WORD_EXTENSIONS else None
+        job.engine = engine = choose_engine(fmt, self.doc_engine)
+        if engine is None:
+            return None
+        # 扩展名与实际格式不符时，临时文件和输出文件使用正确的扩展名；纯Python读取的doc输出为docx
+        ext = '.docx' if engine == 'legacy' else FORMAT_EXTENSIONS[fmt]
+        base_name = output_base(job.file_name, ext)
+        job.temp_path = os.path.join(self.temp_folder, base_name + ext)
+        job.out_path = os.path.join(self.output_folder, base_name + '_slice' + ext)
+        job.outputs = [
+            (spec, os.path.join(self.temp_folder, f"{base_name}_{spec['name']}{ext}"),
+             os.path.join(self.output_folder, f"{base_name}_{spec['name']}{ext}"))
+            for spec in self.slices or []
+        ]
+        return ext
+
+    def slice(self, getter, job):
+        """切片阶段：docx和（按设置）doc走纯Python引擎，rtf、html等通过getter走Word"""
+        if job.result is not None or job.error is not None:
+            return job
+        if job.digest is not None and self._reuse(job):
+            return job
+        try:
+            # 纯Python引擎只读取原文件（或预读的内容），切片结果直接写到临时文件夹
+            logging.info(f"开始处理文件: {job.file_name}")
+            package_class = DocPackage if job.engine == 'legacy' else DocxPackage
+            if job.outputs:
+                jobs = [(spec, temp_out) for spec, temp_out, _ in job.outputs]
+                if job.native:
+                    job.done = slice_docx_native_multi(job.file_path, jobs, self.cache, package_class, job.data,
+                                                       job.digest)
+                else:
+                    job.done = getter.run(slice_word_multi_with_getter, job.temp_path, jobs, self.cache, job.digest,
+                                          reset=lambda: self._recopy(job))
+                job.success = any(job.done)
+            elif job.native:
+                job.success = slice_docx_native(
+                    job.file_path, job.temp_path, self.section1_keywords, self.section2_keywords,
+                    self.section1_offset, self.section2_offset, self.section1_level, self.section2_level,
+                    self.cache, package_class, job.data, job.digest
+                )
+            else:
+                job.success = getter.run(
+                    slice_word_by_delete_with_getter, job.temp_path, job.temp_path,
+                    self.section1_keywords, self.section2_keywords,
+                    self.section1_offset, self.section2_offset, self.section1_level, self.section2_level,
+                    self.cache, job.digest, reset=lambda: self._recopy(job)
+                )
+        except Exception as e:
+            job.error = e
+        if self.journal is not None and job.error is None:
+            if job.outputs:
+                written = [temp_out for (_, temp_out, _), ok in zip(job.outputs, job.done) if ok]
+            else:
+                written = [job.temp_path] if job.success else []
+            self.journal.sliced(job.file_path, job.success, job.done, written)
+        if job.success:
+            # 预读的内容只在切片失败、需要写到unsupport文件夹时还会用到
+            job.data = None
+        return job
+
+    def _reuse(self, job):
+        """
+        查找内容和切片设置都相同、已切片过的文件（同一批内还在处理时等它完成），
+        找到时按它的结果设置本文件的切片结果，收尾时直接链接出输出文件，返回True。
+        """
+        try:
+            stored = self.dedupe.claim(job.digest, job.spec_key)
+        except Exception as e:
+            logging.error(f"查询重复内容索引失败: {e}")
+            return False
+        if stored is None:
+            job.claimed = True
+            return False
+        job.duplicate = dict(stored)
+        if job.outputs:
+            job.done = [spec['name'] in job.duplicate for spec, _, _ in job.outputs]
+        job.success = bool(job.duplicate)
+        if job.success:
+            logging.info(f"{job.file_name} 与已处理过的文件内容相同，直接使用已有的切片结果")
+        else:
+            logging.info(f"{job.file_name} 与已处理过的文件内容相同，该文件切片失败过，不再重复切片")
+        if not job.native and job.success and os.path.exists(job.temp_path):
+            # 不再需要Word处理的临时副本（留着会在恢复时被当作切片结果）
+            os.remove(job.temp_path)
+        if self.journal is not None:
+            self.journal.sliced(job.file_path, job.success, job.done)
+        return True
+
+    def _published(self, job, result):
+        """第一份内容处理完毕后登记的结果：成功时为输出文件列表，纯Python引擎未找到章节时为空列表，其余为None"""
+        if result == "success":
+            if job.outputs:
+                return [(spec['name'], final_out) for (spec, _, final_out), ok in zip(job.outputs, job.done) if ok]
+            return [(None, job.out_path)]
+        # Word处理失败可能是偶发的，只登记纯Python引擎确定性的失败
+        if result == "failed" and job.native and not job.success:
+            return []
+        return None
+
+    def _recopy(self, job):
+        """Word中途崩溃时临时副本可能已被部分改写，重试前重新复制原文件"""
+        with io_slot(), metrics.span('copy'):
+            shutil.copy2(job.file_path, job.temp_path)
+
+    def finish(self, job):
+        """收尾阶段（只做I/O）：移动原文件和切片结果，返回处理结果"""
+        if job.result is not None:
+            return job.result
+        try:
+            if job.error is not None:
+                raise job.error
+            result = self._move_results(job)
+        except Exception as e:
+            logging.error(f"处理文件时发生异常: {e}")
+            result = self._handle_error(job)
+        finally:
+            job.data = None
+            if job.claimed:
+                # 无论成败都要登记，唤醒同一批内等待这份内容的重复文件
+                self.dedupe.release(job.digest, job.spec_key, self._published(job, result))
+        if self.journal is not None:
+            self.journal.done(job.file_path, result)
+        return result
+
+    def _move_results(self, job):
+        file_path, file_name, temp_path = job.file_path, job.file_name, job.temp_path
+
+        # 确保Word进程不再占用该文件：轮询检查，文件释放后立即继续
+        if not job.native:
+            wait_until_free(temp_path, self.wait_time)
 
-    try:
-        # 复制到临时文件夹
-        shutil.copy2(file_path, temp_path)
-        
-        # 处理文件
-        logging.info(f"开始处理文件: {file_name}")
-        success = slice_word_by_delete_with_getter(
-            getter, temp_path, temp_path, section1_keywords, section2_keywords, 
-            section1_offset, section2_offset, section1_level, section2_level
-        )
-
-        # 确保Word进程不再占用该文件
-        time.sleep(wait_time)
-        
         # 无论是否成功，都将原文件移动到old_file文件夹
+        old_file_path = os.path.join(self.old_folder, file_name)
         try:
-            # 使用复制+删除替代移动
-            old_file_path = os.path.join(old_folder, file_name)
-            shutil.copy2(file_path, old_file_path)
-            os.remove(file_path)
+            with io_slot():
+                move_file(file_path, old_file_path)
             logging.info(f"原文件已移动到: {old_file_path}")
         except Exception as e:
             logging.error(f"移动原文件到old_file文件夹失败: {e}")
-        
+
         # 根据处理结果分别处理临时文件
-        if success:
-            # 等待一下确保文件不被占用
-            time.sleep(wait_time / 2)
+        if job.success and job.duplicate is not None:
             try:
-                # 使用复制后删除的方式移动到output文件夹
-                shutil.copy2(temp_path, out_path)
-                os.remove(temp_path)
-                logging.info(f"切片成功，结果已保存到: {out_path}")
+                return self._link_duplicate(job)
+            except Exception as e:
+                logging.error(f"生成重复文件的输出失败: {e}")
+                return "failed"
+        if job.success:
+            try:
+                if job.outputs:
+                    with io_slot():
+                        for (spec, temp_out, final_out), ok in zip(job.outputs, job.done):
+                            if ok:
+                                move_file(temp_out, final_out)
+                                logging.info(f"切片[{spec['name']}]成功，结果已保存到: {final_out}")
+                            else:
+                                logging.warning(f"切片[{spec['name']}]失败: {file_name}")
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                    return "success"
+                with io_slot():
+                    move_file(temp_path, job.out_path)
+                logging.info(f"切片成功，结果已保存到: {job.out_path}")
                 return "success"
             except Exception as e:
                 logging.error(f"移动文件到output文件夹失败: {e}")
                 return "failed"
         else:
             try:
-                # 等待一下确保文件不被占用
-                time.sleep(wait_time / 2)
-                
-                # 使用复制后删除的方式移动到unsupport文件夹
-                unsupport_path = os.path.join(unsupport_folder, file_name)
-                shutil.copy2(temp_path, unsupport_path)
-                os.remove(temp_path)
+                unsupport_path = os.path.join(self.unsupport_folder, file_name)
+                with io_slot():
+                    if os.path.exists(temp_path):
+                        move_file(temp_path, unsupport_path)
+                    elif job.data is not None:
+                        # 纯Python引擎没有临时副本，预读过的直接从内存写出
+                        with open(unsupport_path, 'wb') as f:
+                            f.write(job.data)
+                    else:
+                        # 纯Python引擎没有临时副本，从old_file复制一份
+                        shutil.copy2(old_file_path, unsupport_path)
                 logging.info(f"切片失败，原文件已移动到: {unsupport_path}")
             except Exception as e:
                 logging.error(f"移动文件到unsupport文件夹失败: {e}")
             return "failed"
-    except Exception as e:
-        logging.error(f"处理文件时发生异常: {e}")
+
+    def _link_duplicate(self, job):
+        """重复的文件：从保存的结果链接出输出文件"""
+        with io_slot():
+            if job.outputs:
+                for spec, _, final_out in job.outputs:
+                    stored = job.duplicate.get(spec['name'])
+                    if stored is not None:
+                        method = self.dedupe.publish(stored, final_out)
+                        logging.info(f"切片[{spec['name']}]复用已有结果（{method}）: {final_out}")
+            else:
+                method = self.dedupe.publish(job.duplicate[None], job.out_path)
+                logging.info(f"切片复用已有结果（{method}）: {job.out_path}")
+        return "duplicate"
+
+    def _handle_error(self, job):
         # 清理临时文件
-        if os.path.exists(temp_path):
+        if job.temp_path is not None and os.path.exists(job.temp_path):
             try:
-                os.remove(temp_path)
+                os.remove(job.temp_path)
             except Exception as rm_err:
                 logging.error(f"删除临时文件失败: {rm_err}")
-                
+
         # 仍然尝试将原文件移动到old_file文件夹
         try:
-            old_file_path = os.path.join(old_folder, file_name)
-            shutil.copy2(file_path, old_file_path)
-            os.remove(file_path)
+            old_file_path = os.path.join(self.old_folder, job.file_name)
+            with io_slot():
+                move_file(job.file_path, old_file_path)
             logging.info(f"原文件已移动到: {old_file_path}")
         except Exception as e:
             logging.error(f"移动原文件到old_file文件夹失败: {e}")
-            
+
         return "error"
 
-@timeit_log
-def process_folder_by_delete(config):
-    """根据配置处理文件夹"""
+    def quarantine(self, file_path, reason, detail=''):
+        """
+        隔离超出处理预算（reason为timeout、memory）或使工作进程崩溃（crash）的文件，返回"quarantined"。
+        处理它的工作进程已被结束，文件可能停在任一阶段：删除它留下的临时文件，
+        原文件（仍在输入文件夹或已移动到old_file）移动到unsupport文件夹，旁边写入 <文件名>.reason.json 记录原因。
+        """
+        job = FileJob(file_path)
+        old_path = os.path.join(self.old_folder, job.file_name)
+        unsupport_path = os.path.join(self.unsupport_folder, job.file_name)
+        source = file_path if os.path.exists(file_path) else old_path if os.path.exists(old_path) else None
+        if source is not None:
+            try:
+                self._plan(job, source)
+            except Exception as e:
+                logging.error(f"识别被隔离文件的格式失败: {e}")
+        leftovers = [old_path + '.part', unsupport_path + '.part']
+        if job.temp_path is not None:
+            leftovers += [job.temp_path, job.temp_path + '.tmp', job.out_path + '.part']
+            for _, temp_out, final_out in job.outputs:
+                leftovers += [temp_out, temp_out + '.tmp', final_out + '.part']
+        for path in leftovers:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.error(f"删除临时文件失败: {path}, {e}")
+        try:
+            if source is None:
+                logging.error(f"找不到被隔离的文件: {file_path}")
+            else:
+                with io_slot():
+                    move_file(source, unsupport_path)
+            record = {'file': job.file_name, 'reason': reason, 'detail': detail,
+                      'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            write_atomic(unsupport_path + '.reason.json',
+                         json.dumps(record, ensure_ascii=False, indent=2).encode('utf-8'))
+            logging.warning(f"{job.file_name} 已隔离到: {unsupport_path}（{reason}: {detail}）")
+        except Exception as e:
+            logging.error(f"隔离文件失败: {file_path}, {e}")
+        if self.journal is not None:
+            self.journal.done(file_path, "quarantined")
+        return "quarantined"
+
+def process_file(getter, file_path, *args, **kwargs):
+    """
+    处理单个文件（参数见FileProcessor），返回"success"、"duplicate"（复用了内容相同的文件的结果）、
+    "failed"、"error"或"unsupported"。
+    启用性能指标时把整个文件的处理记录为file阶段，附带文件名和大小。
+    """
+    if not metrics.enabled():
+        return FileProcessor(*args, **kwargs).process(getter, file_path)
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = None
+    with metrics.span('file', name=os.path.basename(file_path), size=size) as span:
+        result = FileProcessor(*args, **kwargs).process(getter, file_path)
+        span.set(result=result)
+    return result
+
+def prepare_batch(config, claims=None):
+    """
+    根据配置准备处理环境：解析路径并创建文件夹、编译章节关键词、设置日志级别和性能指标。
+    claims为协调模式的文件认领队列（见open_claim_queue），处理日志随之放在本节点的认领文件夹中。
+    返回包含input_folder、file_kwargs（process_file的参数）、workers、io_concurrency、
+    budget（单个文件的处理预算，未启用时为None）、pipeline（单进程流水线设置，未启用时为None）、
+    word（Word会话池设置）、metrics（性能指标的导出设置）的字典。
+    """
     # 从配置中获取路径
     base_dir = os.path.dirname(os.path.abspath(__file__))
     input_folder = os.path.join(base_dir, config['paths'].get('input_folder', 'input_file'))
@@ -312,9 +1073,10 @@ def process_folder_by_delete(config):
         if not os.path.exists(folder):
             os.makedirs(folder)
     
-    # 从配置中获取章节设置
-    section1_keywords = config['chapter_settings'].get('section1', ['总论'])
-    section2_keywords = config['chapter_settings'].get('section2', ['建设方案'])
+    # 从配置中获取章节设置，关键词每批只编译一次
+    matching = config.get('matching', {})
+    section1_keywords = KeywordMatcher(config['chapter_settings'].get('section1', ['总论']), **matching)
+    section2_keywords = KeywordMatcher(config['chapter_settings'].get('section2', ['建设方案']), **matching)
     section1_offset = config['chapter_settings'].get('section1_offset', 1)
     section2_offset = config['chapter_settings'].get('section2_offset', 1)
     section1_level = config['chapter_settings'].get('section1_level', 1)
@@ -323,6 +1085,27 @@ def process_folder_by_delete(config):
     # 从配置中获取处理设置
     wait_time = config['processing'].get('wait_time', 1)
     verbose = config['processing'].get('verbose', True)
+    workers = config['processing'].get('workers', 1)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    io_concurrency = config['processing'].get('io_concurrency', min(workers, 4))
+    doc_engine = config['processing'].get('doc_engine', 'auto').lower()
+    if doc_engine not in DOC_ENGINES:
+        logging.warning(f"doc_engine设置无效: {doc_engine}，改为auto")
+        doc_engine = 'auto'
+    doc_engine = resolve_doc_engine(doc_engine)
+    # 单个文件的处理预算：启用时每个文件都在独立的工作进程中处理，超出预算时结束该进程并隔离文件
+    budget = None
+    file_timeout = config['processing'].get('file_timeout', 0)
+    file_memory_mb = config['processing'].get('file_memory_mb', 0)
+    if file_timeout > 0 or file_memory_mb > 0:
+        budget = {'timeout': file_timeout, 'memory_mb': file_memory_mb}
+    pipeline = None
+    if config['processing'].get('pipeline', True):
+        pipeline = {
+            'prefetch': max(1, config['processing'].get('prefetch', 2)),
+            'prefetch_max_bytes': int(config['processing'].get('prefetch_max_mb', 64) * 1024 * 1024),
+        }
     
     # 设置日志级别
     if verbose:
@@ -330,57 +1113,150 @@ def process_folder_by_delete(config):
     else:
         logging.getLogger().setLevel(logging.WARNING)
     
-    # 获取所有文件
-    files = os.listdir(input_folder)
-    files = [f for f in files if os.path.isfile(os.path.join(input_folder, f))]
+    # 配置了[Slice:<名称>]时按命名切片输出，否则使用[ChapterSettings]
+    slices = [make_slice_spec(name, settings, matching) for name, settings in config.get('slices', {}).items()]
     
-    if not files:
-        logging.info("没有找到需要处理的文件")
-        return
+    if slices:
+        for spec in slices:
+            logging.info(f"切片[{spec['name']}]: 起始章节关键词: {spec['section1_keywords']}, "
+                         f"结束章节关键词: {spec['section2_keywords']}, "
+                         f"偏移量: {spec['section1_offset']}, {spec['section2_offset']}, "
+                         f"级别: {spec['section1_level']}, {spec['section2_level']}")
+    else:
+        logging.info(f"起始章节关键词: {section1_keywords}, 结束章节关键词: {section2_keywords}")
+        logging.info(f"章节偏移量: {section1_offset}, {section2_offset}")
+        logging.info(f"章节级别: {section1_level}, {section2_level}")
+    logging.info(f"doc文件处理方式: {'Word' if doc_engine == 'word' else '纯Python读取并转换为docx'}")
+    
+    file_kwargs = dict(
+        temp_folder=temp_folder, output_folder=output_folder,
+        unsupport_folder=unsupport_folder, old_folder=old_folder,
+        section1_keywords=section1_keywords, section2_keywords=section2_keywords,
+        section1_offset=section1_offset, section2_offset=section2_offset,
+        section1_level=section1_level, section2_level=section2_level,
+        wait_time=wait_time, cache=open_heading_cache(config, base_dir),
+        slices=slices or None, doc_engine=doc_engine, journal=open_batch_journal(config, base_dir, claims),
+        dedupe=open_output_index(config, base_dir)
+    )
+    return {
+        'input_folder': input_folder,
+        'file_kwargs': file_kwargs,
+        'workers': workers,
+        'io_concurrency': io_concurrency,
+        'budget': budget,
+        'pipeline': pipeline,
+        'word': config.get('word', {}),
+        'metrics': metrics.configure(config.get('metrics', {}), base_dir)
+    }
 
-    logging.info(f"发现 {len(files)} 个文件待处理")
-    logging.info(f"起始章节关键词: {section1_keywords}, 结束章节关键词: {section2_keywords}")
-    logging.info(f"章节偏移量: {section1_offset}, {section2_offset}")
-    logging.info(f"章节级别: {section1_level}, {section2_level}")
-    
-    # 创建Word处理器
-    getter = WordHeadGetter()
-    
-    # 处理每个文件
-    success_count = failed_count = error_count = unsupported_count = 0
-    for file_name in files:
-        file_path = os.path.join(input_folder, file_name)
-        result = process_file(
-            getter, file_path, temp_folder, output_folder, unsupport_folder, old_folder,
-            section1_keywords, section2_keywords, section1_offset, section2_offset,
-            section1_level, section2_level, wait_time
-        )
-        
-        if result == "success":
-            success_count += 1
-        elif result == "failed":
-            failed_count += 1
-        elif result == "error":
-            error_count += 1
-        elif result == "unsupported":
-            unsupported_count += 1
-    
-    # 所有文件处理完成后，关闭所有标签页
-    if getter.word is not None:
+def log_summary(counts):
+    """汇总并输出处理结果统计，counts为各结果的文件数（collections.Counter）"""
+    duplicate_count = counts["duplicate"]
+    success_count = counts["success"] + duplicate_count
+    failed_count = counts["failed"]
+    error_count = counts["error"]
+    unsupported_count = counts["unsupported"]
+    quarantined_count = counts["quarantined"]
+
+    logging.info(f"处理完成。成功: {success_count}, 失败: {failed_count}, 错误: {error_count}, 不支持: {unsupported_count}")
+    if duplicate_count:
+        logging.info(f"其中 {duplicate_count} 个文件与已处理过的文件内容相同，直接复用了切片结果")
+    if quarantined_count:
+        logging.warning(f"隔离: {quarantined_count} 个文件超出处理预算或导致工作进程崩溃，"
+                        f"已移动到unsupport文件夹（原因见同名的.reason.json）")
+
+def run_files(file_paths, batch, getter=None):
+    """
+    在当前进程中处理一组文件（流水线或顺序处理），返回 (结果列表, Word会话池)。
+    只有存在需要Word处理的文件时才创建Word会话池；传入的会话池继续使用，由调用方关闭。
+    """
+    file_kwargs = batch['file_kwargs']
+    if getter is None and any(needs_word(path, file_kwargs['doc_engine']) for path in file_paths):
+        getter = open_word_getter(batch['word'])
+    if batch['pipeline'] is not None and len(file_paths) > 1:
+        # 流水线处理：读取下一个文件、写出上一个文件与当前文件的切片同时进行
+        from pipeline import run_pipeline
+        results = run_pipeline(file_paths, file_kwargs, getter, **batch['pipeline'])
+    else:
+        # 处理每个文件
+        results = [process_file(getter, file_path, **file_kwargs) for file_path in file_paths]
+    return results, getter
+
+def process_claimed(claims, batch):
+    """
+    协调模式：与其他节点共享输入文件夹，按批认领文件并处理，返回各结果的文件数（Counter）。
+    没有可认领的文件后，等其他节点处理完才结束，期间失联节点的文件被回收时继续认领。
+    """
+    workers = batch['workers']
+    journal = batch['file_kwargs']['journal']
+    counts = Counter()
+    getter = None
+    with claims:
         try:
-            # 关闭所有打开的标签页
-            while getter.word.Windows.Count > 0:
-                getter.word.Windows(1).Close()
-                logging.info("已关闭一个Word标签页")
-            logging.info("所有Word标签页已关闭")
-        except Exception as e:
-            logging.error(f"关闭标签页失败: {e}")
+            while True:
+                if workers > 1 or batch['budget'] is not None:
+                    # 工作进程在认领期间保持运行，有空闲进程时才取下一个认领的文件
+                    from batch_executor import run_parallel
+                    run_parallel(claims.claimed_files(), batch['file_kwargs'], workers, batch['io_concurrency'],
+                                 batch['word'], batch['budget'], counts)
+                else:
+                    for file_paths in claims.batches():
+                        batch_results, getter = run_files(file_paths, batch, getter)
+                        counts.update(batch_results)
+                if not claims.wait_for_others():
+                    return counts
+        finally:
+            close_word_getter(getter)
+            if journal is not None:
+                # 日志在认领文件夹中，退出时随认领文件夹一起删除（Windows下无法删除打开的文件）
+                journal.close()
+
+def process_folder_by_delete(config):
+    """根据配置处理文件夹"""
+    started = time.perf_counter()
+    claims = open_claim_queue(config, os.path.dirname(os.path.abspath(__file__)))
+    batch = prepare_batch(config, claims)
+    input_folder = batch['input_folder']
+    file_kwargs = batch['file_kwargs']
+    workers = batch['workers']
     
-    # 关闭Word处理器
-    getter.quit()
-    logging.info("Word应用程序已退出")
+    if claims is not None:
+        logging.info(f"工作进程数: {workers}")
+        counts = process_claimed(claims, batch)
+        if not counts:
+            logging.info("没有找到需要处理的文件")
+            return
+    else:
+        # 获取所有文件
+        files = os.listdir(input_folder)
+        files = [f for f in files if os.path.isfile(os.path.join(input_folder, f))]
+        
+        if not files:
+            logging.info("没有找到需要处理的文件")
+            return
+
+        logging.info(f"发现 {len(files)} 个文件待处理")
+        logging.info(f"工作进程数: {workers}")
+        
+        file_paths = [os.path.join(input_folder, f) for f in files]
+        if (workers > 1 and len(file_paths) > 1) or batch['budget'] is not None:
+            # 多进程并行处理，每个工作进程持有自己的引擎；启用处理预算时单进程也在独立的工作进程中处理
+            from batch_executor import run_parallel
+            counts = run_parallel(file_paths, file_kwargs, workers, batch['io_concurrency'], batch['word'],
+                                  batch['budget'])
+        else:
+            if batch['pipeline'] is not None and len(file_paths) > 1:
+                logging.info(f"流水线处理，预读文件数: {batch['pipeline']['prefetch']}")
+            results, getter = run_files(file_paths, batch)
+            close_word_getter(getter)
+            counts = Counter(results)
     
-    logging.info(f"处理完成。成功: {success_count}, 失败: {failed_count}, 错误: {error_count}, 不支持: {unsupported_count}")
+    log_summary(counts)
+    if file_kwargs['journal'] is not None:
+        # 整批处理完毕，日志中已没有未完成的文件
+        file_kwargs['journal'].compact()
+    logging.info(f"总耗时: {time.perf_counter() - started:.2f} 秒")
+    metrics.report(batch['metrics'])
 
 if __name__ == "__main__":
     # 从配置文件读取参数
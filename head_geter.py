@@ -1,9 +1,10 @@
-import win32com.client as win32
-import logging
-import time
-import pythoncom
-from functools import wraps
-from tqdm import tqdm  # 添加进度条库
+# win32com和tqdm在第一次启动Word、读取段落时才导入，只做纯Python处理的运行不需要加载它们
+import metrics
+from docx_head_geter import build_titles_tree
+from keyword_matcher import as_matcher
+
+# 进度条每读取多少段更新一次，避免逐段刷新的开销
+PROGRESS_STEP = 256
 
 # 彩色日志装饰器
 COLORS = {
@@ -21,45 +22,51 @@ COLORS = {
 def color_log(msg, color='OKGREEN'):
     print(f"{COLORS.get(color, COLORS['OKGREEN'])}{msg}{COLORS['ENDC']}")
 
-def timeit_log(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        color_log(f"开始执行: {func.__name__}", 'OKBLUE')
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        color_log(f"结束执行: {func.__name__}，耗时: {end_time - start_time:.2f} 秒", 'OKCYAN')
-        return result
-    return wrapper
-
 class WordHeadGetter:
 
-    @timeit_log
-    def __init__(self):
-        self.word = win32.gencache.EnsureDispatch('Word.Application')
+    @metrics.timed('word_start')
+    def __init__(self, new_instance=False):
+        import win32com.client as win32
+
+        if new_instance:
+            # DispatchEx总是启动新的WINWORD进程，会话池中的各实例互不影响
+            self.word = win32.gencache.EnsureDispatch(win32.DispatchEx('Word.Application'))
+        else:
+            self.word = win32.gencache.EnsureDispatch('Word.Application')
         self.word.Visible = 0
 
-    @timeit_log
+    @metrics.timed('open')
+    def open_document(self, file_path):
+        """打开文档但不读取标题（标题已从缓存中获得时使用）"""
+        # 设置打开文档的选项，提高速度
+        return self.word.Documents.Open(
+            file_path, 
+            ReadOnly=True,  # 只读模式
+            Visible=False,  # 不可见
+            AddToRecentFiles=False  # 不添加到最近文件
+        )
+
     def get_document_titles_tree(self, file_path):
         doc = None
         try:
+            from tqdm import tqdm  # 进度条
+
+            doc = self.open_document(file_path)
+            with metrics.span('extract', engine='word') as span:
+                titles = []
+                para_count = doc.Paragraphs.Count
 
-            # 设置打开文档的选项，提高速度
-            doc = self.word.Documents.Open(
-                file_path, 
-                ReadOnly=True,  # 只读模式
-                Visible=False,  # 不可见
-                AddToRecentFiles=False  # 不添加到最近文件
-            )
-            titles = []
-            para_count = doc.Paragraphs.Count
-
-            # 一次性提取所有段落的内容和属性，减少COM调用
-            paragraphs = [(para.Range.Text.strip(), para.Style.NameLocal, para.Range.Start, para.OutlineLevel)
-                          for para in doc.Paragraphs]
-
-            # 遍历提取的段落信息，收集标题
-            with tqdm(total=para_count, desc="处理段落", unit="段") as pbar:
+                # 一次性提取所有段落的内容和属性（耗时主要在COM调用上），进度条按批更新
+                paragraphs = []
+                with tqdm(total=para_count, desc="读取段落", unit="段", mininterval=0.5) as pbar:
+                    for para in doc.Paragraphs:
+                        paragraphs.append((para.Range.Text.strip(), para.Style.NameLocal,
+                                           para.Range.Start, para.OutlineLevel))
+                        if len(paragraphs) % PROGRESS_STEP == 0:
+                            pbar.update(PROGRESS_STEP)
+                    pbar.update(len(paragraphs) - pbar.n)
+
+                # 遍历提取的段落信息，收集标题
                 for para_text, style_name, start_offset, outline_level in paragraphs:
                     if style_name.startswith("标题") or style_name.startswith("Heading"):
                         titles.append({
@@ -68,20 +75,10 @@ class WordHeadGetter:
                             "级别": outline_level,
                             "children": []
                         })
-                    pbar.update(1)
+                span.set(paragraphs=para_count, titles=len(titles))
 
-            # 根据标题的等级和偏移值构建树状结构
-            root = []
-            for title in titles:
-                if title["级别"] == 1:
-                    root.append(title)
-                else:
-                    # 找到最近的上级标题
-                    parent = root[-1]  # 从最后一个一级标题开始
-                    while parent["children"] and parent["children"][-1]["级别"] < title["级别"]:
-                        parent = parent["children"][-1]
-                    parent["children"].append(title)
-            return root, doc
+            # 根据标题的等级和偏移值构建树状结构（第一个标题不是1级时作为顶层标题，不再因找不到上级而出错）
+            return build_titles_tree(titles), doc
         except Exception as e:
             color_log(f"发生错误: {e}", 'FAIL')
             if doc is not None:
@@ -91,7 +88,7 @@ class WordHeadGetter:
                     pass
             return None, None
 
-    @timeit_log
+    @metrics.timed('word_quit')
     def quit(self):
         if self.word is not None:
             try:
@@ -100,44 +97,54 @@ class WordHeadGetter:
                 pass
             self.word = None
 
-@timeit_log
+@metrics.timed('match')
 def find_section_offsets(tree, section1, section2):
     """
     只在1级标题中查找section1和section2的下一个1级标题的偏移量。
     返回(start, end)
     """
     start = end = None
-    found_section1 = found_section2 = False
     offsets = []
     # 只收集所有1级标题的偏移量和标题
     for node in tree:
         if node.get("级别", 1) == 1:
             offsets.append((node["标题"], node["偏移量"]))
-    # 遍历，找到section1和section2的下一个1级标题
-    for idx, (title, offset) in enumerate(offsets):
-        if not found_section1 and section1 in title:
-            if idx + 1 < len(offsets):
-                start = offsets[idx + 1][1]
-            found_section1 = True
-        if not found_section2 and section2 in title:
-            if idx + 1 < len(offsets):
-                end = offsets[idx + 1][1]
-            found_section2 = True
+    titles = [title for title, _ in offsets]
+    # 找到section1和section2的下一个1级标题
+    match1 = as_matcher(section1).first_match(titles)
+    match2 = as_matcher(section2).first_match(titles)
+    if match1 is not None and match1.title_index + 1 < len(offsets):
+        start = offsets[match1.title_index + 1][1]
+    if match2 is not None and match2.title_index + 1 < len(offsets):
+        end = offsets[match2.title_index + 1][1]
     return start, end
 
 if __name__ == "__main__":
-    # 示例用法
+    # 用法: python head_geter.py 文档路径 [章节1 章节2]
+    # 通过Word读取一个文档的标题树并以JSON输出，指定章节时同时输出找到的偏移量。
+    # 批量导出大纲（不需要Word）见outline_export.py
+    import json
+    import os
+    import sys
+
+    if len(sys.argv) not in (2, 4):
+        print("用法: python head_geter.py 文档路径 [章节1 章节2]")
+        sys.exit(2)
+    # Word只接受绝对路径
+    input_path = os.path.abspath(sys.argv[1])
+
     getter = WordHeadGetter()
-    input_path = "D:\WORK\Word-Geter\\2.doc"
-    section1 = "研究背景"
-    section2 = "实验设计"
-
-    titles, doc = getter.get_document_titles_tree(input_path)
-    if titles is None:
-        color_log(f"无法解析文档结构: {input_path}", 'FAIL')
-    else:
-        start, end = find_section_offsets(titles, section1, section2)
-        color_log(f"找到的偏移量: {start}, {end}", 'OKGREEN')
+    status = 0
+    try:
+        titles, doc = getter.get_document_titles_tree(input_path)
+        if titles is None:
+            color_log(f"无法解析文档结构: {input_path}", 'FAIL')
+            status = 1
+        else:
+            print(json.dumps(titles, ensure_ascii=False, indent=2))
+            if len(sys.argv) == 4:
+                start, end = find_section_offsets(titles, sys.argv[2], sys.argv[3])
+                color_log(f"找到的偏移量: {start}, {end}", 'OKGREEN')
         if doc is not None:
             try:
                 if doc.Windows.Count > 0:  # 检查是否有打开的标签页
@@ -146,4 +153,6 @@ if __name__ == "__main__":
                     color_log("没有打开的标签页可关闭。", 'WARNING')
             except Exception as e:
                 color_log(f"关闭标签页时发生异常: {e}", 'FAIL')
-    getter.quit()
\ No newline at end of file
+    finally:
+        getter.quit()
+    sys.exit(status)
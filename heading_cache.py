@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# 标题提取逻辑变化时递增，旧版本的缓存条目会在打开缓存时被清除
+CACHE_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (digest, engine)
+)
+'''
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def data_digest(data):
+    """计算已读入内存的文件内容的SHA-256（与file_digest对同一文件的结果相同）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class HeadingCache:
+    """
+    基于SQLite单文件的标题索引缓存，以文件内容哈希为键。
+    按最近使用时间淘汰，总大小超过max_bytes时删除最久未使用的条目。
+    连接在首次使用时建立，对象可以直接传给工作进程；同一进程中的多个线程（如HTTP服务）共享一个连接。
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['max_bytes'])
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            conn.execute('DELETE FROM entries WHERE version != ?', (CACHE_VERSION,))
+            self._conn = conn
+        return self._conn
+
+    def get(self, digest, engine):
+        """读取缓存的索引记录，未命中返回None"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT payload FROM entries WHERE digest = ? AND engine = ? AND version = ?',
+                    (digest, engine, CACHE_VERSION)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE entries SET last_used = ? WHERE digest = ? AND engine = ?',
+                             (time.time(), digest, engine))
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, ValueError, zlib.error) as e:
+            logging.error(f"读取标题索引缓存失败: {e}")
+            return None
+
+    def put(self, digest, engine, record):
+        """写入索引记录，并在超出容量时按LRU淘汰"""
+        payload = zlib.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries (digest, engine, version, size, last_used, payload) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (digest, engine, CACHE_VERSION, len(payload), time.time(), payload)
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logging.error(f"写入标题索引缓存失败: {e}")
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for digest, engine, size in conn.execute(
+                'SELECT digest, engine, size FROM entries ORDER BY last_used'):
+            victims.append((digest, engine))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM entries WHERE digest = ? AND engine = ?', victims)
+        logging.info(f"标题索引缓存已淘汰 {len(victims)} 个条目")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
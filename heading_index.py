@@ -0,0 +1,179 @@
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# 序列化格式的版本号和头部：版本、标题数
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<HI')
+
+
+class HeadingIndex:
+    """
+    紧凑的标题索引。标题按文档顺序存放在平行数组中：
+    offsets（字符偏移量）、levels（级别）、parents（上级标题的下标，无上级为-1），标题文本单独存放在列表中。
+    按级别的下标数组在首次查询时建立并缓存，之后的查询都是二分查找，不再重建列表。
+    """
+
+    __slots__ = ('titles', 'offsets', 'levels', 'parents', '_by_level', '_up_to_level', '_titles_by_level')
+
+    def __init__(self, titles, offsets, levels, parents=None):
+        self.titles = titles
+        self.offsets = offsets
+        self.levels = levels
+        self.parents = parents if parents is not None else self._build_parents(levels)
+        self._by_level = {}
+        self._up_to_level = {}
+        self._titles_by_level = {}
+
+    @staticmethod
+    def _build_parents(levels):
+        """每个标题的上级为它之前最近的一个级别更小的标题"""
+        parents = array('i', [-1]) * len(levels)
+        stack = []
+        for i, level in enumerate(levels):
+            while stack and levels[stack[-1]] >= level:
+                stack.pop()
+            if stack:
+                parents[i] = stack[-1]
+            stack.append(i)
+        return parents
+
+    @classmethod
+    def from_flat(cls, flat_titles):
+        """由 [(标题, 偏移量, 级别), ...] 建立索引"""
+        titles = []
+        offsets = array('q')
+        levels = array('b')
+        for title, offset, level in flat_titles:
+            titles.append(title)
+            offsets.append(offset)
+            levels.append(level)
+        return cls(titles, offsets, levels)
+
+    @classmethod
+    def from_tree(cls, tree):
+        """由标题树（get_document_titles_tree的返回值）建立索引"""
+        titles = []
+        offsets = array('q')
+        levels = array('b')
+        stack = list(reversed(tree))
+        while stack:
+            node = stack.pop()
+            titles.append(node["标题"])
+            offsets.append(node["偏移量"])
+            levels.append(node["级别"])
+            stack.extend(reversed(node["children"]))
+        return cls(titles, offsets, levels)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, i):
+        return self.titles[i], self.offsets[i], self.levels[i]
+
+    def to_flat(self):
+        """导出为 [(标题, 偏移量, 级别), ...]"""
+        return list(zip(self.titles, self.offsets, self.levels))
+
+    def to_tree(self):
+        """还原为与get_document_titles_tree相同结构的标题树"""
+        nodes = [{"标题": title, "偏移量": offset, "级别": level, "children": []}
+                 for title, offset, level in zip(self.titles, self.offsets, self.levels)]
+        root = []
+        for node, parent in zip(nodes, self.parents):
+            if parent < 0:
+                root.append(node)
+            else:
+                nodes[parent]["children"].append(node)
+        return root
+
+    def level_indices(self, level):
+        """级别恰好为level的所有标题下标（按文档顺序）"""
+        indices = self._by_level.get(level)
+        if indices is None:
+            indices = array('i', (i for i, lvl in enumerate(self.levels) if lvl == level))
+            self._by_level[level] = indices
+        return indices
+
+    def titles_at_level(self, level):
+        """级别恰好为level的所有标题文本"""
+        titles = self._titles_by_level.get(level)
+        if titles is None:
+            titles = [self.titles[i] for i in self.level_indices(level)]
+            self._titles_by_level[level] = titles
+        return titles
+
+    def _indices_up_to(self, max_level):
+        indices = self._up_to_level.get(max_level)
+        if indices is None:
+            indices = array('i', (i for i, lvl in enumerate(self.levels) if lvl <= max_level))
+            self._up_to_level[max_level] = indices
+        return indices
+
+    def next_heading(self, offset, max_level):
+        """偏移量offset之后（不含）第一个级别不超过max_level的标题下标，没有时返回None"""
+        indices = self._indices_up_to(max_level)
+        # 标题偏移量按文档顺序递增，先定位offset之后的第一个标题，再在按级别筛选的下标中二分
+        first = bisect_right(self.offsets, offset)
+        pos = bisect_left(indices, first)
+        return indices[pos] if pos < len(indices) else None
+
+    def step(self, index, count, max_level):
+        """
+        从下标index的标题开始，在级别不超过max_level的标题中向后数count个，返回目标下标。
+        正好越过最后一个标题时返回len(self)，超出更多时返回None。
+        """
+        indices = self._indices_up_to(max_level)
+        pos = bisect_left(indices, index) + count
+        if pos < len(indices):
+            return indices[pos]
+        return len(self) if pos == len(indices) else None
+
+    def section_end(self, index, content_end):
+        """下标index的标题所在章节的结束偏移量：下一个级别不超过它的标题，或文档末尾"""
+        target = self.step(index, 1, self.levels[index])
+        return content_end if target is None or target == len(self) else self.offsets[target]
+
+    def to_bytes(self):
+        """序列化为紧凑的二进制格式"""
+        encoded = [title.encode('utf-8') for title in self.titles]
+        lengths = array('i', (len(data) for data in encoded))
+        return b''.join([
+            _HEADER.pack(_FORMAT_VERSION, len(self)),
+            lengths.tobytes(), array('q', self.offsets).tobytes(),
+            array('b', self.levels).tobytes(), array('i', self.parents).tobytes(),
+        ] + encoded)
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, count = _HEADER.unpack_from(data)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f'不支持的标题索引格式版本: {version}')
+        pos = _HEADER.size
+
+        def take(typecode):
+            nonlocal pos
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(data[pos:pos + size])
+            pos += size
+            return values
+
+        lengths = take('i')
+        offsets = take('q')
+        levels = take('b')
+        parents = take('i')
+        titles = []
+        for length in lengths:
+            titles.append(data[pos:pos + length].decode('utf-8'))
+            pos += length
+        return cls(titles, offsets, levels, parents)
+
+
+def as_heading_index(titles):
+    """标题树或 [(标题, 偏移量, 级别), ...] 转为HeadingIndex，已是索引时原样返回"""
+    if isinstance(titles, HeadingIndex):
+        return titles
+    if titles and isinstance(titles[0], dict):
+        return HeadingIndex.from_tree(titles)
+    return HeadingIndex.from_flat(titles or [])
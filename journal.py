@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from file_ops import move_file
+
+# 每个文件的状态转换：begin（已确定各路径，开始处理）→ sliced（切片结果已写入临时文件夹）→ done（已归档）
+BEGIN = 'begin'
+SLICED = 'sliced'
+DONE = 'done'
+
+
+def fsync_file(path):
+    """把文件内容刷到磁盘"""
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.error(f"删除临时文件失败: {path}, {e}")
+
+
+class BatchJournal:
+    """
+    只追加的处理日志（预写日志），每行一条JSON记录，记录每个文件的状态转换。
+    每条记录写入后立即fsync；切片结果先fsync再记录sliced，因此崩溃后日志中的状态一定不超前于磁盘上的文件。
+    启动时recover()按日志整理各文件夹：未完成切片的文件回滚（删除临时文件，原文件留在或退回input文件夹重新处理），
+    已完成切片的文件前滚（完成剩余的移动），已完成的文件不再处理。
+    多个线程和工作进程可以同时写入（O_APPEND，每条记录一次write），对象可以直接传给工作进程。
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = os.path.abspath(path)
+        self.fsync = fsync
+        self._fd = None
+        self._lock = threading.Lock()
+        # 上次清空以来本进程写入的记录数
+        self.written = 0
+
+    def __getstate__(self):
+        return {'path': self.path, 'fsync': self.fsync}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['fsync'])
+
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            if self._fd is None:
+                folder = os.path.dirname(self.path)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder, exist_ok=True)
+                flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+                self._fd = os.open(self.path, flags, 0o644)
+            os.write(self._fd, line)
+            if self.fsync:
+                os.fsync(self._fd)
+            self.written += 1
+
+    def _record(self, file_path, state, **fields):
+        try:
+            self._append(dict(file=file_path, state=state, time=time.time(), **fields))
+        except OSError as e:
+            logging.error(f"写入处理日志失败: {e}")
+
+    def begin(self, file_path, old, unsupport, temp, output, outputs=()):
+        """
+        记录开始处理一个文件，以及之后移动时用到的全部路径：
+        old/unsupport为原文件的归档位置，temp为临时文件，output为切片结果的最终位置，
+        outputs为命名切片的 [(名称, 临时输出路径, 最终输出路径), ...]
+        """
+        self._record(file_path, BEGIN, old=old, unsupport=unsupport, temp=temp, output=output,
+                     outputs=[list(item) for item in outputs])
+
+    def sliced(self, file_path, success, done=None, paths=()):
+        """记录切片完成：paths为已写入临时文件夹的切片结果，先刷到磁盘再记录"""
+        if self.fsync:
+            for path in paths:
+                try:
+                    fsync_file(path)
+                except OSError as e:
+                    logging.error(f"刷新切片结果到磁盘失败: {path}, {e}")
+        self._record(file_path, SLICED, success=success, done=done)
+
+    def done(self, file_path, result):
+        """记录文件已处理完毕（结果已移动到output/unsupport，原文件已移动到old）"""
+        self._record(file_path, DONE, result=result)
+
+    def load(self):
+        """读取日志，返回每个文件最新状态的记录（begin记录的路径合并到后续状态中）"""
+        entries = {}
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的最后一行
+                        continue
+                    file_path = record.get('file')
+                    if record.get('state') == BEGIN or file_path not in entries:
+                        entries[file_path] = record
+                    else:
+                        entries[file_path].update(record)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def recover(self):
+        """
+        按日志整理各文件夹，返回 (回滚的文件数, 前滚的文件数)。
+        只能在没有其他进程正在处理同一批文件时调用（程序启动时）。
+        """
+        rolled_back = rolled_forward = 0
+        for file_path, entry in self.load().items():
+            state = entry.get('state')
+            if state == DONE:
+                continue
+            try:
+                if state == SLICED and self._outputs_ready(entry):
+                    self._roll_forward(entry)
+                    rolled_forward += 1
+                else:
+                    self._roll_back(entry)
+                    rolled_back += 1
+            except Exception as e:
+                logging.error(f"恢复中断的处理失败: {file_path}, {e}")
+        if rolled_back or rolled_forward:
+            logging.info(f"已恢复上次中断的处理：回滚 {rolled_back} 个文件（将重新处理），前滚 {rolled_forward} 个文件")
+        return rolled_back, rolled_forward
+
+    @staticmethod
+    def _targets(entry):
+        """切片成功的 (临时输出路径, 最终输出路径)"""
+        if entry.get('outputs'):
+            return [(temp, final) for (_, temp, final), ok in zip(entry['outputs'], entry.get('done') or [])
+                    if ok]
+        return [(entry['temp'], entry['output'])]
+
+    def _outputs_ready(self, entry):
+        """切片成功的结果都还在临时文件夹或已移动到最终位置（否则只能重新处理）"""
+        if not entry.get('success'):
+            return True
+        return all(os.path.exists(temp) or os.path.exists(final) for temp, final in self._targets(entry))
+
+    def _leftovers(self, entry):
+        """处理过程中可能留下的临时文件：切片的.tmp和跨文件系统移动的.part"""
+        paths = [entry['temp'], entry['temp'] + '.tmp', entry['output'] + '.part',
+                 entry['old'] + '.part', entry['unsupport'] + '.part']
+        for _, temp, final in entry.get('outputs') or []:
+            paths.extend([temp, temp + '.tmp', final + '.part'])
+        return paths
+
+    def _roll_back(self, entry):
+        file_path, old = entry['file'], entry['old']
+        for path in self._leftovers(entry):
+            _remove(path)
+        # 原文件已被移动到old_file时退回input文件夹重新处理
+        if not os.path.exists(file_path) and os.path.exists(old):
+            move_file(old, file_path)
+        logging.info(f"回滚未完成的处理: {file_path}")
+        self.done(file_path, 'rolled_back')
+
+    def _roll_forward(self, entry):
+        file_path, old = entry['file'], entry['old']
+        # 每一步只在源文件仍存在时执行，重复恢复也不会出错
+        if os.path.exists(file_path):
+            move_file(file_path, old)
+        if entry.get('success'):
+            for temp, final in self._targets(entry):
+                if os.path.exists(temp):
+                    move_file(temp, final)
+            result = 'success'
+        else:
+            unsupport = entry['unsupport']
+            if os.path.exists(entry['temp']):
+                move_file(entry['temp'], unsupport)
+            elif not os.path.exists(unsupport) and os.path.exists(old):
+                shutil.copy2(old, unsupport)
+            result = 'failed'
+        for path in self._leftovers(entry):
+            _remove(path)
+        logging.info(f"前滚已完成切片的处理: {file_path}")
+        self.done(file_path, result)
+
+    def compact(self):
+        """所有文件都已处理完毕时清空日志（程序启动恢复后、整批处理结束后、守护进程空闲时调用）"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            try:
+                if os.path.exists(self.path):
+                    os.truncate(self.path, 0)
+                self.written = 0
+            except OSError as e:
+                logging.error(f"清空处理日志失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
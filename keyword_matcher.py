@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from collections import deque
+
+# 标题开头的章节编号，如"第一章"、"第3节"、"一、"、"（二）"、"1."、"1 "、"1.2.3"、"IV."。
+# 单独的数字后面必须跟着分隔符才算编号，"2024年总结"、"5G建设方案"中的数字是标题的一部分；
+# 只隔一个空白时限于1~2位数字，且后面不是小写字母（单位）或年月日等量词，"10 kV配电工程"、"2024 年度总结"不受影响
+_NUMBERING_RE = re.compile(
+    r'^\s*(?:'
+    r'第\s*[一二三四五六七八九十百千零〇两\d]+\s*[章节篇部分条款编卷]'
+    r'|[(（]\s*[一二三四五六七八九十\d]+\s*[)）]'
+    r'|[一二三四五六七八九十百千]+\s*[、.．]'
+    r'|\d+(?:\s*[.．]\s*\d+)+(?:\s*[、.．])?'
+    r'|\d+\s*[、.．]'
+    r'|\d{1,2}\s+(?![\sa-z年月日号个万%％])'
+    r'|[IVXivx]+\s*[、.．]'
+    r')\s*'
+)
+
+
+class KeywordMatch:
+    """一次匹配结果：命中的标题下标、关键词及其优先级（在关键词列表中的位置，越小越优先）"""
+
+    __slots__ = ('title_index', 'keyword', 'priority')
+
+    def __init__(self, title_index, keyword, priority):
+        self.title_index = title_index
+        self.keyword = keyword
+        self.priority = priority
+
+    def __repr__(self):
+        return f"KeywordMatch({self.title_index}, {self.keyword!r}, {self.priority})"
+
+
+class KeywordMatcher:
+    """
+    章节关键词匹配器。对全部关键词构建一个Aho-Corasick自动机，
+    每个标题只需线性扫描一遍即可得到所有命中的关键词。
+    匹配前对标题和关键词做相同的归一化：全角转半角、去除空白、去除章节编号前缀、忽略大小写。
+    每批处理构建一次，可传给工作进程。
+    """
+
+    def __init__(self, keywords, fold_width=True, strip_whitespace=True, strip_numbering=True,
+                 ignore_case=True):
+        self.keywords = [keyword.strip() for keyword in keywords]
+        self.fold_width = fold_width
+        self.strip_whitespace = strip_whitespace
+        self.strip_numbering = strip_numbering
+        self.ignore_case = ignore_case
+
+        # goto: 每个状态的转移表；fail: 失配指针；output: 到达该状态时命中的关键词下标
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        # 关键词本身就是章节编号（如"第一章"）时，标题还需要按保留编号的形式再匹配一次
+        self._match_numbering = False
+        for priority, keyword in enumerate(self.keywords):
+            normalized = self.normalize(keyword)
+            if not normalized:
+                continue
+            if self.strip_numbering and not _NUMBERING_RE.sub('', keyword, count=1).strip():
+                self._match_numbering = True
+            state = 0
+            for char in normalized:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = nxt
+            self._output[state] += (priority,)
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] += self._output[self._fail[nxt]]
+
+    def __repr__(self):
+        return repr(self.keywords)
+
+    def normalize(self, text, strip_numbering=None):
+        """按配置对文本做归一化"""
+        if strip_numbering is None:
+            strip_numbering = self.strip_numbering
+        if self.fold_width:
+            text = unicodedata.normalize('NFKC', text)
+        if strip_numbering:
+            stripped = _NUMBERING_RE.sub('', text, count=1)
+            # 关键词本身就是编号（如"第一章"）时保留原文
+            if stripped.strip():
+                text = stripped
+        if self.strip_whitespace:
+            text = ''.join(text.split())
+        if self.ignore_case:
+            text = text.lower()
+        return text
+
+    def _scan(self, text, hits):
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                hits.update(output[state])
+
+    def search(self, title):
+        """返回标题中命中的关键词优先级集合"""
+        hits = set()
+        self._scan(self.normalize(title), hits)
+        if self._match_numbering:
+            self._scan(self.normalize(title, strip_numbering=False), hits)
+        return hits
+
+    def find_all(self, titles):
+        """一次遍历所有标题，按顺序产出每个命中的KeywordMatch"""
+        for index, title in enumerate(titles):
+            for priority in sorted(self.search(title)):
+                yield KeywordMatch(index, self.keywords[priority], priority)
+
+    def first_match(self, titles):
+        """
+        按关键词优先级查找：优先级最高的关键词中最先出现的标题。
+        与逐个关键词遍历标题的结果一致，但标题只扫描一遍。未命中返回None。
+        """
+        best = None
+        for match in self.find_all(titles):
+            if best is None or match.priority < best.priority:
+                best = match
+                if best.priority == 0:
+                    break
+        return best
+
+
+def as_matcher(keywords):
+    """关键词列表按默认归一化选项构建匹配器，已是匹配器时原样返回"""
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    return KeywordMatcher(keywords)
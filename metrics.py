@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+# 处理流程中的阶段名称（汇总时按此顺序输出，其余阶段排在后面）
+STAGES = ('file', 'read', 'hash', 'copy', 'open', 'extract', 'match', 'cut', 'save', 'move', 'link')
+
+# 每个阶段保留的耗时样本数，p50/p95按样本估算
+RESERVOIR_SIZE = 1024
+# 按JSON Lines导出时，逐条记录积累到这么多条后追加写入导出文件
+FLUSH_RECORDS = 1000
+
+# 当前的记录器，未启用时为None，此时所有埋点都是空操作
+_recorder = None
+
+
+class _NullSpan:
+    """未启用时使用的空埋点"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """一次阶段耗时记录，可在阶段内部通过set()补充属性（如段落数）"""
+
+    __slots__ = ('recorder', 'stage', 'attrs', 'start', 'duration')
+
+    def __init__(self, recorder, stage, attrs):
+        self.recorder = recorder
+        self.stage = stage
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.recorder.add(self.stage, self.duration, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def _percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class StageStats:
+    """
+    一个阶段的汇总：次数、总耗时、最大耗时，以及最多RESERVOIR_SIZE个耗时样本（蓄水池抽样，用于估算p50/p95）。
+    占用的内存与记录数无关
+    """
+
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(duration)
+        else:
+            index = random.randrange(self.count)
+            if index < RESERVOIR_SIZE:
+                self.samples[index] = duration
+
+    def merge(self, other):
+        """
+        合并另一份汇总（如工作进程发回的）。样本超出RESERVOIR_SIZE时按两边的记录数比例从各自的样本中选取，
+        小数部分随机进位（合并单条记录时与逐条add相同）
+        """
+        if not other.count:
+            return
+        count = self.count + other.count
+        if len(self.samples) + len(other.samples) <= RESERVOIR_SIZE:
+            self.samples.extend(other.samples)
+        else:
+            expected = RESERVOIR_SIZE * other.count / count
+            take = min(len(other.samples), int(expected) + (random.random() < expected % 1))
+            chosen = random.sample(other.samples, take)
+            # 随机丢弃本方的部分样本，为选中的样本腾出位置
+            drop = max(0, len(self.samples) + take - RESERVOIR_SIZE)
+            for index, duration in zip(random.sample(range(len(self.samples)), drop), chosen):
+                self.samples[index] = duration
+            self.samples.extend(chosen[drop:])
+        self.count = count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': _percentile(ordered, 50),
+            'p95': _percentile(ordered, 95),
+            'max': self.max,
+        }
+
+
+class Recorder:
+    """
+    按阶段汇总耗时（见StageStats），长期运行的守护进程和HTTP服务中内存占用不随处理的文件数增长。
+    keep_records为True时另外保留逐条记录 (阶段, 耗时秒数, 结束时间戳, 进程号, 属性) 供按JSON Lines导出：
+    设置了jsonl_path时每积累FLUSH_RECORDS条追加写入该文件，其余情况下由drain()取走。
+    并行模式下工作进程通过drain()取出自己的汇总和记录，由主进程merge()合并。
+    """
+
+    def __init__(self, keep_records=False, jsonl_path=None):
+        self.keep_records = keep_records or jsonl_path is not None
+        self.jsonl_path = jsonl_path
+        self.stages = {}
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, duration, attrs):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(duration)
+            if self.keep_records:
+                self.records.append((stage, duration, time.time(), os.getpid(), attrs))
+        self._flush_if_full()
+
+    def drain(self):
+        """取出并清空本进程的汇总和逐条记录，返回 (汇总, 记录)"""
+        with self._lock:
+            stages, self.stages = self.stages, {}
+            records, self.records = self.records, []
+        return stages, records
+
+    def merge(self, drained):
+        stages, records = drained
+        with self._lock:
+            for stage, other in stages.items():
+                stats = self.stages.get(stage)
+                if stats is None:
+                    stats = self.stages[stage] = StageStats()
+                stats.merge(other)
+            if self.keep_records:
+                self.records.extend(records)
+        self._flush_if_full()
+
+    def summary(self):
+        """按阶段汇总：{阶段: {count, total, p50, p95, max}}，p50/p95由样本估算"""
+        with self._lock:
+            stages = {stage: stats.summary() for stage, stats in self.stages.items()}
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        return {stage: stages[stage] for stage in sorted(stages, key=lambda s: (order.get(s, len(order)), s))}
+
+    def _flush_if_full(self):
+        if self.jsonl_path is not None and len(self.records) >= FLUSH_RECORDS:
+            try:
+                self.write_jsonl(self.jsonl_path)
+            except OSError as e:
+                logging.error(f"导出性能指标失败: {e}")
+
+    def write_jsonl(self, path):
+        """以JSON Lines格式追加写出尚未写出的逐条记录"""
+        with self._lock:
+            records, self.records = self.records, []
+        if not records:
+            return
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for stage, duration, end_time, pid, attrs in records:
+                line = {'stage': stage, 'duration': round(duration, 6), 'time': round(end_time, 3), 'pid': pid}
+                line.update(attrs)
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+    def prometheus_lines(self):
+        """Prometheus文本格式的各阶段汇总"""
+        lines = [
+            '# HELP word_geter_stage_seconds Time spent in each processing stage.',
+            '# TYPE word_geter_stage_seconds summary',
+        ]
+        maxima = []
+        for stage, stats in self.summary().items():
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95')):
+                lines.append(f'word_geter_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f'word_geter_stage_seconds_sum{{stage="{stage}"}} {stats["total"]:.6f}')
+            lines.append(f'word_geter_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+            maxima.append(f'word_geter_stage_seconds_max{{stage="{stage}"}} {stats["max"]:.6f}')
+        lines.append('# HELP word_geter_stage_seconds_max Longest single span of each processing stage.')
+        lines.append('# TYPE word_geter_stage_seconds_max gauge')
+        lines.extend(maxima)
+        return lines
+
+    def write_prometheus(self, path):
+        """以Prometheus文本格式写出各阶段的汇总（可供node_exporter的textfile收集器读取）"""
+        lines = self.prometheus_lines()
+        # 先写临时文件再替换，避免收集器读到写了一半的文件
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+
+
+def enable(keep_records=False, jsonl_path=None):
+    """启用埋点，返回当前的记录器（参数见Recorder，已启用时沿用原有的记录器）"""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(keep_records, jsonl_path)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def enabled():
+    return _recorder is not None
+
+
+def worker_settings():
+    """工作进程中记录器的参数（传给enable），未启用时为None"""
+    if _recorder is None:
+        return None
+    return {'keep_records': _recorder.keep_records}
+
+
+def span(stage, **attrs):
+    """
+    记录一个阶段的耗时：with span('extract', size=...) as s: ...; s.set(paragraphs=n)
+    未启用时返回共享的空埋点，几乎没有开销。
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+    return Span(_recorder, stage, attrs)
+
+
+def record(stage, duration, **attrs):
+    """直接记录一个已知耗时的阶段（开始和结束不在同一个线程、无法用span包住时使用）"""
+    if _recorder is not None:
+        _recorder.add(stage, duration, attrs)
+
+
+def timed(stage):
+    """把整个函数调用记录为一个阶段的装饰器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with Span(_recorder, stage, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def prometheus_lines():
+    """当前各阶段汇总的Prometheus文本行，未启用时为空列表（HTTP服务的/metrics使用）"""
+    if _recorder is None:
+        return []
+    return _recorder.prometheus_lines()
+
+
+def drain():
+    """取出并清空本进程的汇总和记录（工作进程发回主进程时使用），未启用时为None"""
+    if _recorder is None:
+        return None
+    return _recorder.drain()
+
+
+def merge(drained):
+    if _recorder is not None and drained:
+        _recorder.merge(drained)
+
+
+def flush():
+    """把尚未写出的逐条记录追加写入JSON Lines导出文件（常驻服务退出时调用）"""
+    if _recorder is None or _recorder.jsonl_path is None:
+        return
+    try:
+        _recorder.write_jsonl(_recorder.jsonl_path)
+    except OSError as e:
+        logging.error(f"导出性能指标失败: {e}")
+
+
+def configure(settings, base_dir):
+    """
+    根据[Metrics]配置启用埋点，返回导出设置（未启用时返回None）。
+    settings: {'enabled': bool, 'export_path': str, 'format': 'jsonl' | 'prometheus'}
+    """
+    disable()
+    if not settings.get('enabled', False):
+        return None
+    export_path = settings.get('export_path')
+    if export_path:
+        export_path = os.path.join(base_dir, export_path)
+    fmt = settings.get('format', 'jsonl').lower()
+    # 按JSON Lines导出时才保留逐条记录，运行期间分批追加写入
+    enable(jsonl_path=export_path if export_path and fmt != 'prometheus' else None)
+    return {'export_path': export_path, 'format': fmt}
+
+
+def report(export=None):
+    """输出各阶段耗时汇总，并按导出设置写出记录"""
+    if _recorder is None:
+        return
+    summary = _recorder.summary()
+    if not summary:
+        return
+    logging.info("各阶段耗时汇总:")
+    for stage, stats in summary.items():
+        logging.info(f"  {stage:<10} 次数: {stats['count']:>6}, 总耗时: {stats['total']:9.3f} 秒, "
+                     f"p50: {stats['p50']:.3f} 秒, p95: {stats['p95']:.3f} 秒, 最大: {stats['max']:.3f} 秒")
+    if export is None or not export.get('export_path'):
+        return
+    path = export['export_path']
+    try:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if export['format'] == 'prometheus':
+            _recorder.write_prometheus(path)
+        else:
+            _recorder.write_jsonl(path)
+        logging.info(f"性能指标已导出到: {path}")
+    except OSError as e:
+        logging.error(f"导出性能指标失败: {e}")
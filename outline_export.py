@@ -0,0 +1,208 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from format_sniffer import FORMAT_EXTENSIONS, engine_for, sniff_format
+from slicer import PACKAGE_CLASSES, open_package, outline_record
+
+# 遍历文件夹时只导出这些扩展名的文件（--all-files时不限制，按内容判断格式）
+DOCUMENT_EXTENSIONS = frozenset(list(FORMAT_EXTENSIONS.values()) + ['.htm', '.mhtml', '.dot'])
+
+# Word锁文件和隐藏文件，不作为输入
+_IGNORED_PREFIXES = ('~$', '.')
+
+# 每导出这么多个文档输出一次进度
+_PROGRESS_EVERY = 1000
+
+
+def iter_documents(paths, all_files=False):
+    """
+    依次列出要导出的文档：paths中的文件夹递归遍历（按名称排序），文件原样列出，'-'表示从标准输入逐行读取路径
+    """
+    for path in paths:
+        if path == '-':
+            yield from iter_documents((line.rstrip('\r\n') for line in sys.stdin if line.strip()), all_files)
+        elif os.path.isdir(path):
+            for folder, dirs, files in os.walk(path):
+                dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+                for name in sorted(files):
+                    if name.startswith(_IGNORED_PREFIXES):
+                        continue
+                    if all_files or os.path.splitext(name)[1].lower() in DOCUMENT_EXTENSIONS:
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def _signature(path):
+    """(大小, 修改时间)，文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def read_outline(path):
+    """
+    只读方式解析一个文档，返回一条记录：file、size、mtime_ns、format、status，
+    成功（success）时附带大纲（见slicer.outline_record），需要Word的格式为unsupported，其余失败为error
+    """
+    record = {'file': path}
+    try:
+        st = os.stat(path)
+        record.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        fmt = sniff_format(path)
+        record['format'] = fmt
+        package_class = PACKAGE_CLASSES.get(engine_for(fmt))
+        if package_class is None:
+            record['status'] = 'unsupported'
+            return record
+        with open_package(path, package_class) as package:
+            record.update(status='success', **outline_record(package.headings, package.content_end,
+                                                            package.paragraph_count))
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    return record
+
+
+def _read_line(path):
+    """返回 (状态, 一行JSON)：在工作进程中完成编码，主进程只负责写入"""
+    record = read_outline(path)
+    return record['status'], json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def load_exported(output_path):
+    """
+    读取已有的导出文件，返回已成功导出（或确定不支持）的 {路径: (大小, 修改时间)}。
+    中断时写了一半的最后一行会被截掉，之后的记录接着追加。
+    """
+    exported = {}
+    if not os.path.exists(output_path):
+        return exported
+    with open(output_path, 'rb+') as f:
+        complete = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            complete += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') in ('success', 'unsupported'):
+                exported[record['file']] = (record.get('size'), record.get('mtime_ns'))
+        f.truncate(complete)
+    return exported
+
+
+def _compact(output_path):
+    """
+    每个文档只保留最后一条记录：--resume重新导出修改过或之前出错的文档后，去掉被取代的旧记录。
+    没有重复记录时不改动文件，否则写到临时文件（output_path + '.tmp'）再替换，记录顺序不变。
+    """
+    last = {}
+    lines = 0
+    with open(output_path, 'rb') as f:
+        for lines, line in enumerate(f, 1):
+            try:
+                last[json.loads(line)['file']] = lines
+            except (ValueError, KeyError):
+                continue
+    if len(last) == lines:
+        return 0
+    keep = set(last.values())
+    partial = output_path + '.tmp'
+    try:
+        with open(output_path, 'rb') as src, open(partial, 'wb') as dst:
+            for number, line in enumerate(src, 1):
+                if number in keep:
+                    dst.write(line)
+        os.replace(partial, output_path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return lines - len(keep)
+
+
+def export_outlines(paths, output, workers=None, all_files=False, resume=False):
+    """
+    把paths中每个文档的大纲写入output（JSON Lines，每个文档一行），返回 {状态: 文档数}。
+    输入文件只读取，不移动也不修改。workers个进程并行解析（默认为CPU核数），记录按遍历顺序写入。
+    resume为True时跳过output中已导出且大小和修改时间未变的文档，新记录追加到末尾，
+    完成后去掉重新导出的文档（修改过或之前出错）的旧记录，每个文档只保留一条记录。
+    """
+    exported = load_exported(output) if resume and output != '-' else {}
+    if exported:
+        logging.info(f"已有 {len(exported)} 个文档导出过，跳过未修改的文档")
+    documents = (path for path in iter_documents(paths, all_files)
+                 if path not in exported or _signature(path) != exported[path])
+    workers = workers or os.cpu_count() or 1
+    counts = {}
+    started = time.perf_counter()
+    if output == '-':
+        out = sys.stdout
+    else:
+        folder = os.path.dirname(os.path.abspath(output))
+        os.makedirs(folder, exist_ok=True)
+        out = open(output, 'a' if resume else 'w', encoding='utf-8', newline='\n')
+    pool = None
+    try:
+        if workers > 1:
+            pool = multiprocessing.get_context().Pool(workers)
+            # 每个任务包含多个文档，减少进程间通信的开销
+            lines = pool.imap(_read_line, documents, chunksize=16)
+        else:
+            lines = map(_read_line, documents)
+        for status, line in lines:
+            out.write(line)
+            counts[status] = counts.get(status, 0) + 1
+            total = sum(counts.values())
+            if total % _PROGRESS_EVERY == 0:
+                out.flush()
+                logging.info(f"已导出 {total} 个文档，{total / (time.perf_counter() - started):.0f} 个/秒")
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    if resume and output != '-':
+        removed = _compact(output)
+        if removed:
+            logging.info(f"已去掉 {removed} 条被重新导出的文档取代的旧记录")
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    logging.info(f"导出完成：{total} 个文档，用时 {elapsed:.1f} 秒（{total / elapsed if elapsed else 0:.0f} 个/秒）。"
+                 f"成功: {counts.get('success', 0)}, 不支持: {counts.get('unsupported', 0)}, "
+                 f"错误: {counts.get('error', 0)}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导出文档的标题大纲（JSON Lines，每个文档一行），不移动或修改输入文件')
+    parser.add_argument('paths', nargs='+', help='文档或文件夹（递归遍历），-表示从标准输入逐行读取路径')
+    parser.add_argument('-o', '--output', default='outline.jsonl', help='导出文件路径，-表示标准输出（默认outline.jsonl）')
+    parser.add_argument('-j', '--workers', type=int, default=0, help='并行解析的进程数（默认为CPU核数）')
+    parser.add_argument('--all-files', action='store_true', help='遍历文件夹时不按扩展名筛选，按内容判断格式')
+    parser.add_argument('--resume', action='store_true', help='跳过导出文件中已有且未修改的文档，接着追加')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    try:
+        export_outlines(args.paths, args.output, args.workers, args.all_files, args.resume)
+    except KeyboardInterrupt:
+        logging.warning("导出已中断，已写入的记录保留，可用--resume接着导出")
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from file_ops import link_or_copy
+
+# 切片逻辑变化（同样的输入和设置会得到不同的输出）时递增，旧版本的记录不再命中
+OUTPUT_VERSION = 1
+
+# 发布输出文件的方式：硬链接、写时复制（reflink），不支持时都退回复制
+LINK_MODES = ('hardlink', 'reflink', 'copy')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    digest TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    files TEXT NOT NULL,
+    PRIMARY KEY (digest, spec)
+)
+'''
+
+
+def _stat(path):
+    """(大小, 修改时间)，文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _Pending:
+    """同一批内正在处理的第一份内容，重复的文件等待它完成"""
+
+    __slots__ = ('event', 'outputs')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.outputs = None
+
+
+class OutputIndex:
+    """
+    重复输入的切片结果索引：以输入文件内容的SHA-256和切片设置为键，记录已发布过的切片结果。
+    第一份内容切片成功后，结果链接（硬链接或reflink，不支持时复制）一份到store_folder保存；
+    之后同一批内或以后批次中内容相同、切片设置相同的文件不再解析和切片，直接从保存的结果链接出输出文件。
+    记录保存在SQLite单文件数据库中，保存的文件被修改或删除时记录失效，重新切片。
+    同一批内第一份还在处理时，重复的文件等待它完成（只在同一进程内协调，多个工作进程同时遇到时各自切片）。
+    按最近使用时间淘汰，保存的结果总大小超过max_bytes时删除最久未使用的条目。
+    连接在首次使用时建立，对象可以直接传给工作进程。
+    """
+
+    def __init__(self, path, store_folder, link_mode='reflink', max_bytes=1024 * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.store_folder = os.path.abspath(store_folder)
+        self.link_mode = link_mode
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def __getstate__(self):
+        return {'path': self.path, 'store_folder': self.store_folder, 'link_mode': self.link_mode,
+                'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['store_folder'], state['link_mode'], state['max_bytes'])
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            # 收尾阶段在I/O线程中登记结果，连接在线程间共享（由self._lock串行化）
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def key(*parts):
+        """由切片设置生成记录的键（同样的设置得到同样的键）"""
+        return json.dumps([OUTPUT_VERSION] + list(parts), ensure_ascii=False, sort_keys=True)
+
+    def _load(self, digest, spec):
+        """读取并校验记录，返回 [(名称, 保存的文件路径), ...]，没有或已失效时为None"""
+        conn = self._connect()
+        row = conn.execute('SELECT files FROM outputs WHERE digest = ? AND spec = ?', (digest, spec)).fetchone()
+        if row is None:
+            return None
+        files = json.loads(row[0])
+        if any(_stat(path) != (size, mtime) for _, path, size, mtime in files):
+            logging.info(f"重复内容的已保存结果已被修改或删除，重新切片: {digest[:12]}")
+            self._drop(conn, digest, spec, files)
+            return None
+        conn.execute('UPDATE outputs SET last_used = ? WHERE digest = ? AND spec = ?', (time.time(), digest, spec))
+        return [(name, path) for name, path, _, _ in files]
+
+    def claim(self, digest, spec):
+        """
+        查找内容和切片设置都相同的已有结果，返回 [(名称, 保存的文件路径), ...]（名称为None表示单个切片）。
+        空列表表示这份内容切片失败过（未找到指定章节）。
+        没有时返回None，调用者负责切片，完成后（无论成败）必须调用release()；
+        同一批内这份内容已在处理时，等它完成后返回它的结果，它发生错误时由调用者接手切片。
+        """
+        while True:
+            with self._lock:
+                pending = self._pending.get((digest, spec))
+                if pending is None:
+                    try:
+                        outputs = self._load(digest, spec)
+                    except (sqlite3.Error, ValueError) as e:
+                        logging.error(f"读取重复内容索引失败: {e}")
+                        outputs = None
+                    if outputs is None:
+                        self._pending[(digest, spec)] = _Pending()
+                    return outputs
+            pending.event.wait()
+            if pending.outputs is not None:
+                return pending.outputs
+
+    def release(self, digest, spec, published=None):
+        """
+        登记切片结果：published为成功时已发布的 [(名称, 输出文件路径), ...]，
+        确定性的失败（再切一次结果也一样）为空列表，发生错误等不应记住的结果为None。
+        结果链接一份到store_folder保存，供之后的重复文件使用，并唤醒同一批内等待的重复文件。
+        """
+        outputs = None
+        if published is not None:
+            try:
+                outputs = self._store(digest, spec, published)
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"保存重复内容的切片结果失败: {e}")
+        with self._lock:
+            pending = self._pending.pop((digest, spec), None)
+        if pending is not None:
+            pending.outputs = outputs
+            pending.event.set()
+
+    def _store(self, digest, spec, published):
+        folder = os.path.join(self.store_folder, digest[:2])
+        os.makedirs(folder, exist_ok=True)
+        # 文件名带上进程号，多个工作进程同时登记同一份内容时互不覆盖
+        tag = f"{digest}_{hashlib.sha1(spec.encode('utf-8')).hexdigest()[:8]}_{os.getpid()}"
+        files = []
+        for i, (name, path) in enumerate(published):
+            stored = os.path.join(folder, f"{tag}_{i}{os.path.splitext(path)[1]}")
+            link_or_copy(path, stored, self.link_mode)
+            size, mtime = _stat(stored)
+            files.append((name, stored, size, mtime))
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT files FROM outputs WHERE digest = ? AND spec = ?', (digest, spec)).fetchone()
+            if row is not None:
+                self._drop(conn, digest, spec, json.loads(row[0]), keep={path for _, path, _, _ in files})
+            conn.execute(
+                'INSERT OR REPLACE INTO outputs (digest, spec, size, last_used, files) VALUES (?, ?, ?, ?, ?)',
+                (digest, spec, sum(size for _, _, size, _ in files), time.time(),
+                 json.dumps(files, ensure_ascii=False))
+            )
+            self._evict(conn, (digest, spec))
+        return [(name, path) for name, path, _, _ in files]
+
+    def publish(self, stored, target):
+        """把保存的结果发布为输出文件，返回实际使用的方式（hardlink、reflink或copy）"""
+        return link_or_copy(stored, target, self.link_mode)
+
+    def _drop(self, conn, digest, spec, files, keep=()):
+        conn.execute('DELETE FROM outputs WHERE digest = ? AND spec = ?', (digest, spec))
+        for _, path, _, _ in files:
+            if path not in keep and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.error(f"删除保存的切片结果失败: {path}, {e}")
+
+    def _evict(self, conn, current):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM outputs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for digest, spec, size, files in conn.execute(
+                'SELECT digest, spec, size, files FROM outputs ORDER BY last_used'):
+            if (digest, spec) == current:
+                # 刚登记的结果还要供等待中的重复文件使用
+                continue
+            victims.append((digest, spec, json.loads(files)))
+            excess -= size
+            if excess <= 0:
+                break
+        for digest, spec, files in victims:
+            self._drop(conn, digest, spec, files)
+        logging.info(f"重复内容索引已淘汰 {len(victims)} 个条目")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
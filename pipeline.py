@@ -0,0 +1,72 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import geter3
+import metrics
+
+
+def _record_file(job, result):
+    """流水线中一个文件的各阶段在不同线程中执行，整个文件的耗时从准备开始算到收尾结束"""
+    if metrics.enabled():
+        metrics.record('file', time.perf_counter() - job.started,
+                       name=job.file_name, size=job.size, result=result)
+
+
+def run_pipeline(file_paths, file_kwargs, getter=None, prefetch=2, prefetch_max_bytes=64 * 1024 * 1024,
+                 io_threads=2):
+    """
+    流水线处理一批文件，返回与file_paths顺序一致的处理结果列表。
+    准备阶段（识别格式、复制到临时文件夹、把文件预读到内存）和收尾阶段（移动切片结果和原文件）
+    在I/O线程池中执行，解析和切片在当前线程中执行（Word的COM对象只能在创建它的线程中使用），
+    这样切片当前文件时，下一个文件已在读取，上一个文件的结果正在写出。
+    阶段之间是有界的：最多提前准备prefetch个文件，最多prefetch个文件等待收尾，预读占用的内存因此有上限；
+    大于prefetch_max_bytes的文件不预读，切片时直接从磁盘读取。
+    """
+    processor = geter3.FileProcessor(**file_kwargs)
+    prefetch = max(1, prefetch)
+    results = [None] * len(file_paths)
+    # (下标, 准备阶段的Future) 和 (下标, 文件状态, 收尾阶段的Future)，均按文件顺序排列
+    preparing = deque()
+    finishing = deque()
+    next_index = 0
+
+    def fill_prefetch():
+        nonlocal next_index
+        while next_index < len(file_paths) and len(preparing) < prefetch:
+            future = pool.submit(processor.prepare, file_paths[next_index], prefetch_max_bytes)
+            preparing.append((next_index, future))
+            next_index += 1
+
+    def collect(index, job, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.error(f"处理文件时发生异常: {file_paths[index]}, {e}")
+            result = "error"
+        results[index] = result
+        if job is not None:
+            _record_file(job, result)
+
+    with ThreadPoolExecutor(max_workers=max(1, io_threads), thread_name_prefix='pipeline-io') as pool:
+        fill_prefetch()
+        while preparing:
+            index, future = preparing.popleft()
+            try:
+                job = future.result()
+            except Exception as e:
+                logging.error(f"处理文件时发生异常: {file_paths[index]}, {e}")
+                results[index] = "error"
+                fill_prefetch()
+                continue
+            # 当前文件切片之前就开始准备后面的文件
+            fill_prefetch()
+            processor.slice(getter, job)
+            finishing.append((index, job, pool.submit(processor.finish, job)))
+            # 等待收尾的文件过多时（写出比切片慢），先等最早的一个完成
+            while len(finishing) > prefetch or (finishing and finishing[0][2].done()):
+                collect(*finishing.popleft())
+        while finishing:
+            collect(*finishing.popleft())
+    return results
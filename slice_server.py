@@ -0,0 +1,579 @@
+import contextlib
+import email.parser
+import email.policy
+import importlib.util
+import io
+import ipaddress
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import metrics
+from format_sniffer import FORMAT_EXTENSIONS, sniff_data
+from geter3 import (DOC_ENGINES, choose_engine, close_word_getter, open_heading_cache, open_word_getter, read_config,
+                    resolve_doc_engine, slice_word_by_delete_with_getter)
+from heading_index import HeadingIndex
+from slicer import (UnsupportedFormatError, document_outline, make_slice_spec, open_package, outline_record,
+                    render_slice)
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 查询参数中的章节设置（与[ChapterSettings]相同）
+_KEYWORD_PARAMS = ('section1', 'section2')
+_NUMBER_PARAMS = ('section1_offset', 'section2_offset', 'section1_level', 'section2_level')
+
+# 按查询参数编译的切片规格最多缓存这么多个
+_SPEC_CACHE_SIZE = 64
+
+# 服务的路径，其他路径在指标中统一记为other（避免任意路径产生无限多的指标序列）
+ROUTES = ('/healthz', '/metrics', '/slice', '/outline', '/batch')
+
+_MB = 1024 * 1024
+
+
+class RequestError(Exception):
+    """以指定HTTP状态码返回给客户端的错误"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class AdmissionControl:
+    """
+    准入控制：最多max_concurrency个请求同时处理，其余最多queue_size个排队等待。
+    队列已满、或排队超过queue_timeout秒仍未轮到时拒绝请求（HTTP 429），避免请求堆积耗尽内存。
+    """
+
+    def __init__(self, max_concurrency=2, queue_size=16, queue_timeout=30):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected += 1
+        raise RequestError(429, reason, {'Retry-After': '1'})
+
+    @contextlib.contextmanager
+    def admit(self):
+        with self._lock:
+            full = self.active + self.waiting >= self.max_concurrency + self.queue_size
+            if not full:
+                self.waiting += 1
+        if full:
+            self._reject("服务繁忙，等待队列已满")
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+        if not acquired:
+            self._reject(f"服务繁忙，排队超过 {self.queue_timeout} 秒")
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+
+
+def _com_initialize():
+    import pythoncom
+
+    pythoncom.CoInitialize()
+
+
+def word_available():
+    """是否可以调用Word（安装了pywin32）"""
+    if 'win32com' in sys.modules:
+        return True
+    return importlib.util.find_spec('win32com') is not None
+
+
+class WordWorker:
+    """
+    在专用线程中持有常驻的Word会话池（COM对象只能在创建它的线程中使用），
+    需要Word处理的请求在这个线程中依次执行。Word只接受文件，因此这些请求使用临时文件。
+    """
+
+    def __init__(self, settings=None):
+        self._settings = settings or {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='word',
+                                            initializer=_com_initialize)
+        self._getter = None
+
+    def _call(self, func, args):
+        if self._getter is None:
+            self._getter = open_word_getter(self._settings)
+        return func(self._getter, *args)
+
+    def call(self, func, *args):
+        """在Word线程中调用func(会话池, *args)并等待结果"""
+        return self._executor.submit(self._call, func, args).result()
+
+    def _close(self):
+        close_word_getter(self._getter)
+        self._getter = None
+
+    def close(self):
+        self._executor.submit(self._close).result()
+        self._executor.shutdown()
+
+
+@contextlib.contextmanager
+def _temp_document(data, ext):
+    """把上传的内容写到临时文件供Word打开，返回 (路径, 恢复内容的函数)，用完后删除"""
+    folder = tempfile.mkdtemp(prefix='word-geter-')
+    path = os.path.join(folder, 'document' + ext)
+
+    def restore():
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    try:
+        restore()
+        yield path, restore
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _word_slice(pool, data, ext, spec, cache):
+    with _temp_document(data, ext) as (path, restore):
+        success = pool.run(
+            slice_word_by_delete_with_getter, path, path, spec['section1_keywords'], spec['section2_keywords'],
+            spec['section1_offset'], spec['section2_offset'], spec['section1_level'], spec['section2_level'],
+            cache, reset=restore
+        )
+        if not success:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def _read_word_outline(getter, path):
+    titles, doc = getter.get_document_titles_tree(path)
+    if titles is None:
+        raise ValueError("无法解析文档结构")
+    try:
+        return outline_record(HeadingIndex.from_tree(titles), doc.Content.End, doc.Paragraphs.Count)
+    finally:
+        doc.Close(False)
+
+
+def _word_outline(pool, data, ext):
+    with _temp_document(data, ext) as (path, restore):
+        return pool.run(_read_word_outline, path, reset=restore)
+
+
+def parse_multipart(content_type, body):
+    """解析multipart/form-data请求体，返回其中上传的文件 [(文件名, 内容), ...]"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    if not message.is_multipart():
+        raise RequestError(400, "请求体不是multipart/form-data")
+    files = []
+    for part in message.iter_parts():
+        file_name = part.get_filename()
+        if file_name is None:
+            continue
+        files.append((os.path.basename(file_name), part.get_payload(decode=True) or b''))
+    return files
+
+
+class SliceService:
+    """
+    HTTP服务的处理逻辑：切片设置、关键词匹配器和标题索引缓存在启动时准备好，之后的请求直接使用。
+    docx和（按设置）doc在内存中切片（见slicer.py），rtf、html等交给常驻Word线程（可以调用Word时）。
+    """
+
+    def __init__(self, config, base_dir):
+        self.matching = config.get('matching', {})
+        self.chapter_settings = config.get('chapter_settings', {})
+        self.default_spec = make_slice_spec(None, self.chapter_settings, self.matching)
+        self.named_specs = {name: make_slice_spec(name, settings, self.matching)
+                            for name, settings in config.get('slices', {}).items()}
+        self.cache = open_heading_cache(config, base_dir)
+        doc_engine = config['processing'].get('doc_engine', 'auto').lower()
+        if doc_engine not in DOC_ENGINES:
+            logging.warning(f"doc_engine设置无效: {doc_engine}，改为auto")
+            doc_engine = 'auto'
+        self.doc_engine = resolve_doc_engine(doc_engine)
+        self.word_settings = config.get('word', {})
+        self._word = None
+        self._word_lock = threading.Lock()
+        self._specs = {}
+        self._specs_lock = threading.Lock()
+
+    def spec_for(self, params):
+        """
+        按查询参数选择切片规格：slice=<名称>使用[Slice:<名称>]，section1、section2（逗号分隔）、
+        section1_offset等参数覆盖[ChapterSettings]中的对应设置，都没有时使用[ChapterSettings]
+        """
+        if 'slice' in params:
+            name = params['slice']
+            if name not in self.named_specs:
+                raise RequestError(400, f"未配置命名切片: {name}")
+            return self.named_specs[name]
+        overrides = {}
+        for key in _KEYWORD_PARAMS:
+            if key in params:
+                overrides[key] = [keyword for keyword in params[key].split(',') if keyword.strip()]
+        for key in _NUMBER_PARAMS:
+            if key in params:
+                try:
+                    overrides[key] = int(params[key])
+                except ValueError:
+                    raise RequestError(400, f"参数{key}必须是整数: {params[key]}")
+        if not overrides:
+            return self.default_spec
+        key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in overrides.items()))
+        with self._specs_lock:
+            spec = self._specs.get(key)
+            if spec is None:
+                if len(self._specs) >= _SPEC_CACHE_SIZE:
+                    self._specs.pop(next(iter(self._specs)))
+                spec = make_slice_spec(None, dict(self.chapter_settings, **overrides), self.matching)
+                self._specs[key] = spec
+        return spec
+
+    def _word_worker(self):
+        with self._word_lock:
+            if self._word is None:
+                self._word = WordWorker(self.word_settings)
+            return self._word
+
+    def _engine(self, data):
+        """判断上传内容的格式，返回 (格式, 引擎)，无法处理时抛出UnsupportedFormatError"""
+        fmt = sniff_data(data)
+        engine = choose_engine(fmt, self.doc_engine)
+        if engine is None or (engine == 'word' and not word_available()):
+            raise UnsupportedFormatError(fmt)
+        return fmt, engine
+
+    def slice(self, data, spec):
+        """切片，返回 (切片后的文件内容, 扩展名)，未找到指定章节时内容为None"""
+        fmt, engine = self._engine(data)
+        if engine == 'word':
+            ext = FORMAT_EXTENSIONS[fmt]
+            return self._word_worker().call(_word_slice, data, ext, spec, self.cache), ext
+        with open_package(data, cache=self.cache) as package:
+            return render_slice(package, spec), '.docx'
+
+    def outline(self, data):
+        """读取文档大纲（见slicer.outline_record）"""
+        fmt, engine = self._engine(data)
+        if engine == 'word':
+            return self._word_worker().call(_word_outline, data, FORMAT_EXTENSIONS[fmt])
+        return document_outline(data, self.cache)
+
+    def slice_batch(self, files, spec):
+        """
+        批量切片，返回zip文件内容：每个成功的切片为 <文件名>_<切片名或slice>.<扩展名>，
+        results.json记录每个文件的处理结果（success、failed、unsupported或error）
+        """
+        suffix = spec['name'] or 'slice'
+        buffer = io.BytesIO()
+        results = []
+        used = set()
+        # 切片结果本身已是压缩过的docx，不再压缩
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+            for file_name, data in files:
+                entry = {'file': file_name}
+                try:
+                    content, ext = self.slice(data, spec)
+                    if content is None:
+                        entry['status'] = 'failed'
+                    else:
+                        stem = f"{os.path.splitext(file_name)[0]}_{suffix}"
+                        output, n = stem + ext, 1
+                        while output in used:
+                            n += 1
+                            output = f"{stem}_{n}{ext}"
+                        used.add(output)
+                        archive.writestr(output, content)
+                        entry.update(status='success', output=output)
+                except UnsupportedFormatError as e:
+                    entry.update(status='unsupported', error=str(e))
+                except Exception as e:
+                    logging.error(f"处理上传的文件时发生异常: {file_name}, {e}")
+                    entry.update(status='error', error=str(e))
+                results.append(entry)
+            archive.writestr('results.json', json.dumps(results, ensure_ascii=False, indent=2))
+        return buffer.getvalue()
+
+    def outline_batch(self, files):
+        """批量读取大纲，返回每个文件的 {file, status, outline或error}"""
+        documents = []
+        for file_name, data in files:
+            entry = {'file': file_name}
+            try:
+                entry.update(status='success', outline=self.outline(data))
+            except UnsupportedFormatError as e:
+                entry.update(status='unsupported', error=str(e))
+            except Exception as e:
+                logging.error(f"处理上传的文件时发生异常: {file_name}, {e}")
+                entry.update(status='error', error=str(e))
+            documents.append(entry)
+        return documents
+
+    @property
+    def word_started(self):
+        return self._word is not None
+
+    def close(self):
+        if self._word is not None:
+            self._word.close()
+            self._word = None
+        if self.cache is not None:
+            self.cache.close()
+
+
+class SliceServer(ThreadingHTTPServer):
+    """每个连接一个线程；处理文档的请求先经过准入控制"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, admission, max_upload_bytes):
+        super().__init__(address, SliceRequestHandler)
+        self.service = service
+        self.admission = admission
+        self.max_upload_bytes = max_upload_bytes
+        self.started = time.monotonic()
+        self._stats_lock = threading.Lock()
+        # (路径, 状态码) -> 次数；路径 -> [次数, 总耗时]
+        self.responses = {}
+        self.durations = {}
+
+    def count(self, path, status, duration):
+        with self._stats_lock:
+            self.responses[(path, status)] = self.responses.get((path, status), 0) + 1
+            stats = self.durations.setdefault(path, [0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+
+    def metrics_text(self):
+        """Prometheus文本格式的服务指标，启用了[Metrics]时附带各处理阶段的汇总"""
+        admission = self.admission
+        lines = [
+            '# HELP word_geter_http_requests_total HTTP requests by path and status.',
+            '# TYPE word_geter_http_requests_total counter',
+        ]
+        with self._stats_lock:
+            responses = sorted(self.responses.items())
+            durations = sorted(self.durations.items())
+        for (path, status), count in responses:
+            lines.append(f'word_geter_http_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines.append('# HELP word_geter_http_request_seconds Time spent handling HTTP requests.')
+        lines.append('# TYPE word_geter_http_request_seconds summary')
+        for path, (count, total) in durations:
+            lines.append(f'word_geter_http_request_seconds_sum{{path="{path}"}} {total:.6f}')
+            lines.append(f'word_geter_http_request_seconds_count{{path="{path}"}} {count}')
+        lines.extend([
+            '# TYPE word_geter_http_in_flight gauge',
+            f'word_geter_http_in_flight {admission.active}',
+            '# TYPE word_geter_http_queued gauge',
+            f'word_geter_http_queued {admission.waiting}',
+            '# TYPE word_geter_http_rejected_total counter',
+            f'word_geter_http_rejected_total {admission.rejected}',
+            '# TYPE word_geter_uptime_seconds gauge',
+            f'word_geter_uptime_seconds {time.monotonic() - self.started:.3f}',
+        ])
+        lines.extend(metrics.prometheus_lines())
+        return '\n'.join(lines) + '\n'
+
+    def health(self):
+        admission = self.admission
+        return {
+            'status': 'ok',
+            'uptime': round(time.monotonic() - self.started, 3),
+            'active': admission.active,
+            'queued': admission.waiting,
+            'max_concurrency': admission.max_concurrency,
+            'queue_size': admission.queue_size,
+            'rejected': admission.rejected,
+            'word': self.service.word_started,
+        }
+
+
+class SliceRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /healthz   服务状态（JSON）
+    GET  /metrics   Prometheus文本格式的指标
+    POST /slice     请求体为文档内容，返回切片后的文档；查询参数选择切片设置（见SliceService.spec_for）
+    POST /outline   请求体为文档内容，返回标题大纲（JSON）
+    POST /batch     multipart/form-data上传多个文件；mode=slice（默认）返回zip，mode=outline返回JSON
+    """
+
+    server_version = 'WordGeter'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _send_json(self, status, value, headers=None):
+        body = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        return self._send(status, body, 'application/json; charset=utf-8', headers)
+
+    def _send_file(self, body, content_type, file_name):
+        disposition = f"attachment; filename*=UTF-8''{quote(file_name)}"
+        return self._send(200, body, content_type, {'Content-Disposition': disposition})
+
+    def _read_body(self):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, "缺少Content-Length")
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, "Content-Length无效")
+        if length > self.server.max_upload_bytes:
+            raise RequestError(413, f"请求体超过上限 {self.server.max_upload_bytes // _MB} MB")
+        body = self.rfile.read(length)
+        self._body_pending = False
+        return body
+
+    def _handle(self, handler):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        # 请求体在通过准入控制后才读取，排队和被拒绝的请求不占用内存
+        self._body_pending = self.command == 'POST'
+        try:
+            status = handler(url.path, params)
+        except RequestError as e:
+            status = self._send_json(e.status, {'error': e.message}, e.headers)
+        except UnsupportedFormatError as e:
+            status = self._send_json(415, {'error': str(e), 'format': e.fmt})
+        except Exception as e:
+            logging.error(f"处理请求时发生异常: {url.path}, {e}")
+            status = self._send_json(500, {'error': str(e)})
+        if self._body_pending:
+            # 未读取的请求体还留在连接中，回复后关闭连接
+            self.close_connection = True
+        duration = time.perf_counter() - started
+        route = url.path if url.path in ROUTES else 'other'
+        self.server.count(route, status, duration)
+        metrics.record('request', duration, path=route, status=status)
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _get(self, path, params):
+        if path == '/healthz':
+            return self._send_json(200, self.server.health())
+        if path == '/metrics':
+            return self._send(200, self.server.metrics_text().encode('utf-8'), 'text/plain; version=0.0.4')
+        raise RequestError(404, f"未知的路径: {path}")
+
+    def _post(self, path, params):
+        if path not in ('/slice', '/outline', '/batch'):
+            raise RequestError(404, f"未知的路径: {path}")
+        service = self.server.service
+        spec = service.spec_for(params) if path != '/outline' else None
+        with self.server.admission.admit():
+            body = self._read_body()
+            if path == '/outline':
+                return self._send_json(200, service.outline(body))
+            if path == '/slice':
+                content, ext = service.slice(body, spec)
+                if content is None:
+                    raise RequestError(422, "未找到指定章节或切片区间超出标题范围")
+                base = os.path.splitext(params.get('filename', 'document'))[0]
+                content_type = DOCX_CONTENT_TYPE if ext == '.docx' else 'application/octet-stream'
+                return self._send_file(content, content_type, f"{base}_{spec['name'] or 'slice'}{ext}")
+            files = parse_multipart(self.headers.get('Content-Type', ''), body)
+            if not files:
+                raise RequestError(400, "请求中没有上传的文件")
+            if params.get('mode', 'slice') == 'outline':
+                return self._send_json(200, {'documents': service.outline_batch(files)})
+            return self._send_file(service.slice_batch(files, spec), 'application/zip', 'slices.zip')
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def create_server(config, base_dir=None):
+    """根据配置创建HTTP服务（尚未开始接受请求），设置见config.ini的[Service]"""
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    settings = config.get('service', {})
+    host = settings.get('host', '127.0.0.1')
+    port = settings.get('port', 8765)
+    if not _is_loopback(host):
+        logging.warning(f"HTTP服务监听的 {host} 不是本机地址，服务没有身份验证，请确认网络环境")
+    if not config['processing'].get('verbose', True):
+        logging.getLogger().setLevel(logging.WARNING)
+    metrics.configure(config.get('metrics', {}), base_dir)
+    admission = AdmissionControl(settings.get('max_concurrency', 2), settings.get('queue_size', 16),
+                                 settings.get('queue_timeout', 30))
+    service = SliceService(config, base_dir)
+    max_upload_bytes = int(settings.get('max_upload_mb', 100) * _MB)
+    return SliceServer((host, port), service, admission, max_upload_bytes)
+
+
+def serve(server):
+    """处理请求直到收到SIGINT/SIGTERM，退出时关闭Word等常驻引擎"""
+    def stop(*args):
+        logging.info("收到停止信号，HTTP服务正在退出")
+        # shutdown()会等待serve_forever()返回，不能在同一个线程中调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    host, port = server.server_address[:2]
+    logging.info(f"HTTP服务已启动: http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.service.close()
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    # 从配置文件读取参数
+    config_file = 'config.ini'
+    config = read_config(config_file)
+
+    if config is None:
+        logging.error(f"无法加载配置文件 {config_file}，程序退出")
+        exit(1)
+
+    serve(create_server(config))
@@ -0,0 +1,195 @@
+import io
+import logging
+import os
+from collections import Counter
+
+import metrics
+from doc_reader import DocPackage
+from docx_slicer import DocxPackage
+from format_sniffer import engine_for, sniff_data, sniff_format
+from heading_cache import data_digest, file_digest
+from heading_index import as_heading_index
+from keyword_matcher import KeywordMatcher, as_matcher
+
+# 纯Python引擎 -> 文档包类（其余格式需要通过Word处理，不能在内存中切片）
+PACKAGE_CLASSES = {'native': DocxPackage, 'legacy': DocPackage}
+
+
+class UnsupportedFormatError(ValueError):
+    """输入不是可以在内存中切片的格式（需要Word处理的rtf、html等，或者不是Word文档）"""
+
+    def __init__(self, fmt):
+        super().__init__(f"不支持在内存中切片的格式: {fmt}")
+        self.fmt = fmt
+
+
+@metrics.timed('match')
+def find_slice_range(titles, content_end, section1_keywords, section2_keywords,
+                     section1_offset=1, section2_offset=1, section1_level=1, section2_level=1):
+    """
+    在标题中查找切片区间，返回(start, end)字符偏移量。
+    titles可以是标题树或HeadingIndex（同一文档切多个区间时应传入同一个索引，避免重复建立）；
+    关键词可以是关键词列表或预先构建的KeywordMatcher。
+    章节在指定级别的所有标题（包括嵌套在上级标题下的）中匹配，偏移量在级别不超过该级别的标题中计数，
+    例如二级标题偏移1表示下一个二级标题，或者所在一级章节结束时的下一个一级标题。
+    未找到指定章节或区间超出标题范围时返回None。
+    """
+    index = as_heading_index(titles)
+    
+    # 找到section1和section2：优先级最高的关键词在指定级别中所匹配的第一个标题
+    match1 = as_matcher(section1_keywords).first_match(index.titles_at_level(section1_level))
+    match2 = as_matcher(section2_keywords).first_match(index.titles_at_level(section2_level))
+    if match1 is not None:
+        logging.info(f"找到起始章节: {match1.keyword} 在 {index.titles_at_level(section1_level)[match1.title_index]}")
+    if match2 is not None:
+        logging.info(f"找到结束章节: {match2.keyword} 在 {index.titles_at_level(section2_level)[match2.title_index]}")
+    
+    if match1 is None or match2 is None:
+        return None
+    start_idx = index.level_indices(section1_level)[match1.title_index]
+    end_idx = index.level_indices(section2_level)[match2.title_index]
+    
+    # 计算实际切片区间：起点必须落在某个标题上，终点可以正好是文档末尾
+    start_target_idx = index.step(start_idx, section1_offset, section1_level)
+    end_target_idx = index.step(end_idx, section2_offset, section2_level)
+    if start_target_idx is None or start_target_idx == len(index) or end_target_idx is None:
+        return None
+    
+    start = index.offsets[start_target_idx]
+    if end_target_idx == len(index):
+        end = content_end
+    else:
+        end = index.offsets[end_target_idx]
+    return start, end
+
+
+def make_slice_spec(name, chapter_settings, matching=None):
+    """由一组章节设置生成切片规格，关键词预先编译为匹配器"""
+    matching = matching or {}
+    return {
+        'name': name,
+        'section1_keywords': KeywordMatcher(chapter_settings.get('section1', ['总论']), **matching),
+        'section2_keywords': KeywordMatcher(chapter_settings.get('section2', ['建设方案']), **matching),
+        'section1_offset': chapter_settings.get('section1_offset', 1),
+        'section2_offset': chapter_settings.get('section2_offset', 1),
+        'section1_level': chapter_settings.get('section1_level', 1),
+        'section2_level': chapter_settings.get('section2_level', 1),
+    }
+
+
+def spec_fingerprint(spec):
+    """切片规格中决定切片结果的全部设置：名称、关键词及其归一化选项、偏移量和级别"""
+    fields = [spec.get('name')]
+    for key in ('section1_keywords', 'section2_keywords'):
+        matcher = as_matcher(spec[key])
+        fields.append([matcher.keywords, matcher.fold_width, matcher.strip_whitespace,
+                       matcher.strip_numbering, matcher.ignore_case])
+    fields.extend(spec[key] for key in ('section1_offset', 'section2_offset', 'section1_level', 'section2_level'))
+    return fields
+
+
+def find_spec_range(titles, content_end, spec):
+    """按切片规格查找切片区间"""
+    return find_slice_range(
+        titles, content_end, spec['section1_keywords'], spec['section2_keywords'],
+        spec['section1_offset'], spec['section2_offset'], spec['section1_level'], spec['section2_level']
+    )
+
+
+def as_slice_spec(spec, matching=None):
+    """
+    已是切片规格（make_slice_spec的结果）时原样返回；章节设置（section1、section2等键，
+    与[ChapterSettings]相同，关键词可以是单个字符串）转换为切片规格
+    """
+    if 'section1_keywords' in spec:
+        return spec
+    settings = dict(spec)
+    for key in ('section1', 'section2'):
+        if isinstance(settings.get(key), str):
+            settings[key] = [settings[key]]
+    return make_slice_spec(settings.get('name'), settings, matching)
+
+
+def open_package(source, package_class=None, cache=None, digest=None):
+    """
+    打开并解析文档，返回DocxPackage或DocPackage（可用作上下文管理器，用完后关闭）。
+    source可以是文件内容（bytes）、可读的文件对象或文件路径；package_class为None时按内容判断格式，
+    不能在内存中切片时抛出UnsupportedFormatError。
+    cache为HeadingCache时按内容哈希读取或写入标题索引，digest为已算出的哈希。
+    """
+    path = data = None
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+    else:
+        data = source.read()
+    if package_class is None:
+        fmt = sniff_format(path) if path is not None else sniff_data(data)
+        package_class = PACKAGE_CLASSES.get(engine_for(fmt))
+        if package_class is None:
+            raise UnsupportedFormatError(fmt)
+    index = None
+    if cache is not None:
+        if digest is None:
+            digest = file_digest(path) if path is not None else data_digest(data)
+        index = cache.get(digest, package_class.engine)
+    package = package_class(path if path is not None else io.BytesIO(data), index)
+    if cache is not None and index is None:
+        cache.put(digest, package_class.engine, package.index_record())
+    return package
+
+
+def render_slice(package, spec):
+    """按切片规格从已解析的文档中切出一份，返回docx文件内容；未找到指定章节或区间超出标题范围时返回None"""
+    slice_range = find_spec_range(package.headings, package.content_end, spec)
+    if slice_range is None:
+        return None
+    start, end = slice_range
+    if spec.get('name'):
+        logging.info(f"切片[{spec['name']}]范围: {start} - {end}")
+    else:
+        logging.info(f"切片范围: {start} - {end}")
+    buffer = io.BytesIO()
+    package.save_slice(buffer, start, end)
+    return buffer.getvalue()
+
+
+def slice_document(source, specs, cache=None, matching=None):
+    """
+    在内存中切片：文档只解析一次，按每个切片规格（或章节设置）切出一份，
+    返回与specs顺序一致的docx文件内容列表，未找到指定章节的为None。
+    source可以是文件内容（bytes）、可读的文件对象或文件路径，不使用临时文件；
+    doc文件的切片结果转换为docx，需要Word处理的格式抛出UnsupportedFormatError。
+    """
+    specs = [as_slice_spec(spec, matching) for spec in specs]
+    with open_package(source, cache=cache) as package:
+        return [render_slice(package, spec) for spec in specs]
+
+
+def slice_bytes(source, spec, cache=None, matching=None):
+    """
+    在内存中按一个切片规格（或章节设置，如{'section1': ['总论'], 'section2': ['建设方案']}）切片，
+    返回docx文件内容，未找到指定章节时返回None。参数见slice_document。
+    """
+    return slice_document(source, [spec], cache, matching)[0]
+
+
+def outline_record(headings, content_end, paragraph_count):
+    """
+    文档大纲：headings为标题树（与get_document_titles_tree的结构相同，每个标题含标题、偏移量、级别和children），
+    以及标题总数、各级别的标题数、字符总数和段落数
+    """
+    return {
+        'headings': headings.to_tree(),
+        'heading_count': len(headings),
+        'levels': dict(sorted(Counter(headings.levels).items())),
+        'content_end': content_end,
+        'paragraphs': paragraph_count,
+    }
+
+
+def document_outline(source, cache=None):
+    """在内存中读取文档的大纲（见outline_record），参数见open_package"""
+    with open_package(source, cache=cache) as package:
+        return outline_record(package.headings, package.content_end, package.paragraph_count)
@@ -0,0 +1,323 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import signal
+import struct
+import threading
+import time
+from collections import Counter
+
+import metrics
+from batch_executor import run_parallel
+from file_ops import is_file_free
+from geter3 import (close_word_getter, log_summary, needs_word, open_word_getter, prepare_batch, process_file,
+                    read_config)
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+_EVENT_HEADER = struct.Struct('iIII')
+
+# 上传过程中的临时文件和Word锁文件，不作为输入
+_IGNORED_PREFIXES = ('~$', '.')
+_IGNORED_SUFFIXES = ('.tmp', '.part', '.crdownload')
+
+
+def _is_candidate(name):
+    return not name.startswith(_IGNORED_PREFIXES) and not name.lower().endswith(_IGNORED_SUFFIXES)
+
+
+class InotifyWatcher:
+    """通过Linux inotify监听文件夹中写入完成（IN_CLOSE_WRITE）和移入（IN_MOVED_TO）的文件"""
+
+    # 写入完成的事件可以跳过稳定性等待
+    reports_complete = True
+
+    def __init__(self, folder):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1失败')
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f'inotify_add_watch失败: {folder}')
+
+    def poll(self, timeout):
+        """
+        等待事件，返回 (文件名列表, 是否需要全量重新扫描)。
+        内核事件队列溢出时需要重新扫描文件夹。
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return [], False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+        names = []
+        rescan = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+            elif raw_name and not mask & IN_IGNORED:
+                names.append(os.fsdecode(raw_name))
+        return names, rescan
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """轮询方式的后备实现：定期列出文件夹，由调用方做稳定性检查"""
+
+    reports_complete = False
+
+    def __init__(self, folder, interval):
+        self.folder = folder
+        self.interval = interval
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return [], True
+
+    def close(self):
+        pass
+
+
+def create_watcher(folder, use_inotify=True, poll_interval=1.0):
+    """优先使用inotify，不可用时（非Linux或达到监听数量上限）退回轮询"""
+    if use_inotify:
+        try:
+            watcher = InotifyWatcher(folder)
+            logging.info(f"使用inotify监听: {folder}")
+            return watcher
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify不可用，改为轮询: {e}")
+    logging.info(f"使用轮询监听: {folder}，间隔 {poll_interval} 秒")
+    return PollingWatcher(folder, poll_interval)
+
+
+class WatchDaemon:
+    """
+    常驻监听input_folder的守护进程。
+    监听线程发现文件并确认写入完成后放入有界队列（队列满时阻塞，形成背压），
+    主线程从队列取出文件并用常驻的引擎逐个处理。
+    配置了单个文件的处理预算（file_timeout、file_memory_mb）时，文件交给一个常驻的工作进程处理
+    （batch_executor.run_parallel），超出预算的文件与批处理时一样被隔离，守护进程本身不会被卡住或占满内存。
+    """
+
+    def __init__(self, config):
+        self.batch = prepare_batch(config)
+        self.input_folder = self.batch['input_folder']
+        settings = config.get('daemon', {})
+        self.poll_interval = settings.get('poll_interval', 1.0)
+        self.settle_time = settings.get('settle_time', 0.5)
+        self.use_inotify = settings.get('use_inotify', True)
+        self.queue = queue.Queue(maxsize=max(1, settings.get('queue_size', 64)))
+        self.stop_event = threading.Event()
+        # 各结果的文件数，只计数不保留每个文件的结果，守护进程长时间运行也不会持续占用更多内存
+        self.counts = Counter()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        # 待确认写入完成的文件：名称 -> (大小, 修改时间, 最近一次变化的时间)
+        self._candidates = {}
+        # 处理后仍留在输入文件夹中的文件（例如移动失败），内容不变时不再重复处理
+        self._finished = {}
+        # 上次清空处理日志后处理过文件（启用处理预算时日志由工作进程写入，主进程的计数不会变化）
+        self._journaled = False
+        self._getter = None
+
+    def _signature(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _offer(self, name, complete=False):
+        if not _is_candidate(name):
+            return
+        path = os.path.join(self.input_folder, name)
+        signature = self._signature(path)
+        if signature is None or not os.path.isfile(path):
+            self._candidates.pop(name, None)
+            with self._queued_lock:
+                self._finished.pop(name, None)
+            return
+        with self._queued_lock:
+            if name in self._queued or self._finished.get(name) == signature:
+                return
+        previous = self._candidates.get(name)
+        now = time.monotonic()
+        if previous is None or previous[:2] != signature:
+            # 写入完成的事件视为已稳定，其余情况从现在开始计算稳定时间
+            changed_at = now - self.settle_time if complete else now
+            self._candidates[name] = signature + (changed_at,)
+
+    def _rescan(self):
+        try:
+            names = os.listdir(self.input_folder)
+        except OSError as e:
+            logging.error(f"读取输入文件夹失败: {e}")
+            return
+        for name in names:
+            self._offer(name)
+
+    def _enqueue_stable(self):
+        """把大小和修改时间保持不变超过settle_time且未被占用的文件放入队列"""
+        now = time.monotonic()
+        for name, (size, mtime, changed_at) in list(self._candidates.items()):
+            if now - changed_at < self.settle_time:
+                continue
+            path = os.path.join(self.input_folder, name)
+            if self._signature(path) != (size, mtime):
+                self._offer(name)
+                continue
+            if not is_file_free(path):
+                continue
+            del self._candidates[name]
+            with self._queued_lock:
+                self._queued.add(name)
+            # 队列满时阻塞，直到处理线程取走文件（或收到停止信号）
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(name, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    def _watch_loop(self, watcher):
+        self._rescan()
+        while not self.stop_event.is_set():
+            timeout = min(self.poll_interval, self.settle_time) if self._candidates else self.poll_interval
+            names, rescan = watcher.poll(timeout)
+            if rescan:
+                self._rescan()
+            for name in names:
+                self._offer(name, complete=watcher.reports_complete)
+            self._enqueue_stable()
+
+    def _take(self):
+        """从队列取出下一个文件名，收到停止信号时返回None"""
+        while not self.stop_event.is_set():
+            try:
+                return self.queue.get(timeout=0.5)
+            except queue.Empty:
+                # 空闲时没有正在处理的文件，清空处理日志，避免长期运行时日志无限增长
+                journal = self.batch['file_kwargs'].get('journal')
+                if journal is not None and (journal.written or self._journaled):
+                    journal.compact()
+                    self._journaled = False
+        return None
+
+    def _finish(self, name, processed=True):
+        """记录处理后仍留在输入文件夹中的文件，内容不变时不再重复处理"""
+        self._journaled = True
+        with self._queued_lock:
+            self._queued.discard(name)
+            if not processed:
+                return
+            signature = self._signature(os.path.join(self.input_folder, name))
+            if signature is None:
+                self._finished.pop(name, None)
+            else:
+                self._finished[name] = signature
+
+    def _process(self, name):
+        path = os.path.join(self.input_folder, name)
+        if not os.path.isfile(path):
+            return
+        # 引擎在守护进程生命周期内保持常驻，只有遇到需要Word的文件时才启动Word
+        if self._getter is None and needs_word(path, self.batch['file_kwargs'].get('doc_engine', 'auto')):
+            self._getter = open_word_getter(self.batch['word'])
+        result = process_file(self._getter, path, **self.batch['file_kwargs'])
+        self.counts[result] += 1
+
+    def _serve(self):
+        while True:
+            name = self._take()
+            if name is None:
+                return
+            processed = False
+            try:
+                self._process(name)
+                processed = True
+            except Exception as e:
+                logging.error(f"处理文件时发生异常: {name}, {e}")
+                self.counts["error"] += 1
+            finally:
+                self._finish(name, processed)
+
+    def _queued_paths(self):
+        """
+        逐个给出队列中的文件，交给run_parallel的单个工作进程：
+        工作进程处理完上一个文件后才会取下一个，此时记录上一个文件的处理结果
+        """
+        while True:
+            name = self._take()
+            if name is None:
+                return
+            path = os.path.join(self.input_folder, name)
+            try:
+                if os.path.isfile(path):
+                    yield path
+            finally:
+                self._finish(name)
+
+    def _serve_isolated(self):
+        budget = self.batch['budget']
+        logging.info(f"已启用单个文件的处理预算（{budget['timeout']:g} 秒、{budget['memory_mb']:g}MB，0表示不限制），"
+                     f"文件在独立的工作进程中处理")
+        run_parallel(self._queued_paths(), self.batch['file_kwargs'], 1, self.batch['io_concurrency'],
+                     self.batch['word'], budget, self.counts)
+
+    def run(self):
+        watcher = create_watcher(self.input_folder, self.use_inotify, self.poll_interval)
+        watch_thread = threading.Thread(target=self._watch_loop, args=(watcher,), daemon=True)
+        watch_thread.start()
+        logging.info(f"守护进程已启动，监听: {self.input_folder}")
+        try:
+            if self.batch['budget'] is not None:
+                self._serve_isolated()
+            else:
+                self._serve()
+        finally:
+            self.stop_event.set()
+            watch_thread.join(timeout=5)
+            watcher.close()
+            close_word_getter(self._getter)
+            self._getter = None
+            log_summary(self.counts)
+            metrics.report(self.batch['metrics'])
+
+    def stop(self, *args):
+        logging.info("收到停止信号，守护进程正在退出")
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    # 从配置文件读取参数
+    config_file = 'config.ini'
+    config = read_config(config_file)
+
+    if config is None:
+        logging.error(f"无法加载配置文件 {config_file}，程序退出")
+        exit(1)
+
+    daemon = WatchDaemon(config)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run()
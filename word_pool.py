@@ -0,0 +1,276 @@
+import contextlib
+import logging
+import os
+import threading
+
+import metrics
+
+# 表示Word进程已退出或失去连接的HRESULT
+RPC_FAILURES = frozenset([
+    -2147023174,  # RPC_S_SERVER_UNAVAILABLE：RPC服务器不可用
+    -2147023170,  # RPC_S_CALL_FAILED：远程过程调用失败
+    -2147417848,  # RPC_E_DISCONNECTED：对象已与其客户端断开连接
+    -2147417851,  # RPC_E_SERVERFAULT：服务器引发了异常
+    -2147220995,  # CO_E_OBJNOTCONNECTED：对象未连接到服务器
+])
+
+# OpenProcess的访问权限
+_PROCESS_TERMINATE = 0x0001
+_PROCESS_VM_READ = 0x0010
+_PROCESS_QUERY_INFORMATION = 0x0400
+
+# Word主窗口的窗口类名
+_WORD_WINDOW_CLASS = 'OpusApp'
+
+_MB = 1024 * 1024
+
+
+def is_rpc_failure(error):
+    """COM调用的异常是否表示Word进程已崩溃或失去连接"""
+    args = getattr(error, 'args', ())
+    return bool(args) and isinstance(args[0], int) and args[0] in RPC_FAILURES
+
+
+class WordProcess:
+    """通过进程句柄查询WINWORD进程占用的内存，卡死时结束进程"""
+
+    def __init__(self, pid):
+        import win32api
+
+        self.pid = pid
+        self.handle = win32api.OpenProcess(
+            _PROCESS_QUERY_INFORMATION | _PROCESS_VM_READ | _PROCESS_TERMINATE, False, pid
+        )
+
+    def memory(self):
+        """进程的私有内存（字节）"""
+        import win32process
+
+        return win32process.GetProcessMemoryInfo(self.handle)['PagefileUsage']
+
+    def kill(self):
+        import win32api
+
+        win32api.TerminateProcess(self.handle, 1)
+
+    def close(self):
+        import win32api
+
+        try:
+            win32api.CloseHandle(self.handle)
+        except Exception:
+            pass
+
+
+def _find_pid(word, tag):
+    """把Word的标题设为唯一标记，再按窗口标题找到它的进程号"""
+    import win32gui
+    import win32process
+
+    word.Caption = tag
+    hwnd = win32gui.FindWindow(_WORD_WINDOW_CLASS, tag)
+    if not hwnd:
+        return None
+    return win32process.GetWindowThreadProcessId(hwnd)[1]
+
+
+class WordSession:
+    """会话池中的一个Word实例：独立的WINWORD进程，以及已处理的文档数"""
+
+    def __init__(self, slot):
+        from head_geter import WordHeadGetter
+
+        self.slot = slot
+        self.getter = WordHeadGetter(new_instance=True)
+        self.documents = 0
+        # 被看门狗结束或确认已崩溃
+        self.dead = False
+        self.process = None
+        try:
+            pid = _find_pid(self.getter.word, f'word-geter-{os.getpid()}-{slot}-{id(self)}')
+            if pid:
+                self.process = WordProcess(pid)
+        except Exception as e:
+            logging.warning(f"无法获取Word进程号，内存检查和卡死时结束进程不可用: {e}")
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def memory(self):
+        """Word进程的私有内存（字节），无法获取时为None"""
+        if self.process is None:
+            return None
+        try:
+            return self.process.memory()
+        except Exception:
+            return None
+
+    def probe(self):
+        """健康检查：一次最简单的COM调用，Word崩溃时抛出RPC错误，卡死时阻塞（由看门狗结束进程）"""
+        return self.getter.word.Documents.Count
+
+    def kill(self):
+        self.dead = True
+        if self.process is not None:
+            try:
+                self.process.kill()
+            except Exception as e:
+                logging.error(f"结束Word进程失败(进程号 {self.pid}): {e}")
+
+    def close(self):
+        """关闭所有Word标签页并退出Word，已失去响应的实例直接结束进程"""
+        if self.dead:
+            self.kill()
+        else:
+            try:
+                word = self.getter.word
+                while word is not None and word.Windows.Count > 0:
+                    word.Windows(1).Close()
+            except Exception as e:
+                logging.error(f"关闭标签页失败: {e}")
+            self.getter.quit()
+        if self.process is not None:
+            self.process.close()
+
+
+class WordSessionPool:
+    """
+    Word会话池，接口上替代单个WordHeadGetter：通过run()在一个健康的Word实例上处理文档。
+    - 最多同时保持size个实例（各自独立的WINWORD进程），按顺序轮流分配文档，需要时才启动
+    - 每次分配前做健康检查，崩溃或失去响应的实例透明地重新启动
+    - 处理单个文档超过document_timeout秒时由看门狗结束Word进程，换新实例重试（最多retries次）
+    - 实例处理max_documents个文档后、或私有内存超过max_memory_mb时回收重启，避免WINWORD内存持续增长后卡死
+    同一时间只由一个线程使用（Word的COM对象只能在创建它的线程中使用）。
+    """
+
+    def __init__(self, size=1, max_documents=200, max_memory_mb=0, document_timeout=300, probe_timeout=15,
+                 retries=1):
+        self.sessions = [None] * max(1, size)
+        self.max_documents = max_documents
+        self.max_memory = max_memory_mb * _MB
+        self.document_timeout = document_timeout
+        self.probe_timeout = probe_timeout
+        self.retries = max(0, retries)
+        self._next = 0
+        self.restarts = 0
+        self.recycled = 0
+
+    @contextlib.contextmanager
+    def _watchdog(self, session, timeout, action):
+        """timeout秒内未完成时结束Word进程，使阻塞的COM调用以RPC错误返回"""
+        if not timeout or timeout <= 0:
+            yield
+            return
+
+        def expire():
+            logging.error(f"Word实例 {session.slot} {action}超过 {timeout} 秒，视为卡死，结束进程(进程号 {session.pid})")
+            session.kill()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+
+    def _healthy(self, session):
+        if session.dead:
+            return False
+        try:
+            with metrics.span('word_probe'), self._watchdog(session, self.probe_timeout, '健康检查'):
+                session.probe()
+        except Exception as e:
+            logging.warning(f"Word实例 {session.slot} 健康检查失败: {e}")
+            return False
+        return not session.dead
+
+    def _start(self, slot):
+        session = WordSession(slot)
+        self.sessions[slot] = session
+        logging.info(f"已启动Word实例 {slot}（进程号 {session.pid}）")
+        return session
+
+    def _discard(self, slot, reason):
+        """丢弃失去响应或崩溃的实例，下次分配时重新启动"""
+        session = self.sessions[slot]
+        self.sessions[slot] = None
+        self.restarts += 1
+        logging.warning(f"Word实例 {slot} {reason}，将重新启动")
+        session.dead = True
+        session.close()
+
+    def _recycle_if_needed(self, slot, session):
+        reason = None
+        if self.max_documents and session.documents >= self.max_documents:
+            reason = f"已处理 {session.documents} 个文档"
+        elif self.max_memory:
+            memory = session.memory()
+            if memory is not None and memory > self.max_memory:
+                reason = f"内存 {memory / _MB:.0f}MB 超过上限"
+        if reason is None:
+            return
+        logging.info(f"Word实例 {slot} {reason}，回收重启")
+        self.sessions[slot] = None
+        self.recycled += 1
+        session.close()
+
+    def checkout(self):
+        """按顺序取下一个实例，健康检查失败时重新启动，返回 (编号, 会话)"""
+        slot = self._next
+        self._next = (slot + 1) % len(self.sessions)
+        session = self.sessions[slot]
+        if session is not None and not self._healthy(session):
+            self._discard(slot, '失去响应或已崩溃')
+            session = None
+        if session is None:
+            session = self._start(slot)
+        return slot, session
+
+    def run(self, func, *args, reset=None, **kwargs):
+        """
+        调用func(getter, *args, **kwargs)处理一个文档。
+        处理中Word崩溃、卡死（被看门狗结束）或处理后健康检查失败时，丢弃该实例，
+        调用reset()恢复输入（如重新复制临时文件）后在新实例上重试；重试用尽后返回最后一次的结果，
+        或重新抛出最后一次的RPC错误。
+        """
+        for attempt in range(self.retries + 1):
+            if attempt and reset is not None:
+                reset()
+            slot, session = self.checkout()
+            error = None
+            try:
+                with self._watchdog(session, self.document_timeout, '处理文档'):
+                    result = func(session.getter, *args, **kwargs)
+            except Exception as e:
+                if not (is_rpc_failure(e) or session.dead):
+                    raise
+                error = e
+            # 处理函数内部会捕获COM异常，因此处理后再做一次健康检查，确认失败不是Word本身的问题
+            if error is None and self._healthy(session):
+                session.documents += 1
+                self._recycle_if_needed(slot, session)
+                return result
+            self._discard(slot, '在处理文档时崩溃或失去响应')
+            if attempt < self.retries:
+                logging.warning(f"换用新的Word实例重试（第 {attempt + 1} 次）")
+        if error is not None:
+            raise error
+        return result
+
+    def kill(self):
+        """结束所有Word进程，不等待COM调用返回（工作进程超出处理预算、即将退出时调用）"""
+        for session in self.sessions:
+            if session is not None:
+                session.kill()
+
+    def close(self):
+        """退出所有Word实例"""
+        for slot, session in enumerate(self.sessions):
+            if session is not None:
+                self.sessions[slot] = None
+                session.close()
+        if self.restarts or self.recycled:
+            logging.info(f"Word会话池：重新启动 {self.restarts} 次，回收 {self.recycled} 次")
+        logging.info("Word应用程序已退出")